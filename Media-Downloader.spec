@@ -6,7 +6,20 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('needyamin.ico', '.')],
-    hiddenimports=[],
+    # Imported lazily by name (startup.LazyModule), so the analysis cannot see them
+    hiddenimports=[
+        'yt_dlp',
+        'yt_dlp.postprocessor.ffmpeg',
+        'PIL.Image',
+        'PIL.ImageTk',
+        'PIL.ImageDraw',
+        'PIL._tkinter_finder',
+        'validators',
+        'pystray',
+        'pystray._win32',
+        'http_session',
+        'requests',
+    ],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
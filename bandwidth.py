@@ -0,0 +1,183 @@
+"""Global bandwidth governor shared by every download.
+
+One BandwidthGovernor holds the limit for the whole app. Each transfer (a
+download job, an FFmpeg install, a self-update) opens a Stream with a
+weight and reports the bytes it receives; the stream sleeps whenever it is
+ahead of its share. Shares are weighted and only count streams that moved
+data in the last couple of seconds, so a job gets limit * weight / (sum of
+active weights) and an idle job's share goes to the others.
+
+The limit can follow a schedule, e.g. unthrottled overnight, and can be
+changed at any time; sleeping transfers pick up the new limit within a
+fraction of a second. Short API requests (update checks, release feeds)
+are not metered, so capping bulk downloads below the link speed leaves
+room for them.
+"""
+import re
+import threading
+import time
+
+BURST_SECONDS = 0.5  # Bytes a stream may run ahead, in seconds of its share
+ACTIVE_WINDOW = 2.0  # A stream that moved data this recently counts toward shares
+SLEEP_SLICE = 0.2  # Longest single sleep, so limit changes and cancels apply quickly
+
+_RATE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?(?:/s)?\s*$', re.IGNORECASE)
+_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_rate(text):
+    """Bytes per second from '500K', '2M' or '1.5MB/s'; None for '' / 0 / 'unlimited'."""
+    if text is None or str(text).strip().lower() in ('', '0', 'none', 'unlimited'):
+        return None
+    match = _RATE.match(str(text))
+    if not match:
+        raise ValueError(f"Not a transfer rate: {text!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2).lower()]) or None
+
+
+def format_rate(rate):
+    if rate is None:
+        return "unlimited"
+    if rate >= 1024 ** 2:
+        return f"{rate / 1024 ** 2:g} MB/s"
+    return f"{rate / 1024:g} KB/s"
+
+
+def parse_window(text):
+    """(start, end) minutes after midnight from 'HH:MM-HH:MM'."""
+    start, end = text.split('-')
+    minutes = []
+    for part in (start, end):
+        hours, _, mins = part.strip().partition(':')
+        minutes.append(int(hours) * 60 + int(mins or 0))
+    return minutes[0], minutes[1]
+
+
+def _in_window(minute, start, end):
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end  # Wraps past midnight
+
+
+class Stream:
+    """One transfer's claim on the governor."""
+
+    def __init__(self, governor, name, weight=1.0):
+        self.governor = governor
+        self.name = name
+        self.weight = weight
+        self.bytes = 0
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.last_active = 0.0
+        self._totals = {}
+
+    def consume(self, nbytes, cancelled=None):
+        """Account for nbytes received, sleeping while this stream is over its share."""
+        if nbytes <= 0:
+            return
+        wait = self.governor._charge(self, nbytes)
+        while wait > 0:
+            if cancelled is not None and cancelled():
+                return
+            time.sleep(min(wait, SLEEP_SLICE))
+            wait = self.governor._remaining_wait(self)
+
+    def consume_total(self, key, total, cancelled=None):
+        """consume() for callers that report a running total per file, like yt-dlp hooks."""
+        if total is None:
+            return
+        with self.governor._lock:
+            previous = self._totals.get(key)
+            self._totals[key] = total
+        # The first report of a resumed file includes what was already on disk
+        if previous is not None and total > previous:
+            self.consume(total - previous, cancelled)
+
+    def close(self):
+        self.governor._close(self)
+
+
+class BandwidthGovernor:
+    """Token bucket shared by all transfers, with weighted fair shares."""
+
+    def __init__(self, limit=None, schedule=None):
+        self.limit = limit  # Bytes per second, None for unlimited
+        self.schedule = list(schedule or [])  # (start minute, end minute, limit) rules
+        self._lock = threading.Lock()
+        self._streams = set()
+
+    def set_limit(self, limit):
+        with self._lock:
+            self.limit = limit
+
+    def set_schedule(self, schedule):
+        with self._lock:
+            self.schedule = list(schedule)
+
+    def current_limit(self, now=None):
+        """The limit in force now: the first matching schedule rule, else the base limit."""
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        for start, end, limit in self.schedule:
+            if _in_window(minute, start, end):
+                return limit
+        return self.limit
+
+    def open(self, name, weight=1.0):
+        stream = Stream(self, name, weight)
+        with self._lock:
+            self._streams.add(stream)
+        return stream
+
+    def _close(self, stream):
+        with self._lock:
+            self._streams.discard(stream)
+
+    def _share(self, stream, limit, now):
+        weights = sum(s.weight for s in self._streams
+                      if s is stream or now - s.last_active < ACTIVE_WINDOW)
+        return limit * stream.weight / max(weights, stream.weight)
+
+    def _refill(self, stream, limit, now):
+        share = self._share(stream, limit, now)
+        stream.tokens = min(share * BURST_SECONDS, stream.tokens + (now - stream.updated) * share)
+        stream.updated = now
+        return share
+
+    def _charge(self, stream, nbytes):
+        """Take nbytes from the stream's bucket; returns seconds to wait."""
+        limit = self.current_limit()
+        with self._lock:
+            now = time.monotonic()
+            stream.bytes += nbytes
+            stream.last_active = now
+            if limit is None:
+                stream.tokens = 0.0
+                stream.updated = now
+                return 0.0
+            share = self._refill(stream, limit, now)
+            stream.tokens -= nbytes
+            return -stream.tokens / share if stream.tokens < 0 else 0.0
+
+    def _remaining_wait(self, stream):
+        limit = self.current_limit()
+        with self._lock:
+            now = time.monotonic()
+            if limit is None:
+                stream.tokens = 0.0
+                stream.updated = now
+                return 0.0
+            stream.last_active = now
+            share = self._refill(stream, limit, now)
+            return -stream.tokens / share if stream.tokens < 0 else 0.0
+
+    def describe(self):
+        """The limit in effect now, schedule included, and how many transfers share it."""
+        with self._lock:
+            now = time.monotonic()
+            active = [s for s in self._streams if now - s.last_active < ACTIVE_WINDOW]
+        limit = self.current_limit()
+        if limit is None:
+            return f"unlimited, {len(active)} active transfer(s)"
+        return f"{format_rate(limit)} shared by {len(active)} active transfer(s)"
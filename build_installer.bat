@@ -15,7 +15,13 @@ pip install requests
 pip install certifi
 
 echo Step 2: Creating executable with PyInstaller...
-pyinstaller --noconfirm --onedir --windowed --icon=needyamin.ico --name="Media-Downloader" --add-data="needyamin.ico;." media-download.py
+rem These modules are imported lazily by name (startup.LazyModule), so list them explicitly
+pyinstaller --noconfirm --onedir --windowed --icon=needyamin.ico --name="Media-Downloader" --add-data="needyamin.ico;." ^
+    --hidden-import=yt_dlp --hidden-import=yt_dlp.postprocessor.ffmpeg ^
+    --hidden-import=PIL.Image --hidden-import=PIL.ImageTk --hidden-import=PIL.ImageDraw --hidden-import=PIL._tkinter_finder ^
+    --hidden-import=validators --hidden-import=pystray --hidden-import=pystray._win32 ^
+    --hidden-import=http_session --hidden-import=requests ^
+    media-download.py
 
 echo Step 3: Building Inno Setup installer...
 "C:\Program Files (x86)\Inno Setup 6\ISCC.exe" setup.iss
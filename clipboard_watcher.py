@@ -0,0 +1,168 @@
+"""Clipboard watcher that only does work when the clipboard changes.
+
+On Windows a message-only window is registered with
+AddClipboardFormatListener, so the watcher thread sleeps in GetMessage until
+the clipboard changes and costs nothing while idle. Where that is not
+available it polls GetClipboardSequenceNumber, which is a cheap counter
+read, and only falls back to comparing a hash of the clipboard text on
+other platforms.
+"""
+import ctypes
+import hashlib
+import re
+import sys
+import threading
+
+# Only this much of the clipboard is scanned for links
+MAX_SCAN_CHARS = 64 * 1024
+MAX_URL_LENGTH = 2048
+MAX_URLS = 100
+
+# Cheap prefilter; matches are bounded so huge payloads cannot stall it
+URL_PATTERN = re.compile(r'https?://[^\s<>"\'`]{3,%d}' % MAX_URL_LENGTH, re.IGNORECASE)
+TRAILING_PUNCTUATION = '.,;:!?)]}\'"'
+
+WM_CLIPBOARDUPDATE = 0x031D
+HWND_MESSAGE = -3
+
+
+def extract_urls(text, validate=None, limit=MAX_URLS):
+    """Unique URLs in text, in order, checked with validate if given."""
+    if not text or '://' not in text[:MAX_SCAN_CHARS]:
+        return []
+    urls = []
+    seen = set()
+    for match in URL_PATTERN.finditer(text, 0, MAX_SCAN_CHARS):
+        url = match.group(0).rstrip(TRAILING_PUNCTUATION)
+        if url in seen:
+            continue
+        seen.add(url)
+        try:
+            if validate is not None and not validate(url):
+                continue
+        except Exception:
+            continue
+        urls.append(url)
+        if len(urls) >= limit:
+            break
+    return urls
+
+
+def _sequence_number():
+    """Windows clipboard sequence number, or None if unavailable."""
+    try:
+        return ctypes.windll.user32.GetClipboardSequenceNumber()
+    except Exception:
+        return None
+
+
+class ClipboardWatcher:
+    """Calls on_change(text) from a background thread when the clipboard changes."""
+
+    def __init__(self, on_change, paste, poll_interval=1.0):
+        self.on_change = on_change
+        self.paste = paste
+        self.poll_interval = poll_interval
+        self.mode = None
+        self.changes = 0
+        self.reads = 0
+        self._last_digest = None
+        self._stop = threading.Event()
+        self._hwnd = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._hwnd:
+            try:
+                import win32gui
+                import win32con
+                win32gui.PostMessage(self._hwnd, win32con.WM_CLOSE, 0, 0)
+            except Exception:
+                pass
+
+    def check(self):
+        """Read the clipboard and report it if the text differs from last time."""
+        try:
+            text = self.paste() or ''
+        except Exception as e:
+            print(f"Clipboard error: {e}")
+            return
+        self.reads += 1
+        digest = hashlib.blake2b(text[:MAX_SCAN_CHARS].encode('utf-8', 'replace'),
+                                 digest_size=16).digest()
+        if digest == self._last_digest:
+            return
+        self._last_digest = digest
+        self.changes += 1
+        try:
+            self.on_change(text)
+        except Exception as e:
+            print(f"Clipboard handler error: {e}")
+
+    def _run(self):
+        # Report whatever is on the clipboard at start-up once
+        self.check()
+        if sys.platform == 'win32':
+            try:
+                self._listen()
+                return
+            except Exception as e:
+                print(f"Clipboard listener unavailable, polling instead: {e}")
+        self._poll()
+
+    def _listen(self):
+        """Block in a Windows message loop until WM_CLIPBOARDUPDATE arrives."""
+        import win32api
+        import win32con
+        import win32gui
+
+        def wndproc(hwnd, msg, wparam, lparam):
+            if msg == WM_CLIPBOARDUPDATE:
+                self.check()
+                return 0
+            if msg == win32con.WM_CLOSE:
+                win32gui.DestroyWindow(hwnd)
+                return 0
+            if msg == win32con.WM_DESTROY:
+                win32gui.PostQuitMessage(0)
+                return 0
+            return win32gui.DefWindowProc(hwnd, msg, wparam, lparam)
+
+        wc = win32gui.WNDCLASS()
+        wc.lpfnWndProc = wndproc
+        wc.lpszClassName = 'YaminDownloaderClipboard'
+        wc.hInstance = win32api.GetModuleHandle(None)
+        win32gui.RegisterClass(wc)
+        hwnd = win32gui.CreateWindow(wc.lpszClassName, '', 0, 0, 0, 0, 0,
+                                     HWND_MESSAGE, 0, wc.hInstance, None)
+        if not ctypes.windll.user32.AddClipboardFormatListener(hwnd):
+            win32gui.DestroyWindow(hwnd)
+            raise OSError("AddClipboardFormatListener failed")
+        self._hwnd = hwnd
+        self.mode = 'listener'
+        try:
+            win32gui.PumpMessages()
+        finally:
+            ctypes.windll.user32.RemoveClipboardFormatListener(hwnd)
+            self._hwnd = None
+
+    def _poll(self):
+        """Fallback: only read the clipboard when its sequence number moves."""
+        last = _sequence_number()
+        self.mode = 'sequence' if last is not None else 'hash'
+        while not self._stop.wait(self.poll_interval):
+            if self.mode == 'sequence':
+                current = _sequence_number()
+                if current == last:
+                    continue
+                last = current
+            self.check()
+
+    def stats(self):
+        return {'mode': self.mode, 'reads': self.reads, 'changes': self.changes}
@@ -0,0 +1,111 @@
+"""Record of downloaded videos, checked before anything is extracted.
+
+Each ArchiveSet is an in-memory set of yt-dlp archive keys ("youtube
+dQw4w9WgXcQ", i.e. lower-case extractor key and video id) backed by an
+append-only text file in yt-dlp's --download-archive format, so the same
+file works with the yt-dlp command line. Loading is a single read and split
+(about 0.15s for half a million ids) and only happens on first use, off the
+UI thread.
+
+The set is handed to yt-dlp as its download_archive, which skips a URL
+whose id it can read from the URL itself before extracting anything, and
+records every finished download. Playlist entries are checked by the
+engine from their flat entry before a worker is spent on them.
+
+Video and audio downloads keep separate sets, shared by every output
+folder, so having the video of something does not stop its audio from
+being fetched.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+
+def archive_key(extractor, video_id):
+    """yt-dlp's archive id for a video."""
+    return f"{extractor.lower()} {video_id}"
+
+
+class ArchiveSet:
+    """Set of archive keys kept in sync with an append-only file."""
+
+    def __init__(self, path, on_load=None):
+        self.path = str(path)
+        self.on_load = on_load  # Called with the set once it has been read
+        self.load_time = None
+        self._keys = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        keys = self._keys
+        if keys is not None:
+            return keys
+        loaded = False
+        with self._lock:
+            if self._keys is None:
+                loaded = True
+                started = time.perf_counter()
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        keys = set(f.read().split('\n'))
+                    keys.discard('')
+                except FileNotFoundError:
+                    keys = set()
+                self.load_time = time.perf_counter() - started
+                self._keys = keys
+        if loaded and self.on_load is not None:
+            self.on_load(self)
+        return self._keys
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def __len__(self):
+        return len(self._load())
+
+    def contains(self, extractor, video_id):
+        if not extractor or not video_id:
+            return False
+        return archive_key(extractor, video_id) in self._load()
+
+    def add(self, key):
+        """Record a key (yt-dlp calls this after each finished download)."""
+        keys = self._load()
+        with self._lock:
+            if key in keys:
+                return
+            keys.add(key)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(key + '\n')
+            except OSError as e:
+                print(f"Could not write download archive {self.path}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._keys = set()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def describe(self):
+        return (f"{len(self._keys or ())} ids in {os.path.basename(self.path)}, "
+                f"loaded in {self.load_time or 0:.2f}s")
+
+
+class DownloadArchive:
+    """The video and audio archive sets of one install."""
+
+    def __init__(self, folder, on_load=None):
+        folder = Path(folder)
+        self.video = ArchiveSet(folder / "archive-video.txt", on_load)
+        self.audio = ArchiveSet(folder / "archive-audio.txt", on_load)
+
+    def for_options(self, options):
+        return self.audio if options.is_audio else self.video
+
+    def clear(self):
+        self.video.clear()
+        self.audio.clear()
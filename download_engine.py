@@ -0,0 +1,1416 @@
+"""Headless download core for Media Downloader.
+
+Nothing in this module touches tkinter or message boxes. The Tk window, the
+tray and batch front-ends build a DownloadOptions, wrap it in a DownloadJob and
+hand it to a DownloadEngine, which reports back through JobEvent callbacks and
+returns a DownloadResult.
+
+Run it directly for a GUI-free batch download:
+
+    python download_engine.py --audio https://example.com/watch?v=...
+"""
+import argparse
+import collections
+import concurrent.futures
+import copy
+import itertools
+import os
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from urllib.parse import urlparse
+
+from bandwidth import BandwidthGovernor, parse_rate, parse_window
+from fragment_tuner import FragmentTuner
+from postprocess_pool import PostProcessPool, StageMeter, describe_stages, hand_off_postprocessor
+from remux_planner import register as register_remux_planner
+from segmented_download import DEFAULT_CONNECTIONS, register as register_segmented_downloader
+from startup import LazyModule
+
+# yt-dlp takes a while to import; the GUI loads it after the window is shown
+yt_dlp = LazyModule('yt_dlp')
+
+# Default download root, mirrors the folder used by the desktop app
+DEFAULT_DOWNLOADS_PATH = Path.home() / "Downloads" / "Yamin Downloader"
+
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+PROCESSING = 'processing'  # Downloaded, waiting for or in the post-processing pool
+FINISHED = 'finished'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+_job_ids = itertools.count(1)
+
+DEFAULT_MAX_WORKERS = 3
+DEFAULT_PER_HOST_LIMIT = 2
+DEFAULT_PLAYLIST_WORKERS = 4
+DEFAULT_PROGRESS_INTERVAL = 0.1  # Seconds between progress publications (10 Hz)
+DEFAULT_PROGRESS_LOG_INTERVAL = 1.0  # Seconds between progress lines in the log
+
+# Share of the bandwidth limit a job gets relative to others, by priority
+PRIORITY_WEIGHTS = {'low': 0.5, 'normal': 1.0, 'high': 2.0}
+DEFAULT_PRIORITY = 'normal'
+
+
+def looks_like_playlist(url):
+    """Return True if the URL appears to point at a playlist."""
+    url = url.lower()
+    return ('playlist' in url or
+            'list=' in url or
+            '/sets/' in url)  # Handle SoundCloud sets
+
+
+def job_host(url):
+    """Host a URL is fetched from, used for per-site concurrency caps."""
+    host = (urlparse(url).hostname or '').lower()
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if host == 'youtu.be':
+        host = 'youtube.com'
+    return host
+
+
+def classify_error(error_str):
+    """Map a yt-dlp error message to (kind, title, user message)."""
+    lowered = error_str.lower()
+    if "ffmpeg" in lowered:
+        return ('ffmpeg', "FFmpeg Error",
+                f"Error with FFmpeg: {error_str}\n\n"
+                "Please check that FFmpeg is installed correctly.")
+    if "HTTP Error 429" in error_str:
+        return ('rate_limit', "Rate Limit Error",
+                "You are being rate limited by the server. Please try again later.")
+    if "postprocessor" in lowered:
+        return ('postprocessor', "Processing Error",
+                f"Error processing the video: {error_str}\n\n"
+                "Try downloading without conversion or in a different format.")
+    if "copyright" in lowered or "not available" in lowered:
+        return ('unavailable', "Content Error",
+                f"This content may not be available: {error_str}")
+    if "network" in lowered or "connection" in lowered:
+        return ('network', "Network Error",
+                f"Network connection issue: {error_str}\n\n"
+                "Check your internet connection and try again.")
+    return ('download', "Download Error", error_str)
+
+
+class DownloadCancelled(Exception):
+    """Raised from the progress hook to abort a cancelled job."""
+
+
+class DownloadOptions:
+    """Everything needed to turn a URL into yt-dlp options."""
+
+    def __init__(self, is_audio=False, video_quality='best', audio_quality='320',
+                 format='mp4', playlist=False, max_files=100,
+                 output_root=DEFAULT_DOWNLOADS_PATH, ffmpeg_path=None,
+                 playlist_workers=DEFAULT_PLAYLIST_WORKERS, connections=DEFAULT_CONNECTIONS,
+                 priority=DEFAULT_PRIORITY):
+        self.is_audio = is_audio
+        self.video_quality = str(video_quality)
+        self.audio_quality = str(audio_quality)
+        self.format = format
+        self.playlist = playlist
+        self.max_files = max_files
+        self.output_root = Path(output_root)
+        self.ffmpeg_path = ffmpeg_path
+        self.playlist_workers = max(1, int(playlist_workers))
+        self.connections = max(1, int(connections))  # HTTP connections per file
+        self.priority = priority if priority in PRIORITY_WEIGHTS else DEFAULT_PRIORITY
+
+    def to_dict(self):
+        """Plain dictionary form, used by the job store."""
+        return {
+            'is_audio': self.is_audio,
+            'video_quality': self.video_quality,
+            'audio_quality': self.audio_quality,
+            'format': self.format,
+            'playlist': self.playlist,
+            'max_files': self.max_files,
+            'output_root': str(self.output_root),
+            'ffmpeg_path': self.ffmpeg_path,
+            'playlist_workers': self.playlist_workers,
+            'connections': self.connections,
+            'priority': self.priority,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    @property
+    def output_path(self):
+        """Folder the job writes into."""
+        if self.playlist:
+            return self.output_root / "playlists"
+        if self.is_audio:
+            return self.output_root / "audio"
+        return self.output_root / "video"
+
+    @property
+    def output_template(self):
+        if self.playlist:
+            return str(self.output_path / '%(playlist_index)s_%(title)s.%(ext)s')
+        return str(self.output_path / '%(title)s.%(ext)s')
+
+    @property
+    def format_code(self):
+        if self.is_audio:
+            return 'bestaudio/best'
+        if self.video_quality == 'best':
+            return 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best'
+        q = self.video_quality
+        return (f'bestvideo[height<={q}][ext=mp4]+bestaudio[ext=m4a]/'
+                f'bestvideo[height<={q}]+bestaudio/best[height<={q}]')
+
+    def postprocessors(self):
+        if self.is_audio:
+            return [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': self.audio_quality,
+            }]
+        # Copies streams instead of re-encoding whenever the target container allows it
+        return [{
+            'key': register_remux_planner() or 'FFmpegVideoConvertor',
+            'preferedformat': self.format,
+        }]
+
+    def build_ydl_opts(self, progress_hook):
+        """Build the primary yt-dlp option dictionary."""
+        opts = {
+            'format': self.format_code,
+            'progress_hooks': [progress_hook] if progress_hook else [],
+            'restrictfilenames': True,
+            'windowsfilenames': True,
+            'quiet': False,
+            'no_warnings': False,
+            'nocheckcertificate': True,  # Avoid certificate issues
+            'nooverwrites': True,
+            'ignoreerrors': True,  # Don't stop on errors
+            'continuedl': True,
+            'ffmpeg_location': self.ffmpeg_path,
+            'merge_output_format': self.format,
+            'verbose': True,
+            'outtmpl': self.output_template,
+            'playlist_items': f'1-{self.max_files}' if self.playlist else None,
+            'noplaylist': not self.playlist,
+            'ssl_verify': False,  # Disable SSL verification to avoid certificate issues
+            'source_address': None,
+            'socket_timeout': 30,
+            'retries': 10,
+            'fragment_retries': 10,  # Unset, a failed HLS/DASH fragment is skipped outright
+            'extractor_retries': 10,
+            'http_headers': {'User-Agent': USER_AGENT},
+            'postprocessors': self.postprocessors(),
+        }
+        # Progressive HTTP files are fetched over several connections
+        downloader = register_segmented_downloader() if self.connections > 1 else None
+        if downloader:
+            opts['external_downloader'] = {'http': downloader}
+            opts['segmented_connections'] = self.connections
+        return opts
+
+    def build_fallback_opts(self, progress_hook):
+        """Simpler options used when the primary download fails."""
+        opts = {
+            'format': 'best' if not self.is_audio else 'bestaudio',
+            'outtmpl': self.output_template,
+            'nocheckcertificate': True,
+            'ignoreerrors': True,
+            'no_warnings': True,
+            'quiet': False,
+            'verbose': True,
+            'progress_hooks': [progress_hook],
+        }
+        if self.is_audio:
+            opts['postprocessors'] = self.postprocessors()
+        return opts
+
+    def describe(self):
+        return (f"Video={self.video_quality}, Audio={self.audio_quality}kbps, "
+                f"Format={self.format}")
+
+
+class DownloadJob:
+    """A single URL queued for download with its options and state."""
+
+    def __init__(self, url, options, job_id=None):
+        self.id = job_id if job_id is not None else next(_job_ids)
+        self.url = url.strip()
+        self.options = options
+        self.state = QUEUED
+        self.title = None
+        self.percent = 0.0
+        self.result = None
+        self.persisted = False  # Set once a JobStore has given the job its id
+        self.timings = {}  # Phase name -> time.time() stamp, 'cached' on a cache hit
+        self.bandwidth = None  # bandwidth.Stream while the job runs under a governor
+        self.post_tasks = []  # Futures of files handed to the post-processing pool
+        self._cancel_event = threading.Event()
+
+    @property
+    def weight(self):
+        """Share of the bandwidth limit relative to other jobs."""
+        return PRIORITY_WEIGHTS[self.options.priority]
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Ask the engine to stop this job at the next progress callback."""
+        self._cancel_event.set()
+
+    def __repr__(self):
+        return f"<DownloadJob {self.id} {self.state} {self.url}>"
+
+
+class JobEvent:
+    """A notification emitted by the engine while a job runs.
+
+    kind is one of 'log', 'state', 'progress' or 'error'.
+    """
+
+    def __init__(self, kind, job, message=None, percent=None, data=None):
+        self.kind = kind
+        self.job = job
+        self.message = message
+        self.percent = percent
+        self.data = data or {}
+        self.time = time.time()
+
+    def __repr__(self):
+        return f"<JobEvent {self.kind} job={self.job.id} {self.message!r}>"
+
+
+class DownloadResult:
+    """Outcome of a finished, failed or cancelled job."""
+
+    def __init__(self, job, status, title=None, error=None, error_kind=None,
+                 error_title=None, elapsed=0.0, entries=None):
+        self.job = job
+        self.status = status
+        self.title = title
+        self.error = error
+        self.error_kind = error_kind
+        self.error_title = error_title
+        self.elapsed = elapsed
+        self.entries = entries
+        self.failed_entries = 0
+        self.skipped = 0  # Items left out because the download archive already had them
+
+    @property
+    def ok(self):
+        return self.status == FINISHED
+
+    @property
+    def output_path(self):
+        return self.job.options.output_path
+
+    def __repr__(self):
+        return f"<DownloadResult {self.job.id} {self.status} {self.title!r}>"
+
+
+def download_info(ydl, info, strict=False):
+    """Process and download an unprocessed info dict.
+
+    With strict=True 'ignoreerrors' is off for this attempt, so yt-dlp
+    raises DownloadError instead of only reporting it and stale cached info
+    can be detected.
+    """
+    if not strict:
+        ydl.process_ie_result(info, download=True)
+        return
+    ignoreerrors = ydl.params.get('ignoreerrors')
+    ydl.params['ignoreerrors'] = False
+    try:
+        ydl.process_ie_result(info, download=True)
+    finally:
+        ydl.params['ignoreerrors'] = ignoreerrors
+
+
+def format_timings(job, started):
+    """Summarise extraction and time-to-first-byte for a finished job."""
+    timings = job.timings
+    parts = []
+    extract = None
+    if 'extracted' in timings:
+        extract = timings['extracted'] - started
+        parts.append(f"extract {extract:.2f}s")
+    if 'first_byte' in timings:
+        parts.append(f"first byte after {timings['first_byte'] - started:.2f}s")
+    parts.append(f"total {time.time() - started:.2f}s")
+    message = "Timing: " + ", ".join(parts)
+    if timings.get('cached'):
+        message += " (metadata cache hit, extraction skipped)"
+    elif extract is not None:
+        # download([url]) would have paid the extraction a second time
+        message += f" (reused extracted info, saved ~{extract:.2f}s before first byte)"
+    return message
+
+
+def resolve_redirects(ydl, info, limit=5):
+    """Follow unprocessed 'url' results until a playlist or video is reached."""
+    while limit and info.get('_type') in ('url', 'url_transparent'):
+        info = ydl.extract_info(info['url'], download=False, process=False,
+                                ie_key=info.get('ie_key')) or {}
+        limit -= 1
+    return info
+
+
+def playlist_size_hint(info, max_files):
+    """Number of entries to expect, or None when the playlist is a stream."""
+    entries = info.get('entries')
+    count = info.get('playlist_count')
+    if count is None and isinstance(entries, (list, tuple)):
+        count = len(entries)
+    if count is None:
+        return None
+    return min(count, max_files)
+
+
+def iter_playlist_entries(info, max_files):
+    """Yield (playlist_index, entry) lazily for the first max_files entries."""
+    entries = info.get('entries') or []
+    if isinstance(entries, yt_dlp.utils.PagedList):
+        # Only the pages covering the requested range are fetched
+        entries = entries.getslice(0, max_files)
+    index = 0
+    for entry in itertools.islice(entries, max_files):
+        index += 1
+        if entry:
+            yield index, entry
+
+
+class ProgressAggregator:
+    """Keeps the latest progress sample per download and publishes it at a fixed rate.
+
+    update() is called from yt-dlp's progress hook for every callback and
+    only stores the sample. A publisher thread wakes when samples are
+    pending, waits interval seconds and hands the newest sample of each
+    download to publish(job, position, sample, log_due). finish() reports how
+    many of a job's updates were published.
+    """
+
+    def __init__(self, publish, interval=DEFAULT_PROGRESS_INTERVAL,
+                 log_interval=DEFAULT_PROGRESS_LOG_INTERVAL):
+        self.publish = publish
+        self.interval = interval
+        self.log_interval = log_interval
+        self._latest = {}  # (job, position) -> sample
+        self._job_counts = {}  # job -> [updates, published]
+        self._last_log = {}
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()  # Keeps publications in order
+        self._pending = threading.Event()
+        self._thread = None
+
+    def update(self, job, position, sample):
+        key = (job, position)
+        with self._lock:
+            self._latest[key] = sample
+            counts = self._job_counts.get(job)
+            if counts is None:
+                counts = self._job_counts[job] = [0, 0]
+            counts[0] += 1
+            if self._pending.is_set():
+                return
+            self._pending.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name="progress-publisher")
+                self._thread.start()
+
+    def flush(self, job=None):
+        """Publish pending samples now, for one job or for all of them."""
+        with self._publish_lock:
+            self._flush(job)
+
+    def _flush(self, job):
+        with self._lock:
+            if job is None:
+                batch, self._latest = self._latest, {}
+            else:
+                batch = {key: sample for key, sample in self._latest.items() if key[0] is job}
+                for key in batch:
+                    del self._latest[key]
+            if not self._latest:
+                self._pending.clear()
+        now = time.time()
+        for (batch_job, position), sample in batch.items():
+            log_due = now - self._last_log.get(batch_job, 0) >= self.log_interval
+            if log_due:
+                self._last_log[batch_job] = now
+            try:
+                self.publish(batch_job, position, sample, log_due)
+            except Exception as e:
+                print(f"Progress publish error: {e}")
+            with self._lock:
+                if batch_job in self._job_counts:
+                    self._job_counts[batch_job][1] += 1
+
+    def finish(self, job):
+        """Flush a finished job and return its (updates, published) counts."""
+        self.flush(job)
+        with self._lock:
+            self._last_log.pop(job, None)
+            updates, published = self._job_counts.pop(job, (0, 0))
+        return updates, published
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            time.sleep(self.interval)
+            self.flush()
+
+
+class PlaylistProgress:
+    """Combines per-entry percentages into one playlist percentage."""
+
+    def __init__(self, total):
+        self.total = max(1, total)
+        self._percent = {}
+        self._lock = threading.Lock()
+
+    def update(self, position, percent):
+        """Record an entry's progress and return the overall percentage."""
+        with self._lock:
+            self._percent[position] = max(percent, self._percent.get(position, 0))
+            return sum(self._percent.values()) / self.total
+
+
+def format_progress(d):
+    """Turn a yt-dlp 'downloading' progress dict into (percent, message)."""
+    total = d.get('total_bytes', 0) or d.get('total_bytes_estimate', 0)
+    downloaded = d.get('downloaded_bytes', 0)
+    if not total:
+        return None, None
+    percent = (downloaded / total) * 100
+    speed = d.get('speed', 0)
+    if speed:
+        eta = int(d.get('eta') or 0)
+        speed_str = f"{speed/1024/1024:.1f} MB/s"
+        eta_str = f"ETA: {eta//60}m {eta%60}s"
+        return percent, f"Downloading: {percent:.1f}% | Speed: {speed_str} | {eta_str}"
+    return percent, f"Downloading: {percent:.1f}%"
+
+
+class _ArchiveAfterProcessing:
+    """download_archive for a YoutubeDL whose files go to the post-processing pool.
+
+    yt-dlp records a video as soon as the hand-off returns; the key is only
+    written once the file has been processed, so a conversion that failed or
+    never ran is downloaded again next time.
+    """
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.task = None  # Future of the file handed off last
+
+    def __contains__(self, key):
+        return key in self.archive
+
+    def add(self, key):
+        task, self.task = self.task, None
+        if task is None:
+            self.archive.add(key)
+            return
+
+        def processed(future):
+            if future.exception() is None and future.result() is not None:
+                self.archive.add(key)
+        task.add_done_callback(processed)
+
+
+class DownloadEngine:
+    """Runs DownloadJobs through yt-dlp and reports JobEvents.
+
+    on_event is called from the worker thread; front-ends that own a UI are
+    expected to marshal it onto their own thread. When a JobStore is given,
+    every state change is persisted before the event is emitted; an
+    InfoCache lets repeat downloads of a URL skip extraction, a
+    FragmentTuner picks how many HLS/DASH fragments to fetch at once per
+    site, a BandwidthGovernor holds every running job to its weighted
+    share of the bandwidth limit, a DownloadArchive skips videos that
+    were downloaded before without extracting them, and a PostProcessPool
+    takes audio extraction and conversion off the download workers. Progress
+    events are coalesced and published at most every progress_interval
+    seconds per download; events flagged log=True are due for the log.
+    """
+
+    def __init__(self, on_event=None, store=None, info_cache=None,
+                 progress_interval=DEFAULT_PROGRESS_INTERVAL, fragment_tuner=None, governor=None,
+                 archive=None, post_pool=None):
+        self.on_event = on_event
+        self.store = store
+        self.info_cache = info_cache
+        self.fragment_tuner = fragment_tuner
+        self.governor = governor
+        self.archive = archive
+        self.post_pool = post_pool
+        self.progress = ProgressAggregator(self._publish_progress, progress_interval)
+
+    def emit(self, kind, job, message=None, percent=None, **data):
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(JobEvent(kind, job, message, percent, data))
+        except Exception as e:
+            print(f"Event handler error: {e}")
+
+    def log(self, job, message, level=None):
+        """Emit a log line; level is 'debug', 'info', 'warning' or 'error' when known."""
+        self.emit('log', job, message, level=level)
+
+    def set_state(self, job, state, message=None):
+        job.state = state
+        if self.store is not None:
+            try:
+                self.store.save(job)
+            except Exception as e:
+                print(f"Error saving job {job.id}: {e}")
+        self.emit('state', job, message or state)
+
+    def create_progress_hook(self, job, tracker=None, position=None):
+        """Create a yt-dlp progress hook bound to a job.
+
+        The hook only records the latest callback in the ProgressAggregator;
+        formatting and publishing happen on the aggregator's own schedule.
+        Playlist entries pass a PlaylistProgress tracker and their position so
+        the job reports the combined percentage of all its items.
+        """
+        def progress_hook(d):
+            if job.cancelled:
+                # Raise an exception to stop the download
+                raise DownloadCancelled("Download cancelled by user")
+            if d.get('status') == 'downloading' and 'first_byte' not in job.timings:
+                job.timings['first_byte'] = time.time()
+            self.progress.update(job, position, (d, tracker))
+            if (job.bandwidth is not None and d.get('status') == 'downloading'
+                    and not d.get('throttled')):
+                # Sleeps here while the job is over its share of the limit
+                job.bandwidth.consume_total(d.get('tmpfilename') or d.get('filename'),
+                                            d.get('downloaded_bytes'), lambda: job.cancelled)
+
+        return progress_hook
+
+    def _publish_progress(self, job, position, sample, log_due):
+        """Format the latest progress sample of a job and emit it."""
+        d, tracker = sample
+        status = d.get('status')
+        if status == 'downloading':
+            try:
+                percent, message = format_progress(d)
+            except Exception as e:
+                self.log(job, f"Progress error: {str(e)}")
+                return
+            if percent is None:
+                return
+        elif status == 'finished':
+            percent, message = 100, "Download complete! Processing..."
+        elif status == 'error':
+            self.emit('progress', job, f"Error occurred: {d.get('error', 'Unknown error')}", 0,
+                      log=True)
+            return
+        else:
+            return
+        if tracker is not None:
+            percent = tracker.update(position, percent)
+            message = f"Item {position}/{tracker.total} | {message}"
+        job.percent = percent
+        self.emit('progress', job, message, percent, log=log_due,
+                  downloaded=d.get('downloaded_bytes', 0),
+                  speed=d.get('speed'), eta=d.get('eta'))
+
+    def _prepare_output(self, output_path):
+        """Ensure the output folder exists and is writable."""
+        print("Checking output directory...")
+        if not output_path.exists():
+            print(f"Creating output directory: {output_path}")
+            output_path.mkdir(parents=True, exist_ok=True)
+        try:
+            test_file = output_path / "test_write.tmp"
+            with open(test_file, 'w') as f:
+                f.write("test")
+            test_file.unlink()
+            print("Output directory is writable")
+        except Exception as e:
+            print(f"Warning: Output directory may not be writable: {e}")
+
+    def _fail(self, job, error, started):
+        kind, title, message = classify_error(str(error))
+        self.log(job, f"{title}: {error}")
+        self.emit('error', job, message, error_kind=kind, error_title=title)
+        return DownloadResult(job, FAILED, title=job.title, error=message,
+                              error_kind=kind, error_title=title,
+                              elapsed=time.time() - started)
+
+    def run(self, job, on_processed=None):
+        """Download a job synchronously and return its DownloadResult.
+
+        With a post-processing pool the job may still be converting when this
+        returns: it is left PROCESSING, and on_processed(job) is called from a
+        pool worker once its final state has been set.
+        """
+        started = time.time()
+        options = job.options
+        url = job.url
+        if job.cancelled:
+            job.result = DownloadResult(job, CANCELLED)
+            self.set_state(job, CANCELLED)
+            return job.result
+        self.set_state(job, RUNNING, "Starting download...")
+        job.post_tasks = []
+        if self.governor is not None:
+            job.bandwidth = self.governor.open(f"job {job.id}", job.weight)
+
+        try:
+            result = self._run(job, options, url, started)
+        except DownloadCancelled:
+            result = None
+        except Exception as e:
+            print(traceback.format_exc())
+            result = self._fail(job, e, started)
+        finally:
+            if job.bandwidth is not None:
+                job.bandwidth.close()
+                job.bandwidth = None
+
+        if job.cancelled:
+            self.log(job, "Download cancelled")
+            result = DownloadResult(job, CANCELLED, title=job.title,
+                                    elapsed=time.time() - started)
+        # Publish the last sample so nothing arrives after the final state
+        updates, published = self.progress.finish(job)
+        if updates:
+            self.log(job, f"Progress: {updates} updates, {published} published, "
+                          f"{updates - published} coalesced", level='debug')
+        if result.ok and job.post_tasks:
+            # The download slot is free; the pool finishes the job
+            self.set_state(job, PROCESSING, "Processing downloaded files...")
+            self._await_processing(job, result, started, on_processed)
+            return result
+        job.result = result
+        self.set_state(job, result.status)
+        return result
+
+    def _await_processing(self, job, result, started, on_processed):
+        """Set the job's final state once every file it handed to the pool is done."""
+        tasks = list(job.post_tasks)
+        remaining = [len(tasks)]
+        lock = threading.Lock()
+
+        def task_done(future):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            self._finish_processing(job, result, tasks, started, on_processed)
+
+        for future in tasks:
+            future.add_done_callback(task_done)
+
+    def _finish_processing(self, job, result, tasks, started, on_processed):
+        errors = [future.exception() for future in tasks if future.exception() is not None]
+        if job.cancelled:
+            self.log(job, "Download cancelled")
+            result = DownloadResult(job, CANCELLED, title=job.title,
+                                    elapsed=time.time() - started)
+        elif errors and (not result.entries or len(errors) == len(tasks)):
+            result = self._fail(job, errors[0], started)
+        else:
+            result.failed_entries += len(errors)
+            result.elapsed = time.time() - started
+            self.log(job, f"? Processing completed: {len(tasks) - len(errors)}/{len(tasks)} files")
+        job.result = result
+        self.set_state(job, result.status)
+        if on_processed is not None:
+            try:
+                on_processed(job)
+            except Exception as e:
+                print(f"Processed handler error: {e}")
+
+    def _ydl(self, job, options, opts):
+        """A YoutubeDL for opts; with a post-processing pool its conversions are queued there."""
+        stream = job.bandwidth
+        if stream is not None:
+            # The segmented downloader's connections each wait for the job's share
+            opts['segmented_throttle'] = lambda nbytes: stream.consume(nbytes, lambda: job.cancelled)
+        if self.post_pool is None or not opts.get('postprocessors'):
+            return yt_dlp.YoutubeDL(opts)
+        opts['postprocessors'] = []
+        archive = opts.get('download_archive')
+        if archive is not None:
+            archive = opts['download_archive'] = _ArchiveAfterProcessing(archive)
+        ydl = yt_dlp.YoutubeDL(opts)
+        # after_move: the file is at its final path before anything converts it
+        ydl.add_post_processor(hand_off_postprocessor(
+            lambda info: self._hand_off(job, options, info, archive)), when='after_move')
+        return ydl
+
+    def _hand_off(self, job, options, info, archive=None):
+        """Queue a downloaded file for conversion; called on the download thread."""
+        self.log(job, f"Queued for processing: {os.path.basename(info['filepath'])}", level='debug')
+        task = self.post_pool.submit(self._post_process, job, options, info)
+        job.post_tasks.append(task)
+        if archive is not None:
+            archive.task = task
+
+    def _post_process(self, job, options, info):
+        """Run the job's conversions on one downloaded file, on a pool worker."""
+        if job.cancelled:
+            return None
+        name = os.path.basename(info['filepath'])
+        self.log(job, f"Processing {name}...")
+        started = time.time()
+        opts = {
+            'ffmpeg_location': options.ffmpeg_path,
+            'postprocessors': options.postprocessors(),
+            'quiet': False,
+            'verbose': True,
+        }
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            info = ydl.run_all_pps('post_process', info)
+        self.log(job, f"Processed {name} in {time.time() - started:.1f}s")
+        return info.get('filepath')
+
+    def _run(self, job, options, url, started):
+        if not url.startswith(('http://', 'https://')):
+            self.log(job, f"URL validation failed: {url}")
+            return DownloadResult(job, FAILED, error="Please enter a valid URL starting with http:// or https://",
+                                  error_kind='invalid_url', error_title="Error")
+
+        self.log(job, f"Output directory set to: {options.output_path}")
+        if options.is_audio:
+            self.log(job, "Downloading audio with settings:")
+            self.log(job, f"- Format: {options.format_code}")
+            self.log(job, f"- Quality: {options.audio_quality}kbps")
+        else:
+            self.log(job, "Downloading video with settings:")
+            self.log(job, f"- Format: {options.format_code}")
+            self.log(job, f"- Quality: {options.video_quality}")
+            self.log(job, f"- Output Format: {options.format}")
+
+        if options.playlist:
+            return self._run_playlist(job, options, url, started)
+        return self._run_single(job, options, url, started)
+
+    def _extract(self, job, ydl, url, started, process=True, cache=False):
+        """Extract info for a URL. Returns (info, None) or (None, failed result).
+
+        With cache=True the unprocessed info is looked up in and saved to the
+        engine's InfoCache.
+        """
+        if cache and self.info_cache is not None:
+            info = self.info_cache.get(url)
+            if info is not None:
+                job.timings['extracted'] = time.time()
+                job.timings['cached'] = True
+                self.log(job, f"Using cached video information ({self.info_cache.describe()})")
+                return info, None
+        self.log(job, "Extracting video information...")
+        try:
+            info = ydl.extract_info(url, download=False, process=process)
+            job.timings['extracted'] = time.time()
+            if info and cache and self.info_cache is not None:
+                self.info_cache.put(url, info)
+            if not info:
+                raise Exception("Failed to extract video information")
+            return info, None
+        except (DownloadCancelled, yt_dlp.utils.ExistingVideoReached):
+            raise
+        except Exception as extract_error:
+            self.log(job, f"Error extracting info: {str(extract_error)}")
+            return None, DownloadResult(job, FAILED,
+                                        error=f"Failed to extract video information: {str(extract_error)}",
+                                        error_kind='extract', error_title="Error",
+                                        elapsed=time.time() - started)
+
+    def _with_archive(self, options, opts):
+        """Add the download archive to a yt-dlp option dictionary."""
+        if self.archive is not None:
+            opts['download_archive'] = self.archive.for_options(options)
+            # Archived videos raise ExistingVideoReached instead of quietly returning None
+            opts['break_on_existing'] = True
+        return opts
+
+    def _archived(self, options, entry):
+        """True if a flat playlist entry is already in the download archive."""
+        return (self.archive is not None
+                and self.archive.for_options(options).contains(entry.get('ie_key'), entry.get('id')))
+
+    def _already_downloaded(self, job, started):
+        self.log(job, "? Already downloaded (found in the download archive), skipping")
+        result = DownloadResult(job, FINISHED, title=job.title, elapsed=time.time() - started)
+        result.skipped = 1
+        return result
+
+    def _tune_fragments(self, job, ydl, extractor, url):
+        """Set a YoutubeDL's fragment concurrency and measure what it achieves."""
+        if self.fragment_tuner is None:
+            return
+        run = self.fragment_tuner.start(extractor, job_host(url))
+        ydl.params['concurrent_fragment_downloads'] = run.concurrency
+        ydl.params.setdefault('retry_sleep_functions', {})['fragment'] = run.retry_sleep
+        ydl.add_progress_hook(run.progress_hook)
+        self.log(job, f"Fragments downloaded at once: {run.concurrency} ({run.key})", level='debug')
+
+    def _log_start(self, job, options, url):
+        self.log(job, f"? Download will be saved to: {options.output_path}")
+        self.log(job, f"? Starting download: {url}")
+        self.log(job, f"? Using quality settings: {options.describe()}")
+
+        if job.cancelled:
+            raise DownloadCancelled("Download cancelled by user")
+
+        self.log(job, "Starting download process...")
+        print("\n=== DOWNLOAD PROCESS STARTING ===")
+        print(f"URL: {url}")
+        print(f"Output path: {options.output_path}")
+        print(f"Format: {options.format_code}")
+        print(f"Is audio only: {options.is_audio}")
+        print(f"Is playlist: {options.playlist}")
+        print(f"FFmpeg path: {options.ffmpeg_path}")
+        print(f"Output template: {options.output_template}")
+
+        self._prepare_output(options.output_path)
+
+    def _run_single(self, job, options, url, started, info=None):
+        """Download a single video, retrying once with simpler options.
+
+        The page is extracted once without processing; the same info dict is
+        then handed to process_ie_result for format selection and download,
+        so yt-dlp never fetches the page a second time. Callers that already
+        hold the unprocessed info pass it in.
+        """
+        hook = self.create_progress_hook(job)
+        ydl = self._ydl(job, options, self._with_archive(options, options.build_ydl_opts(hook)))
+        if info is None:
+            try:
+                info, failure = self._extract(job, ydl, url, started, process=False, cache=True)
+            except yt_dlp.utils.ExistingVideoReached:
+                return self._already_downloaded(job, started)
+            if failure is not None:
+                return failure
+        self._tune_fragments(job, ydl, info.get('extractor_key') or info.get('ie_key'), url)
+        # process_ie_result fills the dict in place; the fallback needs it untouched
+        raw_info = copy.deepcopy(info)
+        from_cache = job.timings.get('cached', False)
+
+        job.title = info.get('title', 'Untitled')
+        self.log(job, f"? Downloading single video: {job.title}")
+        self._log_start(job, options, url)
+
+        print("Starting yt-dlp download...")
+        try:
+            try:
+                # First attempt - use the configured options
+                download_info(ydl, info, strict=from_cache)
+                print("yt-dlp download function completed")
+            except DownloadCancelled:
+                raise
+            except yt_dlp.utils.ExistingVideoReached:
+                return self._already_downloaded(job, started)
+            except Exception as primary_error:
+                if from_cache:
+                    # Cached stream URLs may have gone stale; extract afresh and retry
+                    self.log(job, f"Cached information failed ({primary_error}), extracting again...")
+                    self.info_cache.invalidate(url)
+                    job.timings.pop('cached', None)
+                    return self._run_single(job, options, url, started)
+                # If the primary method failed, try a fallback with simpler options
+                print("\n=== PRIMARY DOWNLOAD FAILED, TRYING FALLBACK ===")
+                print(f"Primary error: {str(primary_error)}")
+                fallback_opts = self._with_archive(options, options.build_fallback_opts(hook))
+                fallback_opts['break_on_existing'] = False
+                print(f"Trying fallback with simplified options: {fallback_opts}")
+                self._ydl(job, options, fallback_opts).process_ie_result(raw_info, download=True)
+                print("Fallback download completed")
+        except DownloadCancelled:
+            raise
+        except yt_dlp.utils.DownloadError as download_error:
+            print("\n=== DOWNLOAD ERROR DETAILS ===")
+            print(f"Error: {download_error}")
+            print(f"Error type: {type(download_error).__name__}")
+            return self._fail(job, download_error, started)
+
+        self.log(job, "? Download completed!")
+        self.log(job, f"?? Saved to: {options.output_path}")
+        self.log(job, format_timings(job, started))
+        return DownloadResult(job, FINISHED, title=job.title,
+                              elapsed=time.time() - started)
+
+    def _download_entry(self, ydl, entry, extra_info):
+        """Download one flat playlist entry, reusing cached info when possible."""
+        entry_url = entry.get('url')
+        if entry.get('_type', 'url') not in ('url', 'url_transparent') or not entry_url:
+            ydl.process_ie_result(entry, download=True, extra_info=extra_info)
+            return
+        info = self.info_cache.get(entry_url) if self.info_cache is not None else None
+        if info is not None:
+            try:
+                ydl.process_ie_result(info, download=True, extra_info=extra_info)
+                return
+            except (DownloadCancelled, yt_dlp.utils.ExistingVideoReached):
+                raise
+            except Exception as e:
+                print(f"Cached info for {entry_url} failed ({e}), extracting again")
+                self.info_cache.invalidate(entry_url)
+        info = ydl.extract_info(entry_url, download=False, process=False,
+                                ie_key=entry.get('ie_key'))
+        if info and self.info_cache is not None:
+            self.info_cache.put(entry_url, info)
+        ydl.process_ie_result(info, download=True, extra_info=extra_info)
+
+    def _run_playlist(self, job, options, url, started):
+        """Stream a playlist's entries and download up to playlist_workers at once.
+
+        The playlist is extracted flat and unprocessed, so entries are pulled
+        page by page as workers free up instead of being resolved up front.
+        At most twice the worker count of entries are held in memory however
+        long the playlist is. Each entry gets its own YoutubeDL instance and
+        its playlist fields as extra_info, so %(playlist_index)s names the
+        files as a sequential playlist download would.
+        """
+        flat_opts = options.build_ydl_opts(None)
+        flat_opts.update({'extract_flat': 'in_playlist', 'lazy_playlist': True})
+        flat_ydl = yt_dlp.YoutubeDL(flat_opts)
+        info, failure = self._extract(job, flat_ydl, url, started, process=False)
+        if failure is not None:
+            return failure
+        info = resolve_redirects(flat_ydl, info)
+
+        if 'entries' not in info:
+            # The URL turned out to be a single video
+            return self._run_single(job, options, url, started, info=info)
+
+        job.title = info.get('title', 'Untitled')
+        expected = playlist_size_hint(info, options.max_files)
+        self.log(job, f"? Downloading playlist: {job.title}")
+        self.log(job, f"?? Number of items: {expected if expected is not None else 'streaming'}")
+        self.log(job, f"?? Downloading first {options.max_files} items")
+        self._log_start(job, options, url)
+
+        # Index width follows the last index, like yt-dlp's own padding
+        last_index = expected or options.max_files
+        tracker = PlaylistProgress(last_index)
+        playlist_fields = {
+            'playlist': info.get('title') or info.get('id'),
+            'playlist_id': info.get('id'),
+            'playlist_title': info.get('title'),
+            'playlist_uploader': info.get('uploader'),
+            'playlist_uploader_id': info.get('uploader_id'),
+            'playlist_count': info.get('playlist_count'),
+            '__last_playlist_index': last_index,
+        }
+
+        def download_entry(index, entry):
+            if job.cancelled:
+                return None
+            extra_info = dict(playlist_fields, playlist_index=index,
+                              playlist_autonumber=index)
+            entry_opts = self._with_archive(
+                options, options.build_ydl_opts(self.create_progress_hook(job, tracker, index)))
+            entry_opts.update({'noplaylist': True, 'playlist_items': None, 'ignoreerrors': False})
+            try:
+                with self._ydl(job, options, entry_opts) as ydl:
+                    self._tune_fragments(job, ydl, entry.get('ie_key') or info.get('extractor_key'),
+                                         entry.get('url') or url)
+                    self._download_entry(ydl, entry, extra_info)
+                tracker.update(index, 100)
+                return None
+            except DownloadCancelled:
+                return None
+            except yt_dlp.utils.ExistingVideoReached:
+                skipped.append(index)
+                tracker.update(index, 100)
+                return None
+            except Exception as e:
+                title = entry.get('title') or entry.get('url')
+                self.log(job, f"Item {index} failed ({title}): {e}")
+                return str(e)
+
+        errors = []
+        skipped = []
+        count = 0
+        workers = options.playlist_workers
+        slots = threading.BoundedSemaphore(workers * 2)
+        print(f"Streaming up to {options.max_files} playlist items, {workers} at a time...")
+
+        def release(future):
+            slots.release()
+            error = future.result()
+            if error:
+                errors.append(error)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                   thread_name_prefix=f"playlist-{job.id}") as pool:
+            for index, entry in iter_playlist_entries(info, options.max_files):
+                if job.cancelled:
+                    break
+                if self._archived(options, entry):
+                    # Known from the flat entry alone: no worker, no extraction
+                    skipped.append(index)
+                    tracker.update(index, 100)
+                    continue
+                # Wait for a free slot before pulling the next page of entries
+                slots.acquire()
+                count += 1
+                pool.submit(download_entry, index, entry).add_done_callback(release)
+
+        if job.cancelled:
+            raise DownloadCancelled("Download cancelled by user")
+
+        self.log(job, f"? Playlist download completed! {count - len(errors)}/{count} items")
+        if skipped:
+            self.log(job, f"?? {len(skipped)} items were already downloaded")
+        self.log(job, f"?? Saved to: {options.output_path}")
+        if count and len(errors) == count:
+            return self._fail(job, errors[0], started)
+        result = DownloadResult(job, FINISHED, title=job.title,
+                                elapsed=time.time() - started, entries=count)
+        result.failed_entries = len(errors)
+        result.skipped = len(skipped)
+        return result
+
+class DownloadQueue:
+    """Runs jobs concurrently through a bounded pool of worker threads.
+
+    At most max_workers jobs run at once and at most per_host_limit of them
+    talk to the same site. Jobs the engine has handed to its post-processing
+    pool no longer hold a worker but still count until they finish. on_idle
+    is called from a worker thread whenever the queue drains.
+    """
+
+    def __init__(self, engine, max_workers=DEFAULT_MAX_WORKERS,
+                 per_host_limit=DEFAULT_PER_HOST_LIMIT, on_idle=None):
+        self.engine = engine
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.on_idle = on_idle
+        self.jobs = []  # Every submitted job, in submission order
+        self._pending = collections.deque()
+        self._running = set()
+        self._processing = set()  # Downloaded, still in the engine's post-processing pool
+        self._queued_at = {}
+        self.meter = StageMeter("download", self.max_workers)
+        self._host_counts = collections.Counter()
+        self._cond = threading.Condition()
+        self._worker_count = 0
+        self._closed = False
+
+    def submit(self, job):
+        """Queue a job and return it."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Download queue has been shut down")
+            self.jobs.append(job)
+        # Persist before a worker can pick the job up so it keeps its id
+        self.engine.set_state(job, QUEUED)
+        with self._cond:
+            self._pending.append(job)
+            self._queued_at[job] = time.monotonic()
+            self._spawn_workers()
+            self._cond.notify_all()
+        return job
+
+    def set_limits(self, max_workers=None, per_host_limit=None):
+        """Change pool size or per-site cap while jobs are running."""
+        with self._cond:
+            if max_workers is not None:
+                self.max_workers = max(1, int(max_workers))
+                self.meter.set_workers(self.max_workers)
+            if per_host_limit is not None:
+                self.per_host_limit = max(1, int(per_host_limit))
+            self._spawn_workers()
+            self._cond.notify_all()
+
+    def cancel(self, job):
+        """Cancel a queued or running job."""
+        job.cancel()
+        with self._cond:
+            if job not in self._pending:
+                return
+            self._pending.remove(job)
+            self._queued_at.pop(job, None)
+        self.engine.set_state(job, CANCELLED)
+        self._check_idle()
+
+    def cancel_all(self):
+        for job in self.active_jobs():
+            self.cancel(job)
+
+    def active_jobs(self):
+        """Jobs that are queued, running or being processed."""
+        with self._cond:
+            return list(self._running | self._processing) + list(self._pending)
+
+    def counts(self):
+        """Number of known jobs in each state."""
+        with self._cond:
+            return collections.Counter(job.state for job in self.jobs)
+
+    def is_idle(self):
+        with self._cond:
+            return not self._pending and not self._running and not self._processing
+
+    def join(self, timeout=None):
+        """Block until every queued job has finished. Returns True when idle."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._pending or self._running or self._processing:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def describe_stages(self):
+        """Utilisation of the download and post-processing stages since the last reset."""
+        pool = self.engine.post_pool
+        return describe_stages(self.meter, pool.meter if pool is not None else None)
+
+    def reset_stages(self):
+        self.meter.reset()
+        if self.engine.post_pool is not None:
+            self.engine.post_pool.meter.reset()
+
+    def shutdown(self, cancel=True):
+        """Stop accepting jobs and let idle workers exit."""
+        if cancel:
+            self.cancel_all()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _spawn_workers(self):
+        while self._worker_count < self.max_workers:
+            self._worker_count += 1
+            threading.Thread(target=self._worker, daemon=True,
+                             name=f"download-worker-{self._worker_count}").start()
+
+    def _take_job(self):
+        """Pop the first pending job whose site is below its cap."""
+        for job in self._pending:
+            if self._host_counts[job_host(job.url)] < self.per_host_limit:
+                self._pending.remove(job)
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed or self._worker_count > self.max_workers:
+                        self._worker_count -= 1
+                        return
+                    job = self._take_job()
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                host = job_host(job.url)
+                self._host_counts[host] += 1
+                self._running.add(job)
+                # Added before the run so a pool that finishes first cannot be missed
+                self._processing.add(job)
+                waited = time.monotonic() - self._queued_at.pop(job, time.monotonic())
+
+            self.meter.start(waited)
+            try:
+                self.engine.run(job, on_processed=self._processed)
+            except Exception as e:
+                print(f"Worker error on job {job.id}: {e}")
+                print(traceback.format_exc())
+            finally:
+                self.meter.stop()
+                with self._cond:
+                    self._host_counts[host] -= 1
+                    self._running.discard(job)
+                    if job.state != PROCESSING:
+                        self._processing.discard(job)
+                    self._cond.notify_all()
+            self._check_idle()
+
+    def _processed(self, job):
+        """Called by the engine from a pool worker when a processed job is done."""
+        with self._cond:
+            self._processing.discard(job)
+            self._cond.notify_all()
+        self._check_idle()
+
+    def _check_idle(self):
+        if self.on_idle is not None and self.is_idle():
+            try:
+                self.on_idle()
+            except Exception as e:
+                print(f"Idle handler error: {e}")
+
+
+def benchmark_progress_hook(calls=200000):
+    """Measure what the progress hook costs the thread that downloads."""
+    import queue
+    engine = DownloadEngine()
+    job = DownloadJob('https://example.com/benchmark', DownloadOptions())
+    samples = [{'status': 'downloading', 'total_bytes': 1000, 'downloaded_bytes': i,
+                'speed': 5e6, 'eta': 1} for i in range(1000)]
+    ui_queue = queue.Queue()
+
+    def no_hook(d):
+        pass
+
+    def per_callback_hook(d):
+        # What the GUI used to do on every callback, minus the Tk work
+        percent, message = format_progress(d)
+        ui_queue.put(lambda: (percent, message))
+
+    results = {}
+    for name, hook in (('no hook', no_hook),
+                       ('per-callback publish', per_callback_hook),
+                       ('coalesced hook', engine.create_progress_hook(job))):
+        start = time.perf_counter()
+        for i in range(calls):
+            hook(samples[i % 1000])
+        elapsed = time.perf_counter() - start
+        results[name] = elapsed
+        print(f"{name:>22}: {elapsed / calls * 1e9:7.0f} ns per callback "
+              f"({calls / elapsed:,.0f} callbacks/s)")
+    updates, published = engine.progress.finish(job)
+    print(f"coalesced hook published {published} of {updates} updates "
+          f"({updates - published} dropped), per-callback publish queued {ui_queue.qsize()}")
+    return results
+
+
+def main(argv=None):
+    """Command line front-end for headless batch downloads."""
+    parser = argparse.ArgumentParser(description="Media Downloader (headless)")
+    parser.add_argument('urls', nargs='*', help="media URLs to download")
+    parser.add_argument('--audio', action='store_true', help="extract audio as mp3")
+    parser.add_argument('--quality', default='best', help="video height limit or 'best'")
+    parser.add_argument('--audio-quality', default='320', help="mp3 bitrate in kbps")
+    parser.add_argument('--format', default='mp4', choices=['mp4', 'webm', 'mkv'])
+    parser.add_argument('--playlist', action='store_true', help="download whole playlists")
+    parser.add_argument('--max-files', type=int, default=100)
+    parser.add_argument('--playlist-workers', type=int, default=DEFAULT_PLAYLIST_WORKERS,
+                        help="playlist items to download at once")
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS,
+                        help="HTTP connections per file for direct media links")
+    parser.add_argument('--priority', default=DEFAULT_PRIORITY, choices=list(PRIORITY_WEIGHTS),
+                        help="share of --limit-rate these downloads get next to other jobs")
+    parser.add_argument('--output', default=str(DEFAULT_DOWNLOADS_PATH))
+    parser.add_argument('--ffmpeg', default=None, help="path to ffmpeg executable")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help="number of downloads to run at once")
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST_LIMIT,
+                        help="maximum concurrent downloads from one site")
+    parser.add_argument('--post-workers', type=int, default=None,
+                        help="files to convert at once (default: half the CPU cores; 0 converts in the download worker)")
+    parser.add_argument('--store', default=None,
+                        help="SQLite job store; unfinished jobs in it are resumed")
+    parser.add_argument('--info-cache', default=None,
+                        help="SQLite metadata cache shared between runs")
+    parser.add_argument('--download-archive', default=None, metavar='FOLDER',
+                        help="folder for the record of downloaded videos; they are skipped next time")
+    parser.add_argument('--fragment-tuning', default=None,
+                        help="JSON file where tuned HLS/DASH fragment concurrency is kept")
+    parser.add_argument('--limit-rate', default=None,
+                        help="total download speed for all jobs, e.g. 500K or 2M")
+    parser.add_argument('--unlimited-hours', default=None, metavar='HH:MM-HH:MM',
+                        help="time window in which --limit-rate does not apply")
+    parser.add_argument('--bench-progress', type=int, metavar='CALLS', default=None,
+                        help="benchmark the progress hook with CALLS callbacks and exit")
+    args = parser.parse_args(argv)
+
+    if args.bench_progress:
+        benchmark_progress_hook(args.bench_progress)
+        return 0
+
+    def print_event(event):
+        if event.kind in ('log', 'error', 'state'):
+            print(f"[job {event.job.id}] {event.message}")
+
+    store = None
+    if args.store:
+        from job_store import JobStore
+        store = JobStore(args.store)
+
+    info_cache = None
+    if args.info_cache:
+        from info_cache import InfoCache
+        info_cache = InfoCache(args.info_cache)
+
+    fragment_tuner = FragmentTuner(args.fragment_tuning)
+
+    governor = None
+    if args.limit_rate:
+        schedule = []
+        if args.unlimited_hours:
+            schedule.append(parse_window(args.unlimited_hours) + (None,))
+        governor = BandwidthGovernor(parse_rate(args.limit_rate), schedule)
+
+    archive = None
+    if args.download_archive:
+        from download_archive import DownloadArchive
+        Path(args.download_archive).mkdir(parents=True, exist_ok=True)
+        archive = DownloadArchive(args.download_archive,
+                                  on_load=lambda archive_set: print(f"Download archive: {archive_set.describe()}"))
+
+    post_pool = PostProcessPool(args.post_workers) if args.post_workers != 0 else None
+
+    engine = DownloadEngine(on_event=print_event, store=store, info_cache=info_cache,
+                            fragment_tuner=fragment_tuner, governor=governor, archive=archive,
+                            post_pool=post_pool)
+    download_queue = DownloadQueue(engine, max_workers=args.workers,
+                                   per_host_limit=args.per_host)
+    started = time.time()
+    if store is not None:
+        for job in store.unfinished():
+            print(f"[job {job.id}] Resuming: {job.url}")
+            download_queue.submit(job)
+    if not download_queue.jobs and not args.urls:
+        parser.error("no URLs given and nothing to resume")
+    for url in args.urls:
+        options = DownloadOptions(is_audio=args.audio, video_quality=args.quality,
+                                  audio_quality=args.audio_quality, format=args.format,
+                                  playlist=args.playlist, max_files=args.max_files,
+                                  output_root=args.output, ffmpeg_path=args.ffmpeg,
+                                  playlist_workers=args.playlist_workers,
+                                  connections=args.connections, priority=args.priority)
+        download_queue.submit(DownloadJob(url, options))
+    try:
+        download_queue.join()
+    except KeyboardInterrupt:
+        if store is not None:
+            # Leave the jobs in the store so the next run resumes them
+            print("Interrupted; unfinished jobs will resume on the next run")
+            store.close()
+            return 130
+        download_queue.shutdown()
+        download_queue.join(timeout=10)
+
+    failed = 0
+    for job in download_queue.jobs:
+        elapsed = job.result.elapsed if job.result else 0.0
+        print(f"[job {job.id}] {job.state} in {elapsed:.1f}s: {job.url}")
+        if job.state != FINISHED:
+            failed += 1
+    print(f"{len(download_queue.jobs)} jobs in {time.time() - started:.1f}s, {failed} not finished")
+    print(download_queue.describe_stages())
+    if info_cache is not None:
+        print(f"Metadata cache: {info_cache.describe()}")
+    if store is not None:
+        store.prune()
+        store.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
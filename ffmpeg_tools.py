@@ -0,0 +1,351 @@
+"""FFmpeg and FFprobe capability records.
+
+Running `ffmpeg -version` costs a process start (and on Windows often a
+virus scan of the binary), and the app used to do it several times before
+it was ready. Probing is now done once per binary: the version, build
+configuration, encoders and muxers are stored in a small JSON file keyed by
+the binary's path, size and modification time, and reused until the file
+on disk changes.
+"""
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+from http_fetch import ChecksumError, fetch, fetch_checksum
+
+# Bump when the record layout changes so old files are re-probed
+RECORD_VERSION = 1
+
+CREATE_NO_WINDOW = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+# Windows builds to install from, in order of preference, with the URL of
+# the checksum file each publisher provides
+FFMPEG_SOURCES = [
+    ("https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl.zip",
+     "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/checksums.sha256"),
+    ("https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip",
+     "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip.sha256"),
+    ("https://github.com/GyanD/codexffmpeg/releases/download/2023-10-08-git-10a3e7e0f8/ffmpeg-2023-10-08-git-10a3e7e0f8-essentials_build.zip",
+     None),
+]
+FFMPEG_BINARIES = ('ffmpeg.exe', 'ffprobe.exe')
+
+# Release feed for the BtbN builds, and how often to ask it
+FFMPEG_RELEASE_API = "https://api.github.com/repos/BtbN/FFmpeg-Builds/releases/latest"
+FFMPEG_CHECK_INTERVAL = 7 * 86400
+# Tags that are moved to every new build, so they say nothing about which build it is
+ROLLING_TAGS = ('latest',)
+
+
+def _binary_key(path):
+    path = os.path.normcase(os.path.abspath(str(path)))
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+def _run(path, *args, timeout=30):
+    return subprocess.run([str(path), *args], capture_output=True, text=True, errors='replace',
+                          timeout=timeout, creationflags=CREATE_NO_WINDOW)
+
+
+def parse_version(output):
+    """(version, first line, configure flags) from `-version` output."""
+    lines = output.splitlines()
+    first = lines[0] if lines else ''
+    parts = first.split()
+    version = parts[2] if len(parts) > 2 and parts[1] == 'version' else None
+    buildconf = []
+    for line in lines:
+        if line.startswith('configuration:'):
+            buildconf = line.split(':', 1)[1].split()
+            break
+    return version, first, buildconf
+
+
+def parse_table(output):
+    """(flags, name) rows from `-encoders` / `-muxers` listings."""
+    rows = []
+    started = False
+    for line in output.splitlines():
+        stripped = line.strip()
+        if not started:
+            # The legend ends with a line of dashes
+            started = stripped.startswith('--')
+            continue
+        parts = stripped.split(None, 2)
+        if len(parts) >= 2:
+            rows.append((parts[0], parts[1]))
+    return rows
+
+
+class Capabilities:
+    """What one ffmpeg or ffprobe binary reported about itself."""
+
+    def __init__(self, path, size=None, mtime_ns=None, ok=False, version=None,
+                 version_line='', buildconf=None, encoders=None, muxers=None,
+                 full=False, error=None, probed=None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.ok = ok
+        self.version = version
+        self.version_line = version_line
+        self.buildconf = buildconf or []
+        self.encoders = encoders or {}  # name -> 'V', 'A' or 'S'
+        self.muxers = muxers or []
+        self.full = full  # encoders and muxers were listed too
+        self.error = error
+        self.probed = probed
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    def has_muxer(self, name):
+        return name in self.muxers
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def probe(path, full=True):
+    """Run the binary and return its Capabilities (always spawns processes)."""
+    _, size, mtime_ns = _binary_key(path)
+    caps = Capabilities(str(path), size, mtime_ns, full=full, probed=time.time())
+    try:
+        result = _run(path, '-version')
+        if result.returncode != 0:
+            caps.error = (result.stderr or '').strip()[:500] or f"exit code {result.returncode}"
+            return caps
+        caps.version, caps.version_line, caps.buildconf = parse_version(result.stdout)
+        if full:
+            result = _run(path, '-hide_banner', '-encoders')
+            if result.returncode == 0:
+                caps.encoders = {name: flags[0] for flags, name in parse_table(result.stdout)}
+            result = _run(path, '-hide_banner', '-muxers')
+            if result.returncode == 0:
+                caps.muxers = [name for flags, name in parse_table(result.stdout) if 'E' in flags]
+        caps.ok = True
+    except (OSError, subprocess.SubprocessError) as e:
+        caps.error = str(e)
+    return caps
+
+
+def probe_media(ffprobe_path, path, timeout=60):
+    """ffprobe's JSON description of a media file's format and streams."""
+    result = _run(ffprobe_path, '-hide_banner', '-loglevel', 'error', '-show_format', '-show_streams',
+                  '-print_format', 'json', str(path), timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError((result.stderr or '').strip()[:500] or f"ffprobe exit code {result.returncode}")
+    return json.loads(result.stdout)
+
+
+class CapabilityCache:
+    """Persisted Capabilities keyed by (path, size, mtime)."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.probes = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._records = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != RECORD_VERSION:
+                return {}
+            return data.get('binaries', {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': RECORD_VERSION, 'binaries': self._records}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save FFmpeg capabilities: {e}")
+
+    def get(self, path, full=True):
+        """Capabilities for a binary, probing only if it changed since last time."""
+        try:
+            key_path, size, mtime_ns = _binary_key(path)
+        except OSError as e:
+            return Capabilities(str(path), error=str(e))
+        with self._lock:
+            record = self._records.get(key_path)
+            if (record and record.get('size') == size and record.get('mtime_ns') == mtime_ns
+                    and record.get('ok') and (record.get('full') or not full)):
+                self.hits += 1
+                return Capabilities.from_dict(record)
+            caps = probe(path, full=full)
+            self.probes += 1
+            if caps.ok:
+                self._records[key_path] = caps.to_dict()
+            else:
+                self._records.pop(key_path, None)
+            self._save()
+            return caps
+
+
+def extract_members(zip_path, dest_dir, names=FFMPEG_BINARIES):
+    """Copy just the named files out of a zip, wherever they sit inside it."""
+    dest_dir = Path(dest_dir)
+    wanted = {name.lower(): name for name in names}
+    staged = {}
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                base = info.filename.rsplit('/', 1)[-1].lower()
+                if base in wanted and wanted[base] not in staged and not info.is_dir():
+                    target = dest_dir / (wanted[base] + '.new')
+                    with archive.open(info) as src, open(target, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    staged[wanted[base]] = target
+        missing = [name for name in names if name not in staged]
+        if missing:
+            raise FileNotFoundError(f"{', '.join(missing)} not found in {Path(zip_path).name}")
+        # Only replace the old binaries once every member extracted cleanly
+        for name, target in staged.items():
+            os.replace(target, dest_dir / name)
+        return {name: dest_dir / name for name in names}
+    finally:
+        for target in staged.values():
+            if target.exists():
+                target.unlink()
+
+
+def install_ffmpeg(url, checksum_url, dest_dir, get=None, on_progress=None, probe=None, scores=None,
+                   throttle=None):
+    """Download one FFmpeg build, verify it and install ffmpeg/ffprobe into dest_dir.
+
+    probe and scores come from http_fetch.rank_mirrors() and MirrorScores;
+    throttle is passed on to fetch(). Raises ChecksumError if the source
+    publishes a checksum that cannot be fetched, so the caller moves on to
+    the next source; only a source without checksum_url installs unverified.
+    """
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    filename = url.rsplit('/', 1)[-1]
+    expected = fetch_checksum(checksum_url, filename, get=get) if checksum_url else None
+    if checksum_url and not expected:
+        raise ChecksumError(f"Could not get the published checksum for {filename}, not installing it")
+    zip_path = dest_dir / filename
+    fetch(url, zip_path, get=get, expected_sha256=expected, on_progress=on_progress,
+          probe=probe, scores=scores, throttle=throttle)
+    try:
+        return extract_members(zip_path, dest_dir)
+    finally:
+        try:
+            zip_path.unlink()
+        except OSError:
+            pass
+
+
+def release_time(release):
+    """When a release's build was made: the newest of its publish and asset upload times."""
+    times = [release.get('published_at')] + list((release.get('asset_updated') or {}).values())
+    times = [t for t in times if t]
+    return max(times) if times else None
+
+
+def _utc_now():
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+
+class FFmpegManifest:
+    """Which FFmpeg build is installed and what the release feed said last time.
+
+    Stored as JSON next to the binaries. Release checks send the saved ETag
+    so an unchanged feed costs a 304, and are skipped entirely within
+    FFMPEG_CHECK_INTERVAL of the previous one.
+    """
+
+    def __init__(self, path, check_interval=FFMPEG_CHECK_INTERVAL):
+        self.path = str(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save FFmpeg manifest: {e}")
+
+    @property
+    def installed_tag(self):
+        return self.data.get('installed_tag')
+
+    def record_install(self, source_url, tag=None, published=None):
+        """Remember the build that was just installed."""
+        with self._lock:
+            self.data['source'] = source_url
+            self.data['installed_tag'] = tag
+            self.data['installed_published'] = published or _utc_now()
+            self._save()
+
+    def installed_published(self, binary_path=None):
+        """Publish time of the installed build, or its install time if unknown."""
+        published = self.data.get('installed_published')
+        if not published and binary_path and os.path.exists(binary_path):
+            published = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(os.path.getmtime(binary_path)))
+        return published
+
+    def due(self):
+        return time.time() - self.data.get('checked', 0) >= self.check_interval
+
+    def check(self, get, binary_path=None, force=False, headers=None):
+        """The latest release dict if it is newer than the installed build, else None."""
+        with self._lock:
+            if not force and not self.due():
+                return None
+            request_headers = dict(headers or {})
+            if self.data.get('etag') and self.data.get('latest'):
+                request_headers['If-None-Match'] = self.data['etag']
+            response = get(FFMPEG_RELEASE_API, headers=request_headers, timeout=10)
+            if response.status_code == 304:
+                release = self.data['latest']
+            else:
+                response.raise_for_status()
+                full = response.json()
+                release = {
+                    'tag_name': full.get('tag_name'),
+                    'published_at': full.get('published_at'),
+                    'assets': {asset.get('name'): asset.get('browser_download_url')
+                               for asset in full.get('assets', [])},
+                    # Rolling releases replace their assets without changing the tag
+                    'asset_updated': {asset.get('name'): asset.get('updated_at')
+                                      for asset in full.get('assets', [])},
+                }
+                self.data['latest'] = release
+                self.data['etag'] = response.headers.get('ETag')
+            self.data['checked'] = time.time()
+            self._save()
+
+        installed = self.installed_published(binary_path)
+        tag = release.get('tag_name')
+        if tag and tag not in ROLLING_TAGS and tag == self.installed_tag:
+            return None
+        built = release_time(release)
+        if installed and built and built <= installed:
+            return None
+        return release
@@ -0,0 +1,271 @@
+"""Adaptive fragment concurrency for HLS and DASH downloads.
+
+yt-dlp fetches the fragments of a segmented stream one at a time unless
+concurrent_fragment_downloads says otherwise, and the right number depends
+on the site and the CDN behind it. FragmentTuner keeps a setting per
+(extractor, host) in a small JSON file and adjusts it after every
+fragmented download: it starts from a baseline, grows while the measured
+throughput keeps improving, settles on the best value once it stops, and
+backs off when fragments fail or the server starts answering 429. Settled
+entries try one step higher now and then, in case the link got faster.
+
+Run the module directly to watch the tuner converge against a synthetic
+HLS stream served on localhost, with a per-request latency and a cap on
+parallel requests above which the server answers 429:
+
+    python fragment_tuner.py [DOWNLOADS] [MAX_PARALLEL]
+"""
+import http.server
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BASELINE_CONCURRENCY = 2
+MAX_CONCURRENCY = 16
+MIN_FRAGMENTS = 8  # Shorter downloads are too noisy to learn from
+IMPROVEMENT = 1.05  # A step up must be at least this much faster to count
+RATE_WEIGHT = 0.5  # Weight of a new measurement in a setting's running rate
+ERROR_RATE = 0.02  # Failed fragments per fragment that count as overloading the server
+EXPLORE_EVERY = 5  # Settled downloads between attempts at a higher setting
+MAX_RETRY_SLEEP = 10.0
+
+
+class FragmentRun:
+    """Measures one download's fragments; wired into its YoutubeDL options."""
+
+    def __init__(self, tuner, key, concurrency):
+        self.tuner = tuner
+        self.key = key
+        self.concurrency = concurrency
+        self.errors = 0
+        self.fragments = None
+        self._lock = threading.Lock()
+
+    def retry_sleep(self, n):
+        """yt-dlp retry_sleep_functions['fragment']: count the failure and back off."""
+        with self._lock:
+            self.errors += 1
+        return min(MAX_RETRY_SLEEP, 0.5 * 2 ** n)
+
+    def progress_hook(self, d):
+        if d.get('status') == 'downloading' and d.get('fragment_count'):
+            # fragment_count is absent from the finished callback
+            self.fragments = d['fragment_count']
+        elif d.get('status') == 'finished' and self.fragments:
+            size = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+            with self._lock:
+                errors, self.errors = self.errors, 0
+            fragments, self.fragments = self.fragments, None
+            self.tuner.record(self.key, self.concurrency, size, d.get('elapsed') or 0,
+                              fragments, errors)
+
+
+class FragmentTuner:
+    """concurrent_fragment_downloads per (extractor, host), tuned from measured throughput."""
+
+    def __init__(self, path=None, baseline=BASELINE_CONCURRENCY, maximum=MAX_CONCURRENCY):
+        self.path = str(path) if path else None
+        self.baseline = baseline
+        self.maximum = maximum
+        self._lock = threading.Lock()
+        self._entries = {}
+        if self.path:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save fragment tuning: {e}")
+
+    @staticmethod
+    def key(extractor, host):
+        return f"{extractor or 'generic'}:{host or ''}".lower()
+
+    def _entry(self, key):
+        return self._entries.setdefault(key, {
+            'next': self.baseline,
+            'best': self.baseline,
+            'best_rate': 0.0,
+            'ceiling': self.maximum,
+            'rates': {},
+            'settled': 0,
+        })
+
+    def choose(self, key):
+        """Concurrency to use for the next download under key."""
+        with self._lock:
+            if key not in self._entries:
+                return self.baseline
+            return self._entries[key]['next']
+
+    def start(self, extractor, host):
+        """A FragmentRun for one download, with the concurrency it should use."""
+        key = self.key(extractor, host)
+        return FragmentRun(self, key, self.choose(key))
+
+    def record(self, key, concurrency, size, seconds, fragments, errors):
+        """Fold one finished download into the key's entry and pick the next setting."""
+        if fragments < MIN_FRAGMENTS or seconds <= 0 or size <= 0:
+            return
+        rate = size / seconds
+        with self._lock:
+            entry = self._entry(key)
+            rates = entry['rates']
+            previous = rates.get(str(concurrency))
+            rates[str(concurrency)] = rate if previous is None else (
+                previous * (1 - RATE_WEIGHT) + rate * RATE_WEIGHT)
+            rate = rates[str(concurrency)]
+
+            if errors > max(1, fragments * ERROR_RATE):
+                # The server pushed back: do not climb past this again soon, and go
+                # back to the best setting, or halve if that is what failed
+                entry['ceiling'] = max(1, concurrency - 1)
+                if concurrency <= entry['best']:
+                    entry['best'] = max(1, concurrency // 2)
+                    entry['best_rate'] = rates.get(str(entry['best']), 0.0)
+                entry['next'] = entry['best']
+                entry['settled'] = 0
+                reason = f"{errors} fragment retries"
+            elif concurrency != entry['best'] and rate > entry['best_rate'] * IMPROVEMENT:
+                entry['best'], entry['best_rate'] = concurrency, rate
+                entry['next'] = min(entry['ceiling'], concurrency + max(1, concurrency // 2))
+                entry['settled'] = 0
+                reason = "faster"
+            elif concurrency != entry['best']:
+                entry['next'] = entry['best']
+                entry['settled'] = 0
+                reason = "no faster than " + str(entry['best'])
+            elif previous is None:
+                # First measurement of this setting: try the next step up
+                entry['best_rate'] = rate
+                entry['next'] = min(entry['ceiling'], concurrency + max(1, concurrency // 2))
+                reason = "baseline"
+            else:
+                entry['best_rate'] = rate
+                entry['settled'] += 1
+                if entry['settled'] >= EXPLORE_EVERY:
+                    entry['ceiling'] = min(self.maximum, entry['ceiling'] + 1)
+                    entry['next'] = min(entry['ceiling'], concurrency + 1)
+                    entry['settled'] = 0
+                    reason = "exploring"
+                else:
+                    entry['next'] = concurrency
+                    reason = "settled"
+            entry['updated'] = time.time()
+            next_value = entry['next']
+            self._save()
+        print(f"Fragment concurrency for {key}: {concurrency} gave {rate / 1024 / 1024:.1f} MiB/s "
+              f"({reason}), next {next_value}")
+
+    def describe(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return f"{key}: baseline {self.baseline}"
+            return (f"{key}: next {entry['next']}, best {entry['best']} "
+                    f"at {entry['best_rate'] / 1024 / 1024:.1f} MiB/s")
+
+
+def serve_synthetic_hls(fragments=40, fragment_size=256 * 1024, latency=0.1, max_parallel=6):
+    """Serve a generated HLS stream on localhost; returns (server, playlist URL).
+
+    Every fragment request waits latency seconds before the data is sent, and
+    requests beyond max_parallel at once are answered with 429.
+    """
+    packet = b'\x47' + b'\xff' * 187  # Padding MPEG-TS packet
+    fragment = packet * (fragment_size // len(packet))
+    playlist = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:2', '#EXT-X-MEDIA-SEQUENCE:0']
+    for index in range(fragments):
+        playlist += ['#EXTINF:2.0,', f'fragment{index}.ts']
+    playlist = ('\n'.join(playlist + ['#EXT-X-ENDLIST']) + '\n').encode()
+    slots = threading.BoundedSemaphore(max_parallel)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.endswith('.m3u8'):
+                return self._reply(200, playlist, 'application/vnd.apple.mpegurl')
+            if not slots.acquire(blocking=False):
+                return self._reply(429, b'', 'text/plain')
+            try:
+                time.sleep(latency)
+                self._reply(200, fragment, 'video/mp2t')
+            finally:
+                slots.release()
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address):
+            pass  # Clients drop kept-alive connections when a download ends
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/stream.m3u8"
+
+
+def benchmark(dest_dir, downloads=8, max_parallel=6, tuner=None):
+    """Download a synthetic HLS stream repeatedly under a FragmentTuner.
+
+    Returns (concurrency, seconds) for each download; the settings should
+    climb from the baseline and settle at or below max_parallel.
+    """
+    import yt_dlp
+    tuner = tuner or FragmentTuner()
+    server, url = serve_synthetic_hls(max_parallel=max_parallel)
+    results = []
+    try:
+        for number in range(downloads):
+            run = tuner.start('generic', '127.0.0.1')
+            opts = {
+                'outtmpl': os.path.join(dest_dir, f'bench-{number}.%(ext)s'),
+                'quiet': True,
+                'no_warnings': True,
+                'noprogress': True,
+                'fixup': 'never',
+                'fragment_retries': 10,
+                'skip_unavailable_fragments': False,
+                'concurrent_fragment_downloads': run.concurrency,
+                'retry_sleep_functions': {'fragment': run.retry_sleep},
+                'progress_hooks': [run.progress_hook],
+            }
+            started = time.perf_counter()
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                ydl.download([url])
+            seconds = time.perf_counter() - started
+            print(f"Download {number + 1}: {run.concurrency} at once, {seconds:.2f}s - "
+                  f"{tuner.describe(run.key)}")
+            results.append((run.concurrency, seconds))
+    finally:
+        server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        benchmark(tmp, downloads=int(sys.argv[1]) if len(sys.argv) > 1 else 8,
+                  max_parallel=int(sys.argv[2]) if len(sys.argv) > 2 else 6)
@@ -0,0 +1,581 @@
+"""Resumable file downloads over HTTP.
+
+Used for FFmpeg and application updates. Data goes to `<dest>.part` in
+large chunks; the validator (ETag or Last-Modified) of the response is kept
+next to it so an interrupted transfer continues with a Range request, and
+If-Range makes the server send the whole file again if it changed in the
+meantime. Progress callbacks are throttled so a fast link does not flood the
+caller.
+
+When an asset is offered by several mirrors, rank_mirrors() probes them all
+at once and MirrorScores remembers how fast each host was on earlier runs.
+fetch() then splits a large file into Range segments that download in
+parallel into a preallocated file. A connection that runs out of work takes
+over the back half of the segment with the most bytes left, so a slow
+connection does not hold up the end of the download.
+"""
+import collections
+import concurrent.futures
+import contextlib
+import ctypes
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+CHUNK_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 0.25
+DEFAULT_RETRIES = 4
+DEFAULT_TIMEOUT = 30
+
+# Mirror probing and segmented downloads
+PROBE_BYTES = 256 * 1024
+PROBE_TIMEOUT = 8
+DEFAULT_SEGMENTS = 4
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024
+MIN_STEAL_SIZE = 2 * 1024 * 1024  # Smallest piece an idle connection splits off
+SCORE_WEIGHT = 0.3  # Weight of a new measurement in a host's running speed
+
+_SHA256 = re.compile(r'^[0-9a-fA-F]{64}$')
+
+# SetThreadPriority mode that also lowers the thread's I/O priority
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+THREAD_MODE_BACKGROUND_END = 0x00020000
+
+
+class ChecksumError(ValueError):
+    """The downloaded file does not match its published checksum."""
+
+
+def _default_get():
+    from http_session import get
+    return get
+
+
+def sha256_file(path, chunk_size=CHUNK_SIZE, digest=None, limit=None):
+    digest = digest or hashlib.sha256()
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            block = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+@contextlib.contextmanager
+def low_priority():
+    """Run the current thread with background CPU and I/O priority on Windows."""
+    lowered = False
+    if sys.platform == 'win32':
+        try:
+            kernel32 = ctypes.windll.kernel32
+            lowered = bool(kernel32.SetThreadPriority(kernel32.GetCurrentThread(),
+                                                      THREAD_MODE_BACKGROUND_BEGIN))
+        except Exception:
+            lowered = False
+    try:
+        yield
+    finally:
+        if lowered:
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_END)
+
+
+def parse_checksum(text, filename):
+    """SHA-256 for filename from a checksum file ('<hash>  <name>' lines or a bare hash)."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[-1].lstrip('*') == filename and _SHA256.match(parts[0]):
+            return parts[0].lower()
+    if len(lines) == 1 and _SHA256.match(lines[0].split()[0]):
+        return lines[0].split()[0].lower()
+    return None
+
+
+def fetch_checksum(url, filename, get=None, timeout=15):
+    """Published SHA-256 for filename, or None if it cannot be fetched."""
+    get = get or _default_get()
+    try:
+        response = get(url, timeout=timeout)
+        response.raise_for_status()
+        return parse_checksum(response.text, filename)
+    except Exception as e:
+        print(f"Could not fetch checksum from {url}: {e}")
+        return None
+
+
+def _total_size(response, offset):
+    content_range = response.headers.get('Content-Range', '')
+    if response.status_code == 206 and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get('Content-Length')
+    return int(length) + offset if length and length.isdigit() else None
+
+
+def _load_validator(meta_path, url):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        # A segmented part file is preallocated, so its size says nothing
+        if meta.get('url') == url and 'segments' not in meta:
+            return meta.get('validator')
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def _save_validator(meta_path, url, response):
+    validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+    try:
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'validator': validator}, f)
+    except OSError:
+        pass
+
+
+def _retryable(error):
+    """Connection problems and 5xx/429 answers are worth another try."""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return True
+    return response.status_code >= 500 or response.status_code == 429
+
+
+def fetch_to_file(url, dest, get=None, headers=None, expected_sha256=None,
+                  on_progress=None, progress_interval=PROGRESS_INTERVAL,
+                  chunk_size=CHUNK_SIZE, retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT,
+                  throttle=None):
+    """Download url to dest, resuming a previous partial download if possible.
+
+    on_progress(done, total) is called at most every progress_interval
+    seconds and once at the end; total is None if the server did not say.
+    With expected_sha256 the data is hashed as it arrives, so checking it
+    costs no extra pass over the file. throttle(nbytes) is called for every
+    chunk received, e.g. a bandwidth.Stream's consume.
+    """
+    get = get or _default_get()
+    dest = Path(dest)
+    part_path = dest.with_name(dest.name + '.part')
+    meta_path = dest.with_name(dest.name + '.part.json')
+    digest = None
+    hashed = 0
+    attempt = 0
+    while True:
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        validator = _load_validator(meta_path, url) if offset else None
+        request_headers = dict(headers or {})
+        if offset and validator:
+            request_headers['Range'] = f'bytes={offset}-'
+            request_headers['If-Range'] = validator
+        else:
+            offset = 0
+        try:
+            response = get(url, headers=request_headers, stream=True, timeout=timeout)
+            try:
+                if response.status_code == 416 and offset:
+                    # Nothing left to send: the part file is already complete
+                    done = total = offset
+                    if expected_sha256 and (digest is None or hashed != offset):
+                        digest = hashlib.sha256()
+                        sha256_file(part_path, chunk_size, digest)
+                        hashed = offset
+                    break
+                response.raise_for_status()
+                if response.status_code != 206:
+                    offset = 0  # Range ignored or the file changed: start over
+                if expected_sha256 and (digest is None or hashed != offset):
+                    # Catch up with data written by an earlier attempt or run
+                    digest = hashlib.sha256()
+                    if offset:
+                        sha256_file(part_path, chunk_size, digest, limit=offset)
+                    hashed = offset
+                total = _total_size(response, offset)
+                _save_validator(meta_path, url, response)
+                done = offset
+                last_report = 0
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size):
+                        f.write(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+                            hashed += len(chunk)
+                        done += len(chunk)
+                        if throttle is not None:
+                            throttle(len(chunk))
+                        now = time.monotonic()
+                        if on_progress is not None and now - last_report >= progress_interval:
+                            last_report = now
+                            on_progress(done, total)
+            finally:
+                response.close()
+            if total is not None and done < total:
+                raise ConnectionError(f"Connection closed after {done} of {total} bytes")
+            break
+        except OSError as e:
+            attempt += 1
+            if attempt > retries or not _retryable(e):
+                raise
+            wait = min(2 ** attempt, 15)
+            print(f"Download of {url} interrupted ({e}), resuming in {wait}s...")
+            time.sleep(wait)
+    if on_progress is not None:
+        on_progress(done, total)
+
+    if expected_sha256:
+        actual = digest.hexdigest()
+        if actual != expected_sha256.lower():
+            part_path.unlink()
+            _remove(meta_path)
+            raise ChecksumError(f"SHA-256 mismatch for {dest.name}: expected {expected_sha256}, got {actual}")
+    os.replace(part_path, dest)
+    _remove(meta_path)
+    return dest
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class RangeNotHonoured(Exception):
+    """The server stopped answering Range requests for the same file."""
+
+
+class MirrorScores:
+    """Running download speed per host, kept between runs in a JSON file."""
+
+    def __init__(self, path=None):
+        self.path = str(path) if path else None
+        self._lock = threading.Lock()
+        self._hosts = {}
+        if self.path:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._hosts = json.load(f)
+            except (OSError, ValueError):
+                self._hosts = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self._hosts, f)
+        except OSError:
+            pass
+
+    def record(self, url, size, seconds):
+        """Fold a measured transfer into the host's speed."""
+        if seconds <= 0 or size <= 0:
+            return
+        speed = size / seconds
+        host = urlparse(url).netloc
+        with self._lock:
+            entry = self._hosts.setdefault(host, {'speed': speed, 'failures': 0})
+            entry['speed'] = entry['speed'] * (1 - SCORE_WEIGHT) + speed * SCORE_WEIGHT
+            entry['failures'] = 0
+            entry['updated'] = time.time()
+            self._save()
+
+    def record_failure(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            entry = self._hosts.setdefault(host, {'speed': 0.0, 'failures': 0})
+            entry['failures'] += 1
+            entry['updated'] = time.time()
+            self._save()
+
+    def speed(self, url):
+        """Remembered bytes/s for the host, discounted by recent failures."""
+        entry = self._hosts.get(urlparse(url).netloc)
+        if not entry:
+            return None
+        return entry['speed'] / (1 + entry['failures'])
+
+
+class MirrorProbe:
+    """What a short ranged request to one mirror showed."""
+
+    def __init__(self, url, speed=0.0, size=None, ranges=False, validator=None, error=None):
+        self.url = url
+        self.speed = speed
+        self.size = size
+        self.ranges = ranges
+        self.validator = validator
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def probe_mirror(url, get=None, probe_bytes=PROBE_BYTES, timeout=PROBE_TIMEOUT):
+    """Fetch the first probe_bytes of url and time it."""
+    get = get or _default_get()
+    started = time.perf_counter()
+    try:
+        response = get(url, headers={'Range': f'bytes=0-{probe_bytes - 1}'}, stream=True,
+                       timeout=timeout)
+        try:
+            response.raise_for_status()
+            received = 0
+            for chunk in response.iter_content(64 * 1024):
+                received += len(chunk)
+                if received >= probe_bytes:
+                    break
+            ranges = response.status_code == 206
+            size = _total_size(response, 0)
+            validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        finally:
+            response.close()
+        elapsed = time.perf_counter() - started
+        return MirrorProbe(url, received / elapsed if elapsed > 0 else 0.0, size, ranges, validator)
+    except Exception as e:
+        return MirrorProbe(url, error=str(e))
+
+
+def rank_mirrors(urls, get=None, scores=None, timeout=PROBE_TIMEOUT):
+    """Probe every mirror at once; returns MirrorProbes, fastest first.
+
+    Mirrors that fail or do not answer within timeout go last. The measured
+    speed is blended with the host's remembered speed when there is one.
+    """
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(urls)))
+    futures = {executor.submit(probe_mirror, url, get, PROBE_BYTES, timeout): url for url in urls}
+    done, pending = concurrent.futures.wait(futures, timeout=timeout + 1)
+    executor.shutdown(wait=False)
+    probes = []
+    for future, url in futures.items():
+        probe = future.result() if future in done else MirrorProbe(url, error="probe timed out")
+        if scores is not None:
+            if probe.ok:
+                remembered = scores.speed(url)
+                if remembered:
+                    probe.speed = (probe.speed + remembered) / 2
+            else:
+                scores.record_failure(url)
+        probes.append(probe)
+    order = {url: i for i, url in enumerate(urls)}
+    probes.sort(key=lambda p: (not p.ok, -p.speed, order[p.url]))
+    return probes
+
+
+def _plan_segments(size, segments, min_segment_size=MIN_SEGMENT_SIZE):
+    count = max(1, min(segments, size // min_segment_size))
+    step = -(-size // count)
+    return [[start, min(start + step, size) - 1, start] for start in range(0, size, step)]
+
+
+def _split_largest(plan, min_size=MIN_STEAL_SIZE):
+    """Cut the back half off the segment with the most bytes left.
+
+    Segments are [start, end, position] lists. The new segment is appended
+    to plan and returned, or None if nothing is worth splitting. The cut is
+    at least one chunk past the current position, so it never lands inside
+    a write that is still in progress.
+    """
+    victim = max(plan, key=lambda segment: segment[1] + 1 - segment[2])
+    remaining = victim[1] + 1 - victim[2]
+    if remaining < 2 * max(min_size, CHUNK_SIZE):
+        return None
+    middle = victim[2] + remaining // 2
+    segment = [middle, victim[1], middle]
+    victim[1] = middle - 1
+    plan.append(segment)
+    return segment
+
+
+def fetch_segmented(url, dest, size, validator, get=None, segments=DEFAULT_SEGMENTS,
+                    expected_sha256=None, on_progress=None, progress_interval=PROGRESS_INTERVAL,
+                    retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT,
+                    min_segment_size=MIN_SEGMENT_SIZE, request_size=None, throttle=None):
+    """Download url over `segments` connections into a preallocated .part file.
+
+    Each connection works through the planned segments and then splits the
+    largest unfinished one. Segment positions are saved next to the part
+    file, so an interrupted download continues where each segment stopped.
+    request_size caps the bytes asked for in one Range request, for servers
+    that throttle long ones.
+    """
+    get = get or _default_get()
+    dest = Path(dest)
+    part_path = dest.with_name(dest.name + '.part')
+    meta_path = dest.with_name(dest.name + '.part.json')
+    plan = None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta.get('url') == url and meta.get('validator') == validator
+                and meta.get('size') == size and part_path.exists()):
+            plan = meta['segments']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    if plan is None:
+        plan = _plan_segments(size, segments, min_segment_size)
+        with open(part_path, 'wb') as f:
+            f.truncate(size)
+
+    lock = threading.Lock()
+    stop = threading.Event()
+    state = {'last_report': 0.0, 'steals': 0}
+    queued = collections.deque(segment for segment in plan if segment[2] <= segment[1])
+
+    def save_plan():
+        try:
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({'url': url, 'validator': validator, 'size': size, 'segments': plan}, f)
+        except OSError:
+            pass
+
+    def report(force=False):
+        now = time.monotonic()
+        with lock:
+            if not force and now - state['last_report'] < progress_interval:
+                return
+            state['last_report'] = now
+            done = sum(segment[2] - segment[0] for segment in plan)
+            save_plan()
+        if on_progress is not None:
+            on_progress(done, size)
+
+    def next_segment():
+        with lock:
+            while queued:
+                segment = queued.popleft()
+                if segment[2] <= segment[1]:
+                    return segment
+            segment = _split_largest(plan)
+            if segment is not None:
+                state['steals'] += 1
+            return segment
+
+    def run_segment(f, segment):
+        attempt = 0
+        while segment[2] <= segment[1] and not stop.is_set():
+            request_end = segment[1]
+            if request_size:
+                request_end = min(request_end, segment[2] + request_size - 1)
+            headers = {'Range': f'bytes={segment[2]}-{request_end}'}
+            if validator:
+                headers['If-Range'] = validator
+            try:
+                response = get(url, headers=headers, stream=True, timeout=timeout)
+                try:
+                    response.raise_for_status()
+                    content_range = response.headers.get('Content-Range', '')
+                    if (response.status_code != 206
+                            or not content_range.startswith(f'bytes {segment[2]}-')):
+                        raise RangeNotHonoured(f"expected bytes {segment[2]}-{request_end}, got "
+                                               f"{response.status_code} {content_range}")
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        # The end moves up when another connection splits this segment
+                        with lock:
+                            position = segment[2]
+                            chunk = chunk[:segment[1] + 1 - position]
+                        f.seek(position)
+                        f.write(chunk)
+                        with lock:
+                            segment[2] += len(chunk)
+                        if throttle is not None:
+                            throttle(len(chunk))
+                        report()
+                        if segment[2] > segment[1] or stop.is_set():
+                            break
+                finally:
+                    response.close()
+                if segment[2] <= min(request_end, segment[1]) and not stop.is_set():
+                    raise ConnectionError(f"Segment {segment[0]}-{segment[1]} ended at {segment[2]}")
+                attempt = 0
+            except OSError as e:
+                # Only this segment starts over; the others keep going
+                attempt += 1
+                if attempt > retries or not _retryable(e):
+                    raise
+                time.sleep(min(2 ** attempt, 15))
+
+    def worker():
+        with open(part_path, 'r+b') as f:
+            while not stop.is_set():
+                segment = next_segment()
+                if segment is None:
+                    return
+                run_segment(f, segment)
+
+    unfinished = len(queued)
+    workers = max(1, min(segments, max(unfinished, size // min_segment_size)))
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(worker) for _ in range(workers if unfinished else 0)]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+        except BaseException:
+            stop.set()  # Let the other segments stop early; progress is saved
+            raise
+        finally:
+            report(force=True)
+    elapsed = time.perf_counter() - started
+    if state['steals']:
+        print(f"{dest.name}: {workers} connections, {state['steals']} segments split while downloading")
+
+    # Every byte of every segment must be present before the file is used
+    if any(segment[2] != segment[1] + 1 for segment in plan) or part_path.stat().st_size != size:
+        raise ConnectionError(f"Segmented download of {dest.name} is incomplete")
+    if expected_sha256:
+        actual = sha256_file(part_path)
+        if actual != expected_sha256.lower():
+            part_path.unlink()
+            _remove(meta_path)
+            raise ChecksumError(f"SHA-256 mismatch for {dest.name}: expected {expected_sha256}, got {actual}")
+    os.replace(part_path, dest)
+    _remove(meta_path)
+    return dest, elapsed
+
+
+def fetch(url, dest, get=None, expected_sha256=None, on_progress=None, segments=DEFAULT_SEGMENTS,
+          scores=None, probe=None, min_segment_size=MIN_SEGMENT_SIZE, request_size=None,
+          throttle=None):
+    """Download url to dest, in parallel segments when the server supports it.
+
+    probe is a MirrorProbe from rank_mirrors(); without one the URL is
+    probed first. The measured speed is recorded in scores.
+    """
+    get = get or _default_get()
+    if probe is None or not probe.ok:
+        probe = probe_mirror(url, get)
+    started = time.perf_counter()
+    try:
+        if (segments > 1 and probe.ok and probe.ranges and probe.size
+                and probe.size >= 2 * min_segment_size):
+            try:
+                fetch_segmented(url, dest, probe.size, probe.validator, get=get, segments=segments,
+                                expected_sha256=expected_sha256, on_progress=on_progress,
+                                min_segment_size=min_segment_size, request_size=request_size,
+                                throttle=throttle)
+            except RangeNotHonoured as e:
+                print(f"Falling back to a single connection for {url}: {e}")
+                _remove(Path(dest).with_name(Path(dest).name + '.part.json'))
+                fetch_to_file(url, dest, get=get, expected_sha256=expected_sha256,
+                              on_progress=on_progress, throttle=throttle)
+        else:
+            fetch_to_file(url, dest, get=get, expected_sha256=expected_sha256,
+                          on_progress=on_progress, throttle=throttle)
+    except Exception:
+        if scores is not None:
+            scores.record_failure(url)
+        raise
+    if scores is not None:
+        scores.record(url, os.path.getsize(dest), time.perf_counter() - started)
+    return Path(dest)
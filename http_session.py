@@ -0,0 +1,212 @@
+"""Shared HTTP session for update checks, FFmpeg installs and self-updates.
+
+Every request goes through one requests.Session, so connections to the same
+host (api.github.com, the GitHub release CDN, ...) are kept alive and
+reused instead of paying for DNS, TCP and TLS again. The session applies a
+default timeout and retries failed connections and 429/5xx answers with
+exponential backoff. Streamed requests (stream=True) are not retried here:
+http_fetch's download loops retry those themselves, and retrying at both
+levels multiplied the attempts on a failing mirror.
+
+Each response carries a `timing` dict with the DNS, connect, TLS and
+time-to-first-byte phases of the request, in seconds; the phases are zero
+when a pooled connection was reused.
+"""
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (10, 30)  # (connect, read) seconds
+DEFAULT_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POOL_CONNECTIONS = 8
+POOL_MAXSIZE = 16
+
+RequestException = requests.exceptions.RequestException
+
+_timing = threading.local()
+
+
+def _phase(name, seconds):
+    phases = getattr(_timing, 'phases', None)
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+class _TimedConnectionMixin:
+    """Records connection set-up and first-byte times for the current thread."""
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        try:
+            # Resolve first so DNS and TCP connect can be told apart; the
+            # second lookup inside _new_conn is answered from the OS cache
+            socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)
+        except OSError:
+            pass
+        resolved = time.perf_counter()
+        _phase('dns', resolved - started)
+        conn = super()._new_conn()
+        _phase('connect', time.perf_counter() - resolved)
+        return conn
+
+    def connect(self):
+        started = time.perf_counter()
+        before = dict(getattr(_timing, 'phases', None) or {})
+        super().connect()
+        phases = getattr(_timing, 'phases', None)
+        if phases is not None:
+            socket_time = (phases.get('dns', 0.0) - before.get('dns', 0.0)
+                           + phases.get('connect', 0.0) - before.get('connect', 0.0))
+            if isinstance(self, HTTPSConnection):
+                _phase('tls', max(0.0, time.perf_counter() - started - socket_time))
+            phases['reused'] = False
+
+    def request(self, *args, **kwargs):
+        result = super().request(*args, **kwargs)
+        self._sent_at = time.perf_counter()
+        return result
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        sent_at = getattr(self, '_sent_at', None)
+        if sent_at is not None:
+            _phase('ttfb', time.perf_counter() - sent_at)
+        return response
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+def _retry_policy(retries):
+    kwargs = dict(total=retries, connect=retries, read=retries, status=retries,
+                  backoff_factor=BACKOFF_FACTOR, status_forcelist=RETRY_STATUSES,
+                  respect_retry_after_header=True, raise_on_status=False)
+    try:
+        return Retry(allowed_methods=frozenset(['GET', 'HEAD']), **kwargs)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=frozenset(['GET', 'HEAD']), **kwargs)
+
+
+def _adapter(max_retries):
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                          max_retries=max_retries)
+    adapter.poolmanager.pool_classes_by_scheme = {
+        'http': TimedHTTPConnectionPool,
+        'https': TimedHTTPSConnectionPool,
+    }
+    return adapter
+
+
+class TimedSession(requests.Session):
+    """requests.Session with pooling, retries, a default timeout and timings."""
+
+    def __init__(self, user_agent=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+        super().__init__()
+        self.timeout = timeout
+        self.listeners = []
+        if user_agent:
+            self.headers['User-Agent'] = user_agent
+        adapter = _adapter(_retry_policy(retries))
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        # Streamed downloads are retried by their callers
+        self.streaming_adapter = _adapter(0)
+
+    def get_adapter(self, url):
+        if getattr(_timing, 'streaming', False) and url.lower().startswith(('http://', 'https://')):
+            return self.streaming_adapter
+        return super().get_adapter(url)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        _timing.phases = {'reused': True}
+        _timing.streaming = bool(kwargs.get('stream'))
+        started = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        finally:
+            phases, _timing.phases = _timing.phases, None
+            _timing.streaming = False
+        timing = {
+            'dns': phases.get('dns', 0.0),
+            'connect': phases.get('connect', 0.0),
+            'tls': phases.get('tls', 0.0),
+            'ttfb': phases.get('ttfb', 0.0),
+            'total': time.perf_counter() - started,
+            'reused': phases['reused'],
+        }
+        response.timing = timing
+        for listener in list(self.listeners):
+            try:
+                listener(method, url, response.status_code, timing)
+            except Exception as e:
+                print(f"HTTP timing listener error: {e}")
+        return response
+
+
+_session = None
+_session_lock = threading.Lock()
+_user_agent = None
+
+
+def configure(user_agent=None):
+    """Set the User-Agent used by the shared session (before first use)."""
+    global _user_agent
+    _user_agent = user_agent
+    if _session is not None and user_agent:
+        _session.headers['User-Agent'] = user_agent
+
+
+def session():
+    """The shared TimedSession, created on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = TimedSession(user_agent=_user_agent)
+    return _session
+
+
+def get(url, **kwargs):
+    return session().get(url, **kwargs)
+
+
+def describe(timing):
+    """One-line summary of a response timing dict."""
+    if timing['reused']:
+        setup = "reused connection"
+    else:
+        setup = (f"dns {timing['dns'] * 1000:.0f} ms, connect {timing['connect'] * 1000:.0f} ms, "
+                 f"tls {timing['tls'] * 1000:.0f} ms")
+    return f"{setup}, first byte {timing['ttfb'] * 1000:.0f} ms, total {timing['total'] * 1000:.0f} ms"
+
+
+def close():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.streaming_adapter.close()
+            _session.close()
+            _session = None
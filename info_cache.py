@@ -0,0 +1,200 @@
+"""On-disk cache for extracted yt-dlp info dicts.
+
+Entries are the unprocessed info dicts returned by
+extract_info(process=False), keyed by a normalised URL. Each extractor has
+its own time to live because signed stream URLs expire, and the cache is
+bounded by total size with least-recently-used eviction.
+"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# Seconds an info dict stays fresh, by extractor key
+EXTRACTOR_TTLS = {
+    'Youtube': 3600,  # googlevideo URLs are signed for about six hours
+    'Vimeo': 1800,
+    'Twitter': 900,
+    'Instagram': 600,
+    'TikTok': 600,
+    'Generic': 300,
+}
+DEFAULT_TTL = 900
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Query parameters that never change what a URL points at
+TRACKING_PARAMS = {'si', 'feature', 'pp', 'fbclid', 'gclid', 'igshid', 'ref', 'ref_src'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS info (
+    key TEXT PRIMARY KEY,
+    extractor TEXT,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS info_accessed ON info (accessed);
+"""
+
+
+def normalize_url(url):
+    """Canonical form of a URL for cache lookups."""
+    parts = urlparse(url.strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key not in TRACKING_PARAMS and not key.startswith('utm_'))
+    if host == 'youtu.be':
+        query.append(('v', parts.path.strip('/')))
+        host, path = 'youtube.com', '/watch'
+    else:
+        path = parts.path.rstrip('/') or '/'
+    return urlunparse(('https', host, path, '', urlencode(sorted(query)), ''))
+
+
+def _is_plain(obj):
+    """True if obj survives a JSON round trip unchanged."""
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return True
+    if isinstance(obj, dict):
+        return all(isinstance(key, str) and _is_plain(value) for key, value in obj.items())
+    if isinstance(obj, list):
+        return all(_is_plain(value) for value in obj)
+    return False
+
+
+def _signed_url_expiry(info):
+    """Earliest 'expire' timestamp found in the format URLs, if any."""
+    expiry = None
+    for fmt in info.get('formats') or []:
+        for key, value in parse_qsl(urlparse(fmt.get('url') or '').query):
+            if key == 'expire' and value.isdigit():
+                expiry = min(expiry or int(value), int(value))
+    return expiry
+
+
+class InfoCache:
+    """Size-bounded LRU cache of info dicts stored in SQLite."""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, ttls=None, default_ttl=DEFAULT_TTL):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.ttls = dict(EXTRACTOR_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def ttl_for(self, info):
+        """Time to live for an info dict, capped by its signed URL expiry."""
+        extractor = info.get('extractor_key') or ''
+        ttl = self.ttls.get(extractor, self.default_ttl)
+        expiry = _signed_url_expiry(info)
+        if expiry is not None:
+            # Leave a margin so a download never starts on an expiring URL
+            ttl = min(ttl, expiry - time.time() - 600)
+        return ttl
+
+    def get(self, url):
+        """Cached info dict for a URL, or None on a miss."""
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, expires FROM info WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            data, expires = row
+            if expires <= now:
+                self._conn.execute("DELETE FROM info WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE info SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(zlib.decompress(data).decode('utf-8'))
+
+    def put(self, url, info):
+        """Store an unprocessed info dict. Returns False if it is not cacheable."""
+        if not info or info.get('is_live') or 'entries' in info or not _is_plain(info):
+            return False
+        ttl = self.ttl_for(info)
+        if ttl <= 0:
+            return False
+        data = zlib.compress(json.dumps(info, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO info (key, extractor, data, size, expires, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), info.get('extractor_key'), data, len(data), now + ttl, now))
+            self.stores += 1
+            self._evict()
+            self._conn.commit()
+        return True
+
+    def invalidate(self, url):
+        with self._lock:
+            self._conn.execute("DELETE FROM info WHERE key = ?", (normalize_url(url),))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM info")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        self._conn.execute("DELETE FROM info WHERE expires <= ?", (time.time(),))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM info").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM info ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM info WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        """Counters and current size of the cache."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM info").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': size,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def describe(self):
+        stats = self.stats()
+        return (f"{stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries, "
+                f"{stats['bytes'] / 1024 / 1024:.1f} MB")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,98 @@
+"""SQLite job store so queued downloads survive restarts.
+
+Every state change of a job is written straight away, so a killed process
+loses at most the job's progress counter. On the next launch the jobs that
+were still queued or running are handed back to the queue; yt-dlp then
+continues their .part files and skips finished fragments because the same
+output template is used with 'continuedl'.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from download_engine import (DownloadJob, DownloadOptions,
+                             QUEUED, RUNNING, PROCESSING, FINISHED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    options TEXT NOT NULL,
+    state TEXT NOT NULL,
+    title TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+UNFINISHED_STATES = (QUEUED, RUNNING, PROCESSING)
+DONE_STATES = (FINISHED, FAILED, CANCELLED)
+
+
+class JobStore:
+    """Persists DownloadJobs in a small SQLite database."""
+
+    def __init__(self, path, keep_history=500):
+        self.path = str(path)
+        self.keep_history = keep_history
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def save(self, job):
+        """Insert or update a job. New jobs get their id from the database."""
+        now = time.time()
+        error = job.result.error if job.result is not None else None
+        with self._lock:
+            if not job.persisted:
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (url, options, state, title, error, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job.url, json.dumps(job.options.to_dict()), job.state,
+                     job.title, error, now, now))
+                job.id = cursor.lastrowid
+                job.persisted = True
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, title = ?, error = ?, updated = ? WHERE id = ?",
+                    (job.state, job.title, error, now, job.id))
+            self._conn.commit()
+
+    def unfinished(self):
+        """Jobs that were queued or running when the process last stopped."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, options, title FROM jobs "
+                "WHERE state IN (?, ?, ?) ORDER BY id", UNFINISHED_STATES).fetchall()
+        jobs = []
+        for job_id, url, options, title in rows:
+            try:
+                job = DownloadJob(url, DownloadOptions.from_dict(json.loads(options)),
+                                  job_id=job_id)
+            except (ValueError, TypeError) as e:
+                print(f"Skipping unreadable stored job {job_id}: {e}")
+                continue
+            job.title = title
+            job.persisted = True
+            jobs.append(job)
+        return jobs
+
+    def prune(self):
+        """Drop the oldest finished jobs beyond keep_history."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE state IN (?, ?, ?) AND id NOT IN ("
+                "SELECT id FROM jobs WHERE state IN (?, ?, ?) "
+                "ORDER BY updated DESC LIMIT ?)",
+                DONE_STATES + DONE_STATES + (self.keep_history,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
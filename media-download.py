@@ -1,34 +1,52 @@
+import time
+STARTUP_TIME = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, BooleanVar
 import os
-import yt_dlp
 import threading
 import webbrowser
 import pyperclip
-import pystray
-from pystray import MenuItem as item
-from PIL import Image, ImageTk, ImageSequence, ImageDraw
 import sys
 import ctypes
 import re
 from pathlib import Path
 from urllib.parse import urlparse
-import validators
-import yt_dlp.postprocessor.ffmpeg
-import queue
+import collections
 import shutil
-import win32com.client  # Requires: pip install pywin32
-import requests
 import json
-import zipfile
-import tempfile
 import subprocess
-import time
-import ssl
-import certifi
-import io
 import winreg
 import traceback
+from startup import LazyModule, StartupProfile, module_versions, preload
+
+# Heavy modules are imported on first use or by preload() after the window is up
+yt_dlp = LazyModule('yt_dlp', submodules=('yt_dlp.postprocessor.ffmpeg',))
+Image = LazyModule('PIL.Image')
+ImageTk = LazyModule('PIL.ImageTk')
+ImageDraw = LazyModule('PIL.ImageDraw')
+http_session = LazyModule('http_session')  # Shared pooled requests session
+validators = LazyModule('validators')
+pystray = LazyModule('pystray')
+from download_engine import (DownloadEngine, DownloadJob, DownloadOptions, DownloadQueue,
+                             looks_like_playlist, FINISHED, FAILED, CANCELLED,
+                             DEFAULT_MAX_WORKERS, DEFAULT_PER_HOST_LIMIT,
+                             DEFAULT_PLAYLIST_WORKERS, DEFAULT_PROGRESS_INTERVAL,
+                             DEFAULT_CONNECTIONS, DEFAULT_PRIORITY, PRIORITY_WEIGHTS)
+from job_store import JobStore
+from clipboard_watcher import ClipboardWatcher, extract_urls
+from info_cache import InfoCache
+from fragment_tuner import FragmentTuner
+from download_archive import DownloadArchive
+from ffmpeg_tools import CapabilityCache, FFmpegManifest, FFMPEG_SOURCES, install_ffmpeg, release_time
+from bandwidth import BandwidthGovernor, format_rate
+from postprocess_pool import PostProcessPool, default_workers
+from remux_planner import use_capabilities as use_remux_capabilities
+from http_fetch import MirrorScores, fetch, fetch_checksum, low_priority, rank_mirrors, sha256_file
+
+# Pass --startup-profile to print how long each start-up phase takes
+startup = StartupProfile('--startup-profile' in sys.argv, STARTUP_TIME)
+startup.mark('imports')
 
 # Debug mode - set to True to enable detailed console output
 DEBUG_MODE = True
@@ -41,30 +59,8 @@ def setup_debugging():
     print(f"Python version: {sys.version}")
     print(f"Operating system: {sys.platform}")
     print(f"Current directory: {os.getcwd()}")
-    
-    try:
-        print(f"yt-dlp version: {yt_dlp.version.__version__}")
-    except Exception as e:
-        print(f"Error getting yt-dlp version: {e}")
-    
-    # Check for required modules
-    required_modules = [
-        "tkinter", "PIL", "yt_dlp", "pyperclip", "pystray", 
-        "validators", "win32com", "requests"
-    ]
-    
-    print("\n=== MODULE CHECKS ===")
-    for module_name in required_modules:
-        try:
-            module = __import__(module_name)
-            if hasattr(module, "__version__"):
-                print(f"{module_name}: OK (version {module.__version__})")
-            else:
-                print(f"{module_name}: OK")
-        except ImportError as e:
-            print(f"{module_name}: MISSING - {e}")
-        except Exception as e:
-            print(f"{module_name}: ERROR - {e}")
+    # Module versions are printed by print_module_versions() once the
+    # background imports have finished, so nothing heavy is imported here
     
     # Set up global exception handler
     def global_exception_handler(exc_type, exc_value, exc_traceback):
@@ -88,8 +84,16 @@ def setup_debugging():
     sys.excepthook = global_exception_handler
     print("\n=== DEBUG SETUP COMPLETE ===\n")
 
+def print_module_versions():
+    """Print versions of the modules imported in the background."""
+    print("\n=== MODULE CHECKS ===")
+    for name, version in module_versions(["tkinter", "PIL", "yt_dlp", "pyperclip", "pystray",
+                                          "validators", "win32gui", "requests"]):
+        print(f"{name}: OK (version {version})" if version else f"{name}: OK")
+
 # Run debugging setup
 setup_debugging()
+startup.mark('debug setup')
 
 # GUI Theme and Styles
 THEME = {
@@ -131,15 +135,29 @@ REPO_NAME = "media-downloader"
 CURRENT_VERSION = "1.0.15"
 GITHUB_API_URL = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/releases/latest"
 UPDATE_CHECK_FILE = Path(os.environ["LOCALAPPDATA"]) / "Media Downloader" / "last_update_check.txt"
+UPDATES_DIR = Path(os.environ["LOCALAPPDATA"]) / "Media Downloader" / "updates"
+PENDING_UPDATE_FILE = UPDATES_DIR / "pending.json"
+update_thread = None
 
 # Add a force check flag to check for updates regardless of the time since last check
 FORCE_UPDATE_CHECK = False
 
+# Window in which the bandwidth limit is lifted when "Unlimited Overnight" is on
+OVERNIGHT_START = 1 * 60
+OVERNIGHT_END = 7 * 60
+
 # Global variables
 ffmpeg_path = None
-early_log_queue = queue.Queue()
-loading_gif = None
+ffmpeg_capabilities = CapabilityCache(INSTALL_DIR / "ffmpeg_capabilities.json")
+# The remux planner checks it for encoders before re-encoding a stream
+use_remux_capabilities(ffmpeg_capabilities)
+mirror_scores = MirrorScores(INSTALL_DIR / "mirror_scores.json")
+ffmpeg_manifest = FFmpegManifest(INSTALL_DIR / "ffmpeg_manifest.json")
+bandwidth = BandwidthGovernor()  # Speed limit shared by downloads, FFmpeg installs and updates
+loading_frames = None  # Pre-rendered PhotoImages, built once
 loading_label = None
+loading_visible = False
+loading_frame_index = 0
 quality_settings = {
     'video_quality': 'best',  # best, 1080p, 720p, 480p, 360p
     'audio_quality': '320',   # 320, 256, 192, 128, 96
@@ -147,7 +165,11 @@ quality_settings = {
 }
 
 def verify_ffmpeg(ffmpeg_path, ffprobe_path):
-    """Verify that FFmpeg and FFprobe are working."""
+    """Verify that FFmpeg and FFprobe are working.
+
+    Uses the stored capability records, so the binaries are only run again
+    after they change on disk.
+    """
     try:
         print(f"\n=== FFMPEG VERIFICATION ===")
         print(f"FFmpeg path: {ffmpeg_path}")
@@ -164,40 +186,20 @@ def verify_ffmpeg(ffmpeg_path, ffprobe_path):
             print(f"FFprobe file exists: {os.path.exists(ffprobe_path)}")
             return False
             
-        # Check FFmpeg
-        log(f"Testing FFmpeg at: {ffmpeg_path}")
-        print(f"Testing FFmpeg execution...")
-        result = subprocess.run([ffmpeg_path, '-version'], 
-                              capture_output=True, 
-                              text=True,
-                              creationflags=subprocess.CREATE_NO_WINDOW)
-        if result.returncode != 0:
-            log(f"FFmpeg test failed with return code: {result.returncode}")
-            log(f"Error: {result.stderr}")
-            print(f"FFmpeg test failed with return code: {result.returncode}")
-            print(f"Error: {result.stderr}")
-            return False
-        else:
-            log("FFmpeg test successful")
-            print(f"FFmpeg version: {result.stdout.splitlines()[0] if result.stdout else 'Unknown'}")
-            
-        # Check FFprobe
-        log(f"Testing FFprobe at: {ffprobe_path}")
-        print(f"Testing FFprobe execution...")
-        result = subprocess.run([ffprobe_path, '-version'], 
-                              capture_output=True, 
-                              text=True,
-                              creationflags=subprocess.CREATE_NO_WINDOW)
-        if result.returncode != 0:
-            log(f"FFprobe test failed with return code: {result.returncode}")
-            log(f"Error: {result.stderr}")
-            print(f"FFprobe test failed with return code: {result.returncode}")
-            print(f"Error: {result.stderr}")
-            return False
+        probes = ffmpeg_capabilities.probes
+        for name, path, full in (("FFmpeg", ffmpeg_path, True), ("FFprobe", ffprobe_path, False)):
+            caps = ffmpeg_capabilities.get(path, full=full)
+            if not caps.ok:
+                log(f"{name} test failed: {caps.error}")
+                print(f"{name} test failed: {caps.error}")
+                return False
+            print(f"{name} version: {caps.version_line or 'Unknown'}")
+        
+        if ffmpeg_capabilities.probes == probes:
+            log("FFmpeg verified (unchanged since last check)", level='debug')
         else:
-            log("FFprobe test successful")
-            print(f"FFprobe version: {result.stdout.splitlines()[0] if result.stdout else 'Unknown'}")
-            
+            caps = ffmpeg_capabilities.get(ffmpeg_path)
+            log(f"FFmpeg {caps.version} tested: {len(caps.encoders)} encoders, {len(caps.muxers)} muxers")
         print("FFmpeg verification passed successfully")
         return True
     except Exception as e:
@@ -206,8 +208,12 @@ def verify_ffmpeg(ffmpeg_path, ffprobe_path):
         print(traceback.format_exc())
         return False
 
-def download_ffmpeg():
-    """Download and install FFmpeg."""
+def download_ffmpeg(release=None):
+    """Download and install FFmpeg.
+
+    With a release from the FFmpeg manifest check, the installed build is
+    replaced with that BtbN build even if the current one works.
+    """
     message_label = None
     try:
         # Create FFmpeg directory in AppData
@@ -218,7 +224,7 @@ def download_ffmpeg():
         ffmpeg_path = ffmpeg_dir / "ffmpeg.exe"
         ffprobe_path = ffmpeg_dir / "ffprobe.exe"
         
-        if ffmpeg_path.exists() and ffprobe_path.exists():
+        if release is None and ffmpeg_path.exists() and ffprobe_path.exists():
             if verify_ffmpeg(str(ffmpeg_path), str(ffprobe_path)):
                 log("FFmpeg is already installed and working")
                 return str(ffmpeg_path)
@@ -226,85 +232,50 @@ def download_ffmpeg():
         # Show loading animation
         message_label = show_loading("Downloading FFmpeg...")
         
-        # Alternative download URLs in case the first one fails
-        download_urls = [
-            "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl.zip",
-            "https://www.gyan.dev/ffmpeg/builds/ffmpeg-release-essentials.zip",
-            "https://github.com/GyanD/codexffmpeg/releases/download/2023-10-08-git-10a3e7e0f8/ffmpeg-2023-10-08-git-10a3e7e0f8-essentials_build.zip"
-        ]
-        
-        # Try each download URL until one succeeds
-        for download_url in download_urls:
+        def report(done, total):
+            # Called at most a few times a second by the fetcher
+            if total:
+                message = f"Downloading FFmpeg... {100 * done // total}% ({done // 1048576}/{total // 1048576} MB)"
+            else:
+                message = f"Downloading FFmpeg... {done // 1048576} MB"
+            log(message, show_console=False, level='debug')
+            show_loading(message)
+        
+        # Probe all sources at once and try the fastest first
+        checksum_urls = dict(FFMPEG_SOURCES[:1] if release else FFMPEG_SOURCES)
+        probes = rank_mirrors(list(checksum_urls), scores=mirror_scores)
+        for probe in probes:
+            log(f"FFmpeg mirror {probe.url}: " + (f"{probe.speed / 1048576:.1f} MB/s" if probe.ok else probe.error),
+                level='debug')
+        
+        # Try each source until one succeeds; an interrupted download resumes
+        for probe in probes:
+            download_url = probe.url
             try:
                 log(f"Attempting to download FFmpeg from: {download_url}")
-                
-                # Download FFmpeg from GitHub
-                response = requests.get(download_url, stream=True, timeout=30)
-                response.raise_for_status()
-                
-                # Get total file size
-                total_size = int(response.headers.get('content-length', 0))
-                block_size = 1024  # 1 Kibibyte
-                downloaded = 0
-                
-                # Save the zip file with progress
-                zip_path = ffmpeg_dir / "ffmpeg.zip"
-                with open(zip_path, 'wb') as f:
-                    for data in response.iter_content(block_size):
-                        downloaded += len(data)
-                        f.write(data)
-                        # Update progress
-                        if total_size:
-                            percent = int(100 * downloaded / total_size)
-                            message = f"Downloading FFmpeg... {percent}% ({downloaded}/{total_size} bytes)"
-                            log(message)
-                            if message_label:
-                                message_label.config(text=message)
-                
-                log("FFmpeg download completed. Extracting files...")
-                if message_label:
-                    message_label.config(text="Extracting FFmpeg files...")
-                
-                # Extract the zip file
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(ffmpeg_dir)
-                
-                # Find the bin directory with ffmpeg.exe and ffprobe.exe
-                ffmpeg_exe_paths = list(ffmpeg_dir.glob("**/ffmpeg.exe"))
-                ffprobe_exe_paths = list(ffmpeg_dir.glob("**/ffprobe.exe"))
-                
-                if not ffmpeg_exe_paths or not ffprobe_exe_paths:
-                    log("FFmpeg executables not found in zip file")
-                    continue  # Try next URL
-                
-                # Get the first found executables
-                source_ffmpeg = ffmpeg_exe_paths[0]
-                source_ffprobe = ffprobe_exe_paths[0]
-                
-                log(f"Moving FFmpeg from {source_ffmpeg} to {ffmpeg_path}")
-                log(f"Moving FFprobe from {source_ffprobe} to {ffprobe_path}")
-                
-                # Move FFmpeg and FFprobe to the main directory
-                if ffmpeg_path.exists():
-                    ffmpeg_path.unlink()
-                if ffprobe_path.exists():
-                    ffprobe_path.unlink()
-                    
-                shutil.copy2(str(source_ffmpeg), str(ffmpeg_path))
-                shutil.copy2(str(source_ffprobe), str(ffprobe_path))
-                
-                # Clean up
+                if not checksum_urls[download_url]:
+                    log(f"{download_url} publishes no checksum, installing it unverified", level='warning')
+                started = time.perf_counter()
+                # The user is waiting on FFmpeg, so it gets a larger share than downloads
+                stream = bandwidth.open("FFmpeg", weight=2.0)
                 try:
-                    zip_path.unlink()
-                    for item in ffmpeg_dir.glob("*"):
-                        if item.is_dir() and item.name != "bin" and item != ffmpeg_path.parent and item != ffprobe_path.parent:
-                            shutil.rmtree(item)
-                except:
-                    pass  # Ignore cleanup errors
+                    install_ffmpeg(download_url, checksum_urls[download_url], ffmpeg_dir,
+                                   on_progress=report, probe=probe, scores=mirror_scores,
+                                   throttle=stream.consume)
+                finally:
+                    stream.close()
+                log(f"FFmpeg downloaded and extracted in {time.perf_counter() - started:.1f}s")
                 
                 # Verify installation
                 if verify_ffmpeg(str(ffmpeg_path), str(ffprobe_path)):
                     log("FFmpeg installation successful")
+                    # The BtbN "latest" asset is the build the release feed describes
+                    latest = release or ffmpeg_manifest.data.get('latest') or {}
+                    if download_url == FFMPEG_SOURCES[0][0] and latest:
+                        ffmpeg_manifest.record_install(download_url, latest.get('tag_name'),
+                                                       release_time(latest))
+                    else:
+                        ffmpeg_manifest.record_install(download_url)
                     return str(ffmpeg_path)
                 else:
                     log("FFmpeg verification failed after installation, trying next URL")
@@ -327,77 +298,40 @@ def download_ffmpeg():
             hide_loading(message_label)
 
 def show_loading(message="Loading..."):
-    """Show a loading animation with a message."""
-    global loading_gif, loading_label
+    """Show the loading animation with a message. Safe to call from any thread."""
+    ui.set_state('loading', lambda: _show_loading(message))
+    return True
+
+def hide_loading(label=None):
+    """Hide the loading animation. Safe to call from any thread."""
+    ui.set_state('loading', _hide_loading)
+
+def _show_loading(message):
+    global loading_frames, loading_label, loading_visible
     try:
-        if loading_gif is None:
-            loading_gif = create_loading_icon()
+        if loading_frames is None:
+            loading_frames = create_loading_frames()
         
         if loading_label is None:
-            loading_label = tk.Label(root, bg=THEME['bg'])
-            loading_label.place(relx=0.5, rely=0.5, anchor='center')
+            loading_label = tk.Label(root, bg=THEME['bg'], compound='left', padx=5)
         
         loading_label.config(text=message)
-        update_loading_animation()
-        return loading_label
-    except:
-        return None
+        loading_label.place(relx=0.5, rely=0.5, anchor='center')
+        if not loading_visible:
+            loading_visible = True
+            update_loading_animation()
+    except Exception as e:
+        print(f"Error showing loading animation: {e}")
 
-def hide_loading(label=None):
-    """Hide the loading animation."""
-    global loading_label
+def _hide_loading():
+    global loading_visible
+    loading_visible = False
     try:
-        if label:
-            label.place_forget()
-        elif loading_label:
+        if loading_label:
             loading_label.place_forget()
-        loading_label = None
     except:
         pass
 
-def create_progress_hook():
-    """Create a progress hook for yt-dlp."""
-    def progress_hook(d):
-        if download_cancelled:
-            # Raise an exception to stop the download
-            raise yt_dlp.utils.DownloadError("Download cancelled by user")
-            
-        if d['status'] == 'downloading':
-            try:
-                # Calculate download progress
-                total = d.get('total_bytes', 0) or d.get('total_bytes_estimate', 0)
-                downloaded = d.get('downloaded_bytes', 0)
-                
-                if total > 0:
-                    percent = (downloaded / total) * 100
-                    speed = d.get('speed', 0)
-                    if speed:
-                        eta = d.get('eta', 0)
-                        speed_str = f"{speed/1024/1024:.1f} MB/s"
-                        eta_str = f"ETA: {eta//60}m {eta%60}s"
-                        message = f"Downloading: {percent:.1f}% | Speed: {speed_str} | {eta_str}"
-                    else:
-                        message = f"Downloading: {percent:.1f}%"
-                    
-                    # Update progress bar and label through the UI queue
-                    ui_queue.put(lambda: update_progress(percent, message))
-                    log(message)
-            except Exception as e:
-                log(f"Progress error: {str(e)}")
-        
-        elif d['status'] == 'finished':
-            if not download_cancelled:
-                ui_queue.put(lambda: update_progress(100, "Download complete! Processing..."))
-                log("Download complete! Processing video...")
-        
-        elif d['status'] == 'error':
-            if not download_cancelled:
-                error_msg = d.get('error', 'Unknown error')
-                ui_queue.put(lambda: update_progress(0, f"Error occurred: {error_msg}"))
-                log(f"Download error: {error_msg}")
-    
-    return progress_hook
-
 def is_auto_start_enabled():
     """Check if the application is set to start with Windows"""
     try:
@@ -465,7 +399,7 @@ def debug_update_check():
                 'Accept': 'application/vnd.github.v3+json',
                 'User-Agent': 'Yamin-media-downloader'
             }
-            response = requests.get(GITHUB_API_URL, headers=headers)
+            response = http_session.get(GITHUB_API_URL, headers=headers)
             log(f"API Response Status: {response.status_code}")
             
             if response.status_code == 200:
@@ -504,8 +438,21 @@ video_quality_var = tk.StringVar(value='best')
 audio_quality_var = tk.StringVar(value='320')
 format_var = tk.StringVar(value='mp4')
 
+# Download queue settings variables
+max_workers_var = tk.IntVar(value=DEFAULT_MAX_WORKERS)
+per_host_limit_var = tk.IntVar(value=DEFAULT_PER_HOST_LIMIT)
+playlist_workers_var = tk.IntVar(value=DEFAULT_PLAYLIST_WORKERS)
+connections_var = tk.IntVar(value=DEFAULT_CONNECTIONS)
+post_workers_var = tk.IntVar(value=default_workers())
+progress_rate_var = tk.IntVar(value=round(1 / DEFAULT_PROGRESS_INTERVAL))
+log_level_var = tk.StringVar(value='info')
+bandwidth_limit_var = tk.IntVar(value=0)  # KB/s, 0 for unlimited
+unlimited_overnight_var = BooleanVar(value=False)
+priority_var = tk.StringVar(value=DEFAULT_PRIORITY)  # Bandwidth share of newly queued downloads
+
 # Create auto-start variable
 auto_start_var = tk.BooleanVar(value=is_auto_start_enabled())
+startup.mark('window and theme')
 
 def update_quality_settings(quality_type, value):
     """Update quality settings and log the change."""
@@ -535,46 +482,47 @@ def on_format_change(*args):
     log(f"Format changed to: {value}")
     update_quality_settings('format', value)
 
-def threaded_download(is_audio):
-    """Start download in a separate thread."""
-    global current_download_thread
-    def download_thread():
-        try:
-            disable_buttons()
-            download_media(is_audio)
-        finally:
-            enable_buttons()
-            current_download_thread = None
-    
-    # Start the download in a new thread
-    current_download_thread = threading.Thread(target=download_thread, daemon=True)
-    current_download_thread.start()
+def on_concurrency_change(*args):
+    max_workers = max_workers_var.get()
+    per_host_limit = per_host_limit_var.get()
+    if 'download_queue' in globals():
+        download_queue.set_limits(max_workers, per_host_limit)
+    log(f"Concurrent downloads: {max_workers} (max {per_host_limit} per site)")
+
+def on_post_workers_change(*args):
+    workers = post_workers_var.get()
+    if 'post_pool' in globals():
+        post_pool.set_workers(workers)
+    log(f"Files converted at once: {workers}")
+
+def on_progress_rate_change(*args):
+    rate = progress_rate_var.get()
+    if 'download_engine' in globals():
+        download_engine.progress.interval = 1.0 / rate
+    log(f"Progress updates limited to {rate} per second")
+
+def on_bandwidth_change(*args):
+    """Apply the Settings > Bandwidth Limit choices; running downloads adjust at once."""
+    limit = bandwidth_limit_var.get() * 1024 or None
+    bandwidth.set_limit(limit)
+    bandwidth.set_schedule([(OVERNIGHT_START, OVERNIGHT_END, None)] if unlimited_overnight_var.get() else [])
+    message = f"Bandwidth limit: {format_rate(limit)}"
+    if limit and unlimited_overnight_var.get():
+        message += " (unlimited from 1:00 to 7:00)"
+    log(f"{message}; now {bandwidth.describe()}")
 
-def enable_buttons():
-    """Enable the download buttons."""
-    try:
-        if 'video_btn' in globals():
-            video_btn.config(state='normal')
-            video_btn.grid()  # Ensure button is visible
-        if 'audio_btn' in globals():
-            audio_btn.config(state='normal')
-            audio_btn.grid()  # Ensure button is visible
-        if 'cancel_btn' in globals():
-            cancel_btn.grid_remove()  # Hide cancel button
-    except:
-        pass
+def threaded_download(is_audio):
+    """Validate the request in a separate thread and add it to the download queue."""
+    threading.Thread(target=download_media, args=(is_audio,), daemon=True).start()
 
-def disable_buttons():
-    """Disable the download buttons."""
+def update_queue_buttons():
+    """Show the cancel button only while jobs are queued or running."""
     try:
-        if 'video_btn' in globals():
-            video_btn.config(state='disabled')
-            video_btn.grid()  # Keep button visible but disabled
-        if 'audio_btn' in globals():
-            audio_btn.config(state='disabled')
-            audio_btn.grid()  # Keep button visible but disabled
         if 'cancel_btn' in globals():
-            cancel_btn.grid()  # Show cancel button
+            if download_queue.active_jobs():
+                cancel_btn.grid()  # Show cancel button
+            else:
+                cancel_btn.grid_remove()  # Hide cancel button
     except:
         pass
 
@@ -682,34 +630,37 @@ def compare_versions(v1, v2):
         return False
 
 def check_updates_on_startup():
-    """Check for updates when the application starts"""
+    """Start the update check in the background so the window never waits on the network."""
+    global update_thread
+    if update_thread is not None and update_thread.is_alive():
+        log("Update check already running")
+        return
+    update_thread = threading.Thread(target=run_update_check, daemon=True)
+    update_thread.start()
+
+def run_update_check():
+    """Check for application and FFmpeg updates (runs on the update thread)."""
     global FORCE_UPDATE_CHECK
+    forced = FORCE_UPDATE_CHECK
+    latest_release = staged_path = error = None
+    checked = False  # Whether the application check ran or was skipped by the daily interval
+    started = time.perf_counter()
     try:
         log("\n=== Update Check Process Started ===")
         print("\n=== UPDATE CHECK PROCESS STARTED ===")
         
-        # Always check for application updates when manually initiated
-        log("Starting application update check...")
-        latest_release = check_for_updates()
-        
-        if latest_release:
-            latest_version = latest_release.get('tag_name', '').lstrip('v')
-            log(f"New version {latest_version} available!")
+        # The application check runs at most once a day unless forced
+        if should_check_for_updates():
+            log("Starting application update check...")
+            latest_release = check_for_updates()
+            checked = True
+            update_check_timestamp()
             
-            if messagebox.askyesno("Update Available", 
-                                 f"Version {latest_version} is available. Would you like to update now?"):
-                log("User chose to update")
-                download_and_install_update(latest_release)
-            else:
-                log("User chose not to update")
+            # Download the new version now so it is ready to install
+            if latest_release:
+                staged_path = stage_update(latest_release)
         else:
-            if FORCE_UPDATE_CHECK:
-                # Only show the "no updates" message if the user manually checked
-                messagebox.showinfo("No Updates", "You have the latest version.")
-            log("No updates available")
-        
-        # Always update the timestamp
-        update_check_timestamp()
+            log("Skipping application update check, last check was less than a day ago")
             
         # Check for FFmpeg updates
         log("Starting FFmpeg update check...")
@@ -719,18 +670,48 @@ def check_updates_on_startup():
         print("=== UPDATE CHECK PROCESS COMPLETED ===\n")
         
     except Exception as e:
+        error = e
         log(f"Error in update check process: {str(e)}")
         print(f"Error in update check process: {str(e)}")
         print(traceback.format_exc())
-        
-        if FORCE_UPDATE_CHECK:
+    finally:
+        # Reset force flag after check
+        FORCE_UPDATE_CHECK = False
+        startup.record('update check', time.perf_counter() - started)
+    
+    ui.post(lambda: on_update_check_done(latest_release, staged_path, error, forced, checked))
+
+def on_update_check_done(latest_release, staged_path, error, forced, checked=True):
+    """Report the result of a background update check on the UI thread."""
+    if error is not None:
+        if forced:
             # Show error message if user manually checked
             messagebox.showerror("Update Check Failed", 
-                               f"Failed to check for updates: {str(e)}\n\n"
+                               f"Failed to check for updates: {str(error)}\n\n"
                                "Please check your internet connection.")
+        return
     
-    # Reset force flag after check
-    FORCE_UPDATE_CHECK = False
+    if latest_release:
+        latest_version = latest_release.get('tag_name', '').lstrip('v')
+        log(f"New version {latest_version} available!")
+        if not staged_path:
+            if forced:
+                messagebox.showerror("Update Error", f"Version {latest_version} is available but could not be downloaded.")
+            return
+        if messagebox.askyesno("Update Available", 
+                             f"Version {latest_version} has been downloaded. Would you like to restart and update now?\n\n"
+                             "Otherwise it will be installed the next time the app starts."):
+            log("User chose to update")
+            apply_update(staged_path)
+        else:
+            log("User chose to update later")
+    elif not checked:
+        log("Application update check skipped, checked within the last day")
+    else:
+        if forced:
+            # Only show the "no updates" message if the user manually checked
+            messagebox.showinfo("No Updates", "You have the latest version.")
+        log("No updates available")
 
 def check_for_updates():
     """Check for updates on GitHub and return the latest version if available."""
@@ -748,7 +729,7 @@ def check_for_updates():
         }
         
         print("Sending request to GitHub API...")
-        response = requests.get(GITHUB_API_URL, headers=headers, timeout=10)
+        response = http_session.get(GITHUB_API_URL, headers=headers)
         log(f"GitHub API Response Status: {response.status_code}")
         print(f"GitHub API Response Status: {response.status_code}")
         
@@ -790,7 +771,7 @@ def check_for_updates():
             log("You have the latest version")
             print("✓ You have the latest version")
             return None
-    except requests.exceptions.RequestException as e:
+    except http_session.RequestException as e:
         log(f"Network error checking for updates: {e}")
         print(f"Network error checking for updates: {e}")
         return None
@@ -800,8 +781,8 @@ def check_for_updates():
         print(traceback.format_exc())
         return None
 
-def download_and_install_update(release):
-    """Download and install the latest release."""
+def stage_update(release):
+    """Download a release into the updates folder. Returns the exe path or None."""
     try:
         print("\n=== DOWNLOADING UPDATE ===")
         
@@ -814,7 +795,7 @@ def download_and_install_update(release):
                 'Accept': 'application/vnd.github.v3+json',
                 'User-Agent': f'Yamin-media-downloader/{CURRENT_VERSION}'
             }
-            response = requests.get(GITHUB_API_URL, headers=headers, timeout=10)
+            response = http_session.get(GITHUB_API_URL, headers=headers)
             if response.status_code != 200:
                 raise Exception(f"Could not fetch release data: {response.status_code}")
             release = response.json()
@@ -837,89 +818,166 @@ def download_and_install_update(release):
         if not exe_asset:
             raise Exception("No executable found in release assets")
         
-        # Create temporary directory for download
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-            exe_path = temp_path / exe_asset['name']
-            
-            # Download the new version
-            download_url = exe_asset['browser_download_url']
-            print(f"Downloading from: {download_url}")
-            log("Downloading update...")
-            
-            # Show a message to inform the user that download is in progress
-            messagebox.showinfo("Downloading Update", 
-                               f"Downloading version {latest_version}...\n\n"
-                               "The application will restart automatically when the update is complete.")
-            
-            # Download with progress tracking
-            response = requests.get(download_url, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            
-            with open(exe_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    downloaded += len(chunk)
-                    f.write(chunk)
-                    # Calculate and print progress
-                    if total_size > 0:
-                        percent = (downloaded / total_size) * 100
-                        if percent % 10 < 1:  # Print every ~10%
-                            print(f"Download progress: {percent:.1f}% ({downloaded}/{total_size} bytes)")
-            
-            print(f"Download complete: {exe_path}")
-            
-            # Create update script that will:
-            # 1. Wait for this process to exit
-            # 2. Delete the current executable
-            # 3. Move the new executable in place
-            # 4. Start the new version
-            update_script = temp_path / "update.bat"
-            current_exe = sys.executable
-            
-            print(f"Creating update script at: {update_script}")
-            print(f"Current executable: {current_exe}")
-            
-            with open(update_script, 'w') as f:
-                f.write(f"""@echo off
-echo Waiting for application to close...
-timeout /t 2 /nobreak
-echo Updating Media Downloader...
-del "{current_exe}"
-if exist "{current_exe}" (
-    echo Retrying with force delete...
-    taskkill /f /im "{os.path.basename(current_exe)}" 2>nul
-    timeout /t 1 /nobreak
-    del /f "{current_exe}"
-)
-echo Copying new version...
-copy "{exe_path}" "{current_exe}"
-if exist "{current_exe}" (
-    echo Starting new version...
-    start "" "{current_exe}"
-) else (
-    echo ERROR: Failed to copy new version.
-    pause
-)
-""")
-            
-            print("Running update script...")
-            # Run update script and exit
-            subprocess.Popen([str(update_script)], shell=True)
-            time.sleep(1)  # Give it a moment to start
-            print("Exiting for update...")
-            sys.exit(0)
+        UPDATES_DIR.mkdir(parents=True, exist_ok=True)
+        exe_path = UPDATES_DIR / exe_asset['name']
+        expected_sha256 = release_asset_sha256(release, exe_asset)
+        if not expected_sha256:
+            # Never install an executable that cannot be verified
+            raise Exception(f"Release {latest_version} publishes no SHA-256 for {exe_asset['name']}, "
+                            "not installing an unverified update")
+        log(f"Update checksum: {expected_sha256}", level='debug')
+        
+        # Download the new version; an interrupted download continues next time
+        download_url = exe_asset['browser_download_url']
+        print(f"Downloading from: {download_url}")
+        log(f"Downloading version {latest_version} in the background...")
+        
+        def report(done, total):
+            if total:
+                print(f"Download progress: {100 * done / total:.1f}% ({done}/{total} bytes)")
+        
+        # One connection at background priority and a small share of any bandwidth
+        # limit, so downloads in progress keep the bandwidth
+        stream = bandwidth.open("update", weight=0.25)
+        try:
+            with low_priority():
+                fetch(download_url, exe_path, expected_sha256=expected_sha256, on_progress=report,
+                      segments=1, scores=mirror_scores, throttle=stream.consume)
+        finally:
+            stream.close()
+        print(f"Download complete: {exe_path}")
+        
+        with open(PENDING_UPDATE_FILE, 'w') as f:
+            json.dump({'version': latest_version, 'path': str(exe_path),
+                       'sha256': expected_sha256, 'size': exe_path.stat().st_size}, f)
+        log(f"Version {latest_version} is ready to install")
+        return exe_path
             
+    except Exception as e:
+        log(f"Error downloading update: {str(e)}")
+        print(f"Error downloading update: {str(e)}")
+        print(traceback.format_exc())
+        return None
+
+def release_asset_sha256(release, asset):
+    """SHA-256 of a release asset from the release metadata, or None."""
+    # GitHub reports a digest for every asset uploaded since mid-2025
+    digest = asset.get('digest') or ''
+    if digest.startswith('sha256:'):
+        return digest.split(':', 1)[1].lower()
+    
+    # Otherwise look for a checksum file published next to it
+    name = asset.get('name', '')
+    for candidate in release.get('assets', []):
+        candidate_name = candidate.get('name', '').lower()
+        if candidate_name in (f"{name.lower()}.sha256", 'checksums.sha256', 'sha256sums', 'sha256sums.txt', 'checksums.txt'):
+            checksum = fetch_checksum(candidate['browser_download_url'], name)
+            if checksum:
+                return checksum
+    return None
+
+def pending_update():
+    """(version, exe path) of a downloaded update newer than this version, or None."""
+    try:
+        if not PENDING_UPDATE_FILE.exists():
+            return None
+        with open(PENDING_UPDATE_FILE, 'r') as f:
+            pending = json.load(f)
+        exe_path = Path(pending['path'])
+        if (compare_versions(pending['version'], CURRENT_VERSION) and pending.get('sha256')
+                and exe_path.exists()
+                and exe_path.stat().st_size == pending.get('size', exe_path.stat().st_size)):
+            return pending['version'], exe_path
+        
+        # Already installed, gone or unverified: clean up the leftovers
+        discard_update(exe_path)
+    except Exception as e:
+        log(f"Error reading pending update: {e}")
+    return None
+
+def staged_sha256(exe_path):
+    """SHA-256 recorded when exe_path was downloaded and verified, or None."""
+    try:
+        with open(PENDING_UPDATE_FILE, 'r') as f:
+            pending = json.load(f)
+        if Path(pending['path']) == Path(exe_path):
+            return pending.get('sha256')
+    except Exception as e:
+        log(f"Error reading pending update: {e}")
+    return None
+
+def discard_update(exe_path):
+    """Delete a staged update and its record."""
+    for path in (exe_path, PENDING_UPDATE_FILE):
+        try:
+            Path(path).unlink()
+        except OSError:
+            pass
+
+def apply_update(exe_path):
+    """Swap the verified staged exe in for the running one and restart."""
+    try:
+        if not getattr(sys, 'frozen', False):
+            log("Running from source; the downloaded update is only installed by the packaged app")
+            return False
+        
+        current_exe = Path(sys.executable)
+        new_exe = current_exe.with_name(current_exe.name + '.new')
+        old_exe = current_exe.with_name(current_exe.name + '.old')
+        print(f"Installing {exe_path} over {current_exe}")
+        
+        # Copy next to the target first so the swap below is two renames on one volume
+        shutil.copy2(str(exe_path), str(new_exe))
+        
+        # The file may have changed since it was downloaded, so hash the copy
+        # that is about to run against the checksum it was verified with
+        expected_sha256 = staged_sha256(exe_path)
+        actual_sha256 = sha256_file(new_exe)
+        if not expected_sha256 or actual_sha256 != expected_sha256.lower():
+            new_exe.unlink()
+            discard_update(exe_path)
+            raise Exception(f"The downloaded update no longer matches its checksum "
+                            f"(expected {expected_sha256 or 'none'}, got {actual_sha256}) and was deleted")
+        
+        if old_exe.exists():
+            old_exe.unlink()
+        
+        # Windows lets a running exe be renamed, just not deleted or overwritten
+        os.replace(current_exe, old_exe)
+        try:
+            os.replace(new_exe, current_exe)
+        except Exception:
+            os.replace(old_exe, current_exe)
+            raise
+        
+        discard_update(exe_path)
+        
+        print("Starting new version...")
+        subprocess.Popen([str(current_exe)], close_fds=True)
+        print("Exiting for update...")
+        if tray_icon is not None:
+            tray_icon.stop()
+        os._exit(0)
+        
     except Exception as e:
         error_msg = str(e)
         log(f"Error installing update: {error_msg}")
         print(f"Error installing update: {error_msg}")
         print(traceback.format_exc())
-        messagebox.showerror("Update Error", f"Failed to install update: {error_msg}")
+        ui.post(lambda: messagebox.showerror("Update Error", f"Failed to install update: {error_msg}"))
         return False
 
+def remove_previous_version():
+    """Delete the exe left behind by the last update swap."""
+    if getattr(sys, 'frozen', False):
+        old_exe = Path(sys.executable).with_name(Path(sys.executable).name + '.old')
+        try:
+            if old_exe.exists():
+                old_exe.unlink()
+                log("Removed the previous version left by the last update")
+        except OSError:
+            pass
+
 def check_ffmpeg_update():
     """Check for FFmpeg updates."""
     try:
@@ -930,24 +988,32 @@ def check_ffmpeg_update():
         if not ffmpeg_path.exists():
             return
             
-        result = subprocess.run([str(ffmpeg_path), '-version'], 
-                              capture_output=True, 
-                              text=True,
-                              creationflags=subprocess.CREATE_NO_WINDOW)
-        if result.returncode != 0:
+        caps = ffmpeg_capabilities.get(ffmpeg_path)
+        if not caps.ok:
+            return
+        log(f"Installed FFmpeg: {caps.version} (build {ffmpeg_manifest.installed_tag or 'unknown'})", level='debug')
+        
+        if not FORCE_UPDATE_CHECK and not ffmpeg_manifest.due():
+            log("FFmpeg update check skipped, checked recently", level='debug')
             return
             
-        # Check GitHub for latest FFmpeg version
+        # Check GitHub for latest FFmpeg version (a 304 if nothing changed)
         log("Checking for FFmpeg updates...")
-        response = requests.get("https://api.github.com/repos/BtbN/FFmpeg-Builds/releases/latest")
-        response.raise_for_status()
-        latest_release = response.json()
+        headers = {
+            'Accept': 'application/vnd.github.v3+json',
+            'User-Agent': f'Yamin-media-downloader/{CURRENT_VERSION}'
+        }
+        latest_release = ffmpeg_manifest.check(http_session.get, binary_path=str(ffmpeg_path),
+                                                force=FORCE_UPDATE_CHECK, headers=headers)
         
-        # If there's a new version, download it
-        if latest_release.get('tag_name'):
-            log("New FFmpeg version available. Starting download...")
+        # Only download when the published build is newer than ours
+        if latest_release:
+            log(f"New FFmpeg build {latest_release.get('tag_name')} "
+                f"({latest_release.get('published_at')}) available. Starting download...")
             # The download_ffmpeg function will handle its own loading animation
-            download_ffmpeg()
+            download_ffmpeg(release=latest_release)
+        else:
+            log("FFmpeg is up to date")
             
     except Exception as e:
         log(f"Error checking FFmpeg updates: {str(e)}")
@@ -962,7 +1028,7 @@ menubar.add_cascade(label="File", menu=file_menu)
 file_menu.add_command(label="Open Download Folder", command=lambda: os.startfile(str(downloads_path)))
 file_menu.add_checkbutton(label="Auto-start", variable=auto_start_var, command=toggle_auto_start)
 file_menu.add_separator()
-file_menu.add_command(label="Exit", command=root.quit)
+file_menu.add_command(label="Exit", command=lambda: quit_app())
 
 # Settings Menu
 settings_menu = tk.Menu(menubar, tearoff=0)
@@ -993,6 +1059,68 @@ format_menu.add_radiobutton(label="MP4", variable=format_var, value='mp4', comma
 format_menu.add_radiobutton(label="WebM", variable=format_var, value='webm', command=lambda: on_format_change())
 format_menu.add_radiobutton(label="MKV", variable=format_var, value='mkv', command=lambda: on_format_change())
 
+# Concurrency Submenus
+workers_menu = tk.Menu(settings_menu, tearoff=0)
+settings_menu.add_cascade(label="Simultaneous Downloads", menu=workers_menu)
+for count in (1, 2, 3, 4, 6, 8):
+    workers_menu.add_radiobutton(label=str(count), variable=max_workers_var, value=count, command=lambda: on_concurrency_change())
+
+per_host_menu = tk.Menu(settings_menu, tearoff=0)
+settings_menu.add_cascade(label="Downloads Per Site", menu=per_host_menu)
+for count in (1, 2, 3, 4):
+    per_host_menu.add_radiobutton(label=str(count), variable=per_host_limit_var, value=count, command=lambda: on_concurrency_change())
+
+playlist_workers_menu = tk.Menu(settings_menu, tearoff=0)
+settings_menu.add_cascade(label="Parallel Playlist Items", menu=playlist_workers_menu)
+for count in (1, 2, 4, 6, 8):
+    playlist_workers_menu.add_radiobutton(label=str(count), variable=playlist_workers_var, value=count,
+                                          command=lambda: log(f"Playlist items downloaded at once: {playlist_workers_var.get()}"))
+
+connections_menu = tk.Menu(settings_menu, tearoff=0)
+settings_menu.add_cascade(label="Connections Per File", menu=connections_menu)
+for count in (1, 2, 4, 8):
+    connections_menu.add_radiobutton(label=str(count), variable=connections_var, value=count,
+                                     command=lambda: log(f"Connections per file: {connections_var.get()}"))
+
+post_workers_menu = tk.Menu(settings_menu, tearoff=0)
+settings_menu.add_cascade(label="Processing Workers", menu=post_workers_menu)
+for count in sorted({1, 2, 4, default_workers()}):
+    post_workers_menu.add_radiobutton(label=str(count), variable=post_workers_var, value=count,
+                                      command=lambda: on_post_workers_change())
+
+bandwidth_menu = tk.Menu(settings_menu, tearoff=0)
+settings_menu.add_cascade(label="Bandwidth Limit", menu=bandwidth_menu)
+for kbps in (0, 256, 512, 1024, 2048, 5120, 10240):
+    bandwidth_menu.add_radiobutton(label=format_rate(kbps * 1024) if kbps else "Unlimited", variable=bandwidth_limit_var,
+                                   value=kbps, command=lambda: on_bandwidth_change())
+bandwidth_menu.add_separator()
+bandwidth_menu.add_checkbutton(label="Unlimited Overnight (1:00-7:00)", variable=unlimited_overnight_var,
+                               command=lambda: on_bandwidth_change())
+
+priority_menu = tk.Menu(settings_menu, tearoff=0)
+settings_menu.add_cascade(label="Download Priority", menu=priority_menu)
+for priority in PRIORITY_WEIGHTS:
+    priority_menu.add_radiobutton(label=priority.capitalize(), variable=priority_var, value=priority,
+                                  command=lambda: log(f"New downloads get {priority_var.get()} priority "
+                                                      f"({PRIORITY_WEIGHTS[priority_var.get()]}x share of the bandwidth limit)"))
+
+progress_rate_menu = tk.Menu(settings_menu, tearoff=0)
+settings_menu.add_cascade(label="Progress Update Rate", menu=progress_rate_menu)
+for rate in (2, 5, 10, 20):
+    progress_rate_menu.add_radiobutton(label=f"{rate} per second", variable=progress_rate_var, value=rate,
+                                       command=lambda: on_progress_rate_change())
+
+log_level_menu = tk.Menu(settings_menu, tearoff=0)
+settings_menu.add_cascade(label="Log Level", menu=log_level_menu)
+log_level_menu.add_radiobutton(label="Debug", variable=log_level_var, value='debug', command=lambda: on_log_level_change())
+log_level_menu.add_radiobutton(label="Info", variable=log_level_var, value='info', command=lambda: on_log_level_change())
+log_level_menu.add_radiobutton(label="Warnings", variable=log_level_var, value='warning', command=lambda: on_log_level_change())
+log_level_menu.add_radiobutton(label="Errors", variable=log_level_var, value='error', command=lambda: on_log_level_change())
+
+settings_menu.add_separator()
+settings_menu.add_command(label="Clear Metadata Cache", command=lambda: clear_info_cache())
+settings_menu.add_command(label="Clear Download Archive", command=lambda: clear_download_archive())
+
 # Help Menu
 help_menu = tk.Menu(menubar, tearoff=0)
 menubar.add_cascade(label="Help", menu=help_menu)
@@ -1009,6 +1137,36 @@ help_menu.add_command(label="Report Issue",
 # Add debug command to Help menu
 help_menu.add_separator()
 help_menu.add_command(label="Debug Update System", command=debug_update_check)
+help_menu.add_command(label="Metadata Cache Statistics", command=lambda: show_info_cache_stats())
+startup.mark('menus')
+
+def show_info_cache_stats():
+    """Show hit and miss counters of the metadata cache."""
+    if info_cache is None:
+        messagebox.showinfo("Metadata Cache", "The metadata cache is not available.")
+        return
+    stats = info_cache.stats()
+    log(f"Metadata cache: {info_cache.describe()}")
+    messagebox.showinfo("Metadata Cache",
+        f"Hits: {stats['hits']}\n"
+        f"Misses: {stats['misses']} ({stats['expired']} expired)\n"
+        f"Hit rate: {stats['hit_rate']:.0%}\n"
+        f"Stored: {stats['stores']}, evicted: {stats['evictions']}\n"
+        f"Entries: {stats['entries']} ({stats['bytes'] / 1024 / 1024:.1f} MB)")
+
+def clear_info_cache():
+    """Drop every cached info dict."""
+    if info_cache is not None:
+        info_cache.clear()
+        log("Metadata cache cleared")
+
+def clear_download_archive():
+    """Forget which videos were downloaded, so they can be fetched again."""
+    if messagebox.askyesno("Clear Download Archive",
+                           "Forget every video downloaded so far?\n\n"
+                           "Playlists will download items again even if they were fetched before."):
+        download_archive.clear()
+        log("Download archive cleared")
 
 # Add function to force update check
 def force_check_updates():
@@ -1056,42 +1214,179 @@ class ModernCheckbutton(tk.Checkbutton):
             font=('Segoe UI', 10)
         )
 
-# Create a queue for thread-safe UI updates
-ui_queue = queue.Queue()
+class FrameScheduler:
+    """Runs UI work on the Tk thread in frames, and only when work is pending.
+
+    post() queues a one-shot task and set_state() keeps only the newest task
+    per key, so a widget gets one update per frame however many arrive. Both
+    are safe to call from any thread. A frame applies the keyed updates, then
+    runs queued tasks until budget_ms is spent and leaves the rest for the
+    next frame. Nothing is scheduled while there is no work.
+    """
+
+    def __init__(self, root, frame_ms=16, budget_ms=10):
+        self.root = root
+        self.frame_ms = frame_ms
+        self.budget_ms = budget_ms
+        self._tasks = collections.deque()
+        self._states = {}
+        self._flush_hooks = []
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    def post(self, task):
+        with self._lock:
+            self._tasks.append(task)
+        self.request_frame()
+
+    def set_state(self, key, task):
+        with self._lock:
+            self._states[key] = task
+        self.request_frame()
+
+    def add_flush_hook(self, hook):
+        """Run hook at the end of every frame (e.g. to flush batched text)."""
+        self._flush_hooks.append(hook)
+
+    def request_frame(self, delay_ms=None):
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        try:
+            self.root.after(self.frame_ms if delay_ms is None else delay_ms, self._run_frame)
+        except RuntimeError:
+            # Tk is not running yet; start() picks the work up
+            with self._lock:
+                self._scheduled = False
 
-def log(message, show_console=True):
-    """Log a message to the output box and status label if available, or queue it for later."""
-    try:
-        if show_console:
-            print(f"[Yamin Downloader] {message}")  # Always show in console
-        if 'output_box' in globals() and 'status_label' in globals():
-            output_box.config(state='normal')
-            # Insert at the beginning (index 1.0) instead of the end
-            output_box.insert('1.0', message + '\n')
-            # Auto-scroll to the top
-            output_box.see('1.0')
-            output_box.config(state='disabled')
-            status_label.config(text=message)
-        else:
-            early_log_queue.put(message)
-    except:
-        print(f"[Yamin Downloader] {message}")  # Fallback to console output
+    def start(self):
+        """Run the first frame once the main loop is about to start."""
+        self.request_frame(0)
+
+    def _run(self, task):
+        try:
+            task()
+        except Exception as e:
+            print(f"UI task error: {e}")
+            print(traceback.format_exc())
 
-def process_early_logs():
-    """Process any queued log messages once the GUI is ready."""
-    while not early_log_queue.empty():
+    def _run_frame(self):
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        with self._lock:
+            self._scheduled = False
+            states, self._states = self._states, {}
+        for task in states.values():
+            self._run(task)
+        while time.perf_counter() < deadline:
+            with self._lock:
+                if not self._tasks:
+                    break
+                task = self._tasks.popleft()
+            self._run(task)
+        for hook in self._flush_hooks:
+            self._run(hook)
+        with self._lock:
+            more = bool(self._tasks or self._states)
+        if more:
+            self.request_frame()
+
+# Frame scheduler for thread-safe UI updates
+ui = FrameScheduler(root)
+
+# Log levels understood by log() and the Settings > Log Level menu
+LOG_LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+LOG_VIEW_LINES = 1000      # Lines kept in the Download History box
+LOG_HISTORY_LINES = 10000  # Lines kept in memory for re-filtering
+
+def guess_log_level(message):
+    """Pick a level for messages logged without one."""
+    lowered = message.lstrip().lower()
+    if lowered.startswith(('error', 'unexpected error', 'uncaught')) or ' error' in lowered[:40]:
+        return 'error'
+    if lowered.startswith('warning'):
+        return 'warning'
+    return 'info'
+
+class LogView:
+    """Thread-safe ring buffer behind the Download History box.
+
+    Any thread may call add(); the UI thread calls flush() once per frame,
+    which writes every pending line with a single insert and trims the
+    widget to max_lines, so memory and redraw cost stay flat however long
+    the app runs.
+    """
+
+    def __init__(self, max_lines=LOG_VIEW_LINES, history_lines=LOG_HISTORY_LINES):
+        self.max_lines = max_lines
+        self.level = 'info'
+        self.total = 0
+        self.history = collections.deque(maxlen=history_lines)  # (level, message)
+        self._pending = collections.deque(maxlen=max_lines)
+        self._last_message = None
+        self._rebuild = False
+        self._lock = threading.Lock()
+
+    def add(self, message, level):
+        with self._lock:
+            self.total += 1
+            self.history.append((level, message))
+            self._last_message = message
+            if LOG_LEVELS[level] >= LOG_LEVELS[self.level]:
+                self._pending.append(message)
+        ui.request_frame()
+
+    def set_level(self, level):
+        """Change the level filter and redraw the box from the history."""
+        with self._lock:
+            self.level = level
+            self._pending.clear()
+            self._pending.extend(message for msg_level, message in self.history
+                                 if LOG_LEVELS[msg_level] >= LOG_LEVELS[level])
+            self._rebuild = True
+        ui.request_frame()
+
+    def flush(self):
+        """Write pending lines to the widget. Must run on the UI thread."""
+        if 'output_box' not in globals() or 'status_label' not in globals():
+            return
+        with self._lock:
+            if not self._pending and self._last_message is None and not self._rebuild:
+                return
+            lines = list(self._pending)
+            self._pending.clear()
+            last_message, self._last_message = self._last_message, None
+            rebuild, self._rebuild = self._rebuild, False
         try:
-            message = early_log_queue.get_nowait()
-            if 'output_box' in globals() and 'status_label' in globals():
-                output_box.config(state='normal')
-                # Insert at the beginning (index 1.0) instead of the end
-                output_box.insert('1.0', message + '\n')
-                # Auto-scroll to the top
+            output_box.config(state='normal')
+            if rebuild:
+                output_box.delete('1.0', 'end')
+            if lines:
+                # Newest first, as a single insert at the top
+                output_box.insert('1.0', '\n'.join(reversed(lines)) + '\n')
+                output_box.delete(f'{self.max_lines + 1}.0', 'end')
                 output_box.see('1.0')
-                output_box.config(state='disabled')
-                status_label.config(text=message)
-        except queue.Empty:
-            break
+            output_box.config(state='disabled')
+            if last_message is not None:
+                status_label.config(text=last_message)
+        except Exception as e:
+            print(f"Error updating log view: {e}")
+
+log_view = LogView()
+ui.add_flush_hook(log_view.flush)
+
+def log(message, show_console=True, level=None):
+    """Log a message to the console and queue it for the Download History box."""
+    message = str(message)
+    level = level or guess_log_level(message)
+    if show_console:
+        print(f"[Yamin Downloader] {message}")  # Always show in console
+    log_view.add(message, level)
+
+def on_log_level_change(*args):
+    level = log_level_var.get()
+    log_view.set_level(level)
+    log(f"Log level set to: {level}")
 
 # Set window icon
 if ICON_PATH.exists():
@@ -1117,16 +1412,19 @@ main_container.grid_columnconfigure(0, weight=1)
 header_frame = tk.Frame(main_container, bg=THEME['bg'])
 header_frame.grid(row=0, column=0, sticky="ew", pady=(0, 20))
 
-# Logo and Title
-try:
-    logo = Image.open(ICON_PATH)
-    logo = logo.resize((48, 48), Image.Resampling.LANCZOS)
-    logo_photo = ImageTk.PhotoImage(logo)
-    logo_label = tk.Label(header_frame, image=logo_photo, bg=THEME['bg'])
-    logo_label.image = logo_photo
-    logo_label.pack(side='left', padx=(0, 10))
-except:
-    pass
+# Logo and Title (the image is filled in by load_logo() once Pillow is loaded)
+logo_label = tk.Label(header_frame, bg=THEME['bg'])
+logo_label.pack(side='left', padx=(0, 10))
+
+def load_logo():
+    try:
+        logo = Image.open(ICON_PATH)
+        logo = logo.resize((48, 48), Image.Resampling.LANCZOS)
+        logo_photo = ImageTk.PhotoImage(logo)
+        logo_label.configure(image=logo_photo)
+        logo_label.image = logo_photo
+    except:
+        logo_label.pack_forget()
 
 title_label = tk.Label(
     header_frame,
@@ -1179,13 +1477,11 @@ status_label = tk.Label(
 )
 status_label.grid(row=1, column=0, sticky="w", padx=10, pady=(0, 10))
 
-# Process any early logs
-process_early_logs()
-
 # Initialize FFmpeg in a separate thread
 def initialize_ffmpeg():
     """Initialize FFmpeg and FFprobe."""
     global ffmpeg_path, ffprobe_path
+    started = time.perf_counter()
     try:
         # Debug the FFmpeg initialization
         print("\n=== INITIALIZING FFMPEG ===")
@@ -1239,12 +1535,17 @@ def initialize_ffmpeg():
         
         # Update status
         log("Initialization complete. Ready to download!")
-        status_label.config(text="Ready to download")
+        ui.set_state('status', lambda: status_label.config(text="Ready to download"))
+        
+        # Pick up downloads interrupted by the last shutdown
+        ui.post(resume_unfinished_jobs)
     except Exception as e:
         log(f"Error initializing FFmpeg: {str(e)}")
         print(f"Error initializing FFmpeg: {str(e)}")
         print(traceback.format_exc())
-        status_label.config(text="Error: FFmpeg initialization failed")
+        ui.set_state('status', lambda: status_label.config(text="Error: FFmpeg initialization failed"))
+    finally:
+        startup.record('FFmpeg init', time.perf_counter() - started)
 
 def verify_output_directories():
     """Verify that output directories exist and create them if they don't."""
@@ -1404,7 +1705,7 @@ audio_btn.grid(row=0, column=1, sticky="ew")
 # Add cancel button to buttons frame
 cancel_btn = tk.Button(
     buttons_frame,
-    text="Cancel Download",
+    text="Cancel Downloads",
     bg='#F44336',
     fg='white',
     activebackground='#424242',
@@ -1442,9 +1743,43 @@ progress = ttk.Progressbar(
 )
 progress.grid(row=1, column=0, sticky="ew")
 
+# Download Queue Display
+jobs_frame = tk.Frame(main_frame, bg=THEME['bg'])
+jobs_frame.grid(row=4, column=0, sticky="nsew", pady=(0, 20))
+jobs_frame.grid_rowconfigure(1, weight=1)
+jobs_frame.grid_columnconfigure(0, weight=1)
+
+jobs_label = tk.Label(
+    jobs_frame,
+    text="Download Queue:",
+    font=('Segoe UI', 12, 'bold'),
+    bg=THEME['bg'],
+    fg=THEME['fg']
+)
+jobs_label.grid(row=0, column=0, sticky="w", pady=(0, 5))
+
+jobs_list = ttk.Treeview(
+    jobs_frame,
+    columns=('title', 'status', 'progress'),
+    show='headings',
+    height=5,
+    selectmode='extended'
+)
+jobs_list.heading('title', text='Media')
+jobs_list.heading('status', text='Status')
+jobs_list.heading('progress', text='Progress')
+jobs_list.column('title', width=420, anchor='w')
+jobs_list.column('status', width=90, anchor='center')
+jobs_list.column('progress', width=80, anchor='e')
+jobs_list.grid(row=1, column=0, sticky="nsew")
+
+jobs_scrollbar = ttk.Scrollbar(jobs_frame, orient='vertical', command=jobs_list.yview)
+jobs_scrollbar.grid(row=1, column=1, sticky="ns")
+jobs_list.configure(yscrollcommand=jobs_scrollbar.set)
+
 # Output Display
 output_frame = tk.Frame(main_frame, bg=THEME['bg'])
-output_frame.grid(row=4, column=0, sticky="nsew", pady=(0, 20))
+output_frame.grid(row=5, column=0, sticky="nsew", pady=(0, 20))
 output_frame.grid_rowconfigure(1, weight=1)
 output_frame.grid_columnconfigure(0, weight=1)
 
@@ -1482,10 +1817,20 @@ status_label = tk.Label(
     fg=THEME['fg']
 )
 status_label.grid(row=0, column=0, sticky="w", padx=10)
+startup.mark('widgets')
 
 # System Tray Icon
 def create_tray_icon():
-    global tray_icon, tray_thread
+    """Build and run the tray icon in a background thread."""
+    global tray_thread
+    if tray_thread is not None and tray_thread.is_alive():
+        return
+    tray_thread = threading.Thread(target=run_tray_icon, daemon=True)
+    tray_thread.start()
+
+def run_tray_icon():
+    global tray_icon
+    started = time.perf_counter()
     try:
         if ICON_PATH.exists():
             icon_image = Image.open(ICON_PATH)
@@ -1494,8 +1839,8 @@ def create_tray_icon():
             icon_image = Image.new('RGB', (64, 64), THEME['primary'])
         
         menu = (
-            item('Show', lambda: show_window()),
-            item('Exit', lambda: root.quit())
+            pystray.MenuItem('Show', lambda: ui.post(show_window)),
+            pystray.MenuItem('Exit', lambda: ui.post(quit_app))
         )
         
         tray_icon = pystray.Icon(
@@ -1504,10 +1849,8 @@ def create_tray_icon():
             "Media Downloader",
             menu
         )
-        
-        # Run the tray icon in a separate thread
-        tray_thread = threading.Thread(target=tray_icon.run, daemon=True)
-        tray_thread.start()
+        startup.record('tray icon', time.perf_counter() - started)
+        tray_icon.run()
     except Exception as e:
         log(f"Error creating tray icon: {e}")
 
@@ -1520,8 +1863,7 @@ def show_window():
 def hide_window():
     """Hide the window to system tray."""
     root.withdraw()
-    if tray_icon is None:
-        create_tray_icon()
+    create_tray_icon()
 
 def on_minimize(event):
     """Handle window minimize event."""
@@ -1533,12 +1875,22 @@ def on_close():
     messagebox.showinfo("Minimizing to Tray", "This application will minimize to system tray and continue running in background.")
     hide_window()
 
+def quit_app():
+    """Exit from the File menu or the tray; conversions in progress finish first."""
+    remaining = post_pool.pending()
+    if remaining:
+        log(f"{remaining} downloaded file(s) still converting, exiting once they are done", level='warning')
+    post_pool.shutdown()
+    root.withdraw()
+    root.quit()
+
 # Bind minimize and close events
 root.protocol('WM_DELETE_WINDOW', on_close)
 root.bind('<Unmap>', on_minimize)  # Handle minimize button click
 
 # Start tray icon
 create_tray_icon()
+startup.mark('tray')
 
 # Update progress function to show percentage in status
 def update_progress(percent, message=None):
@@ -1556,103 +1908,187 @@ def finish_progress():
     progress_label.config(text="Download Complete!")
     status_label.config(text="Download Complete!")
 
-def process_queue():
-    """Process the UI update queue."""
-    while not ui_queue.empty():
-        try:
-            task = ui_queue.get_nowait()
-            task()
-        except queue.Empty:
-            break
-    root.after(100, process_queue)
-
-def create_loading_icon():
-    """Create a loading GIF animation."""
-    global loading_gif, loading_label
+def create_loading_frames():
+    """Pre-render the loading animation frames once."""
     try:
-        # Create a simple loading animation
         frames = []
         for i in range(8):
             img = Image.new('RGBA', (16, 16), (0, 0, 0, 0))
             draw = ImageDraw.Draw(img)
             angle = i * 45
             draw.pieslice([0, 0, 16, 16], angle, angle + 180, fill=THEME['primary'])
-            frames.append(img)
-        
-        # Save frames to memory
-        output = io.BytesIO()
-        frames[0].save(output, format='GIF', save_all=True, append_images=frames[1:], 
-                      duration=100, loop=0, transparency=0)
-        loading_gif = Image.open(output)
-        return loading_gif
+            frames.append(ImageTk.PhotoImage(img))
+        return frames
     except:
-        return None
+        return []
 
 def update_loading_animation():
-    """Update the loading animation."""
-    if loading_gif and loading_label:
+    """Show the next cached frame while the loading animation is visible."""
+    global loading_frame_index
+    if loading_visible and loading_frames and loading_label:
         try:
-            frame = next(loading_gif.iter_frames())
-            photo = ImageTk.PhotoImage(frame)
-            loading_label.configure(image=photo)
-            loading_label.image = photo
+            loading_label.configure(image=loading_frames[loading_frame_index % len(loading_frames)])
+            loading_frame_index += 1
             root.after(100, update_loading_animation)
         except:
             pass
 
-# Add global variable for download cancellation and yt-dlp instance
-download_cancelled = False
-ydl_instance = None
-current_download_thread = None
+# Headless download engine shared by the window, the tray and batch front-ends
+last_finished_path = None
+
+def handle_engine_event(event):
+    """Forward engine events to the log, the progress bar and the queue list."""
+    job = event.job
+    if event.kind == 'log':
+        log(event.message, level=event.data.get('level'))
+    elif event.kind == 'progress':
+        # Progress arrives already coalesced by the engine (10 Hz by default)
+        ui.set_state('progress', lambda p=event.percent, m=event.message: update_progress(p, m))
+        ui.set_state(('job', job.id), lambda j=job: refresh_job_row(j))
+        if event.data.get('log'):
+            log(event.message)
+    elif event.kind == 'state':
+        ui.set_state(('job', job.id), lambda j=job: refresh_job_row(j))
+        if job.state in (FINISHED, FAILED, CANCELLED):
+            ui.post(lambda j=job: on_job_done(j))
+
+def on_queue_idle():
+    """Called by the download queue when every job has finished."""
+    ui.post(queue_idle)
+
+# Queued, running and finished jobs are kept on disk so downloads survive restarts
+try:
+    job_store = JobStore(INSTALL_DIR / "jobs.db")
+except Exception as e:
+    print(f"Error opening job store: {e}")
+    job_store = None
+
+# Extracted video information is reused across retries, qualities and Video/Audio
+try:
+    info_cache = InfoCache(INSTALL_DIR / "info_cache.db")
+except Exception as e:
+    print(f"Error opening metadata cache: {e}")
+    info_cache = None
+
+# Record of finished downloads, so re-running a playlist skips what is already here
+download_archive = DownloadArchive(INSTALL_DIR, on_load=lambda archive_set: log(
+    f"Download archive: {archive_set.describe()}", show_console=False, level='debug'))
+
+# Fragment concurrency for HLS/DASH streams, tuned per site from measured throughput
+fragment_tuner = FragmentTuner(INSTALL_DIR / "fragment_tuning.json")
+
+# Audio extraction and conversion run here, so a download slot is free as soon as its file is
+post_pool = PostProcessPool(post_workers_var.get())
+
+download_engine = DownloadEngine(on_event=handle_engine_event, store=job_store, info_cache=info_cache,
+                                 fragment_tuner=fragment_tuner, governor=bandwidth,
+                                 archive=download_archive, post_pool=post_pool)
+download_queue = DownloadQueue(download_engine,
+                               max_workers=max_workers_var.get(),
+                               per_host_limit=per_host_limit_var.get(),
+                               on_idle=on_queue_idle)
+
+def resume_unfinished_jobs():
+    """Re-queue downloads that were still queued or running when the app last closed."""
+    if job_store is None:
+        return
+    try:
+        jobs = job_store.unfinished()
+        for job in jobs:
+            if ffmpeg_path:
+                job.options.ffmpeg_path = ffmpeg_path
+            download_queue.submit(job)
+        if jobs:
+            log(f"Resuming {len(jobs)} unfinished download(s)")
+        update_queue_buttons()
+        job_store.prune()
+    except Exception as e:
+        log(f"Error resuming downloads: {str(e)}")
+
+def refresh_job_row(job):
+    """Insert or update the queue list row for a job."""
+    try:
+        row_id = str(job.id)
+        values = (job.title or job.url, job.state.capitalize(), f"{job.percent:.0f}%")
+        if jobs_list.exists(row_id):
+            jobs_list.item(row_id, values=values)
+        else:
+            jobs_list.insert('', 'end', iid=row_id, values=values)
+            jobs_list.see(row_id)
+    except Exception as e:
+        print(f"Error updating queue list: {e}")
+
+def on_job_done(job):
+    """Report a finished, failed or cancelled job on the UI thread."""
+    global last_finished_path
+    result = job.result
+    if job.state == FAILED and result is not None:
+        messagebox.showerror(result.error_title or "Error", result.error)
+    elif job.state == FINISHED:
+        last_finished_path = result.output_path
+        if result.failed_entries:
+            log(f"{result.failed_entries} of {result.entries} playlist items failed: {job.title}")
+        if result.skipped:
+            log(f"Skipped {result.skipped} already downloaded item(s): {job.title}")
+    update_queue_buttons()
+
+def queue_idle():
+    """Reset the UI once the queue has drained."""
+    global last_finished_path
+    update_queue_buttons()
+    update_progress(0, "Ready to download")
+    # Whether the batch waited on the network or on FFmpeg
+    log(download_queue.describe_stages(), level='info')
+    download_queue.reset_stages()
+    if last_finished_path is not None:
+        # Success! Open the output folder
+        open_folder(last_finished_path)
+        last_finished_path = None
+    # Ensure window stays visible after download
+    root.deiconify()
+    root.lift()
+    root.focus_force()
 
 def cancel_download():
-    """Cancel the current download."""
-    global download_cancelled, ydl_instance, current_download_thread
-    download_cancelled = True
-    
+    """Cancel the selected downloads, or every active download if none are selected."""
     try:
-        # Cancel the yt-dlp instance by setting the download_cancelled flag
-        # The progress hook will check this flag and stop the download
-        if ydl_instance:
-            # Set the download_cancelled flag which is checked in the progress hook
-            ydl_instance = None
-        
-        # Force stop the download thread
-        if current_download_thread and current_download_thread.is_alive():
-            # Use a more aggressive approach to stop the thread
-            import ctypes
-            thread_id = ctypes.c_long(current_download_thread.ident)
-            ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id, ctypes.py_object(SystemExit))
-            current_download_thread.join(timeout=1)
-        
-        # Reset progress and UI
-        ui_queue.put(lambda: update_progress(0, "Download cancelled"))
-        ui_queue.put(lambda: enable_buttons())
-        log("Download cancelled by user")
-        
-        # Ensure window stays visible after cancellation
-        root.deiconify()
-        root.lift()
-        root.focus_force()
+        selected = set(jobs_list.selection())
+        jobs = [job for job in download_queue.active_jobs()
+                if not selected or str(job.id) in selected]
+        for job in jobs:
+            # The engine's progress hook checks the job flag and stops the download
+            download_queue.cancel(job)
+        
+        log(f"Cancelled {len(jobs)} download(s)")
+        update_queue_buttons()
     except Exception as e:
         log(f"Error during cancellation: {str(e)}")
 
-def download_media(is_audio):
-    """Download media from the provided URL."""
-    global ffmpeg_path, ffprobe_path, download_cancelled, ydl_instance
-    download_cancelled = False  # Reset cancellation flag
-    ydl_instance = None  # Reset yt-dlp instance
+def open_folder(path):
+    """Open a folder in Explorer."""
+    try:
+        folder_path = str(Path(path).resolve())
+        log(f"Opening folder: {folder_path}")
+        os.startfile(folder_path)
+    except Exception as e:
+        log(f"Error opening folder: {str(e)}")
+        # Try alternative method if the first one fails
+        try:
+            subprocess.Popen(['explorer', str(path)])
+        except Exception as e:
+            log(f"Alternative folder opening failed: {str(e)}")
+
+def download_media(is_audio, urls=None):
+    """Validate the URL(s) and settings, then add jobs to the download queue."""
+    global ffmpeg_path
     
     try:
         show_loading()  # Show loading animation
-        update_progress(0, "Starting download...")  # Initialize progress bar
         
         # Verify output directories exist
         if not verify_output_directories():
             messagebox.showerror("Error", "Failed to create output directories. Check permissions and disk space.")
-            hide_loading()
-            update_progress(0, "Ready to download")
-            return
+            return None
             
         # Verify FFmpeg is available
         if not ffmpeg_path or not os.path.exists(ffmpeg_path):
@@ -1660,37 +2096,19 @@ def download_media(is_audio):
             ffmpeg_path = download_ffmpeg()
             if not ffmpeg_path or not os.path.exists(ffmpeg_path):
                 messagebox.showerror("Error", "FFmpeg is required but could not be installed automatically.")
-                hide_loading()
-                update_progress(0, "Ready to download")
-                return
+                return None
         
         # Get current quality settings
-        current_video_quality = video_quality_var.get()
-        current_audio_quality = audio_quality_var.get()
-        current_format = format_var.get()
-        
-        # Update quality settings dictionary
-        quality_settings['video_quality'] = current_video_quality
-        quality_settings['audio_quality'] = current_audio_quality
-        quality_settings['format'] = current_format
-        
-        url = url_entry.get().strip()
-        if not url:
-            messagebox.showerror("Error", "Please enter a video URL")
-            hide_loading()
-            update_progress(0, "Ready to download")
-            return
-
-        # Check if URL is a playlist
-        is_playlist = ('playlist' in url.lower() or 
-                       'list=' in url.lower() or 
-                       '/sets/' in url.lower())  # Handle SoundCloud sets
-                       
-        if is_playlist and not download_playlist.get():
-            if not messagebox.askyesno("Playlist Detected", 
-                "This appears to be a playlist URL. Would you like to download the entire playlist?\n\n"
-                "If not, only the first video will be downloaded."):
-                is_playlist = False
+        quality_settings['video_quality'] = video_quality_var.get()
+        quality_settings['audio_quality'] = audio_quality_var.get()
+        quality_settings['format'] = format_var.get()
+        
+        if urls is None:
+            url = url_entry.get().strip()
+            if not url:
+                messagebox.showerror("Error", "Please enter a video URL")
+                return None
+            urls = [url]
 
         max_files = max_files_entry.get() or '100'
         try:
@@ -1698,289 +2116,39 @@ def download_media(is_audio):
         except ValueError:
             max_files = 100
 
-        # Set the appropriate output directory
-        if is_playlist:
-            output_path = playlist_output_dir
-            output_template = str(playlist_output_dir / '%(playlist_index)s_%(title)s.%(ext)s')
-        elif is_audio:
-            output_path = audio_output_dir
-            output_template = str(audio_output_dir / '%(title)s.%(ext)s')
-        else:
-            output_path = video_output_dir
-            output_template = str(video_output_dir / '%(title)s.%(ext)s')
-
-        log(f"Output directory set to: {output_path}")
-
-        # Validate URL
-        if not url.startswith(('http://', 'https://')):
-            log(f"URL validation failed: {url}")
-            messagebox.showerror("Error", "Please enter a valid URL starting with http:// or https://")
-            hide_loading()
-            update_progress(0, "Ready to download")
-            return
-
-        # Configure format and quality settings for highest quality
-        if is_audio:
-            format_code = 'bestaudio/best'
-            log(f"Downloading audio with settings:")
-            log(f"- Format: {format_code}")
-            log(f"- Quality: {current_audio_quality}kbps")
-        else:
-            # Updated format selection for highest quality
-            if current_video_quality == 'best':
-                format_code = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best'
-            else:
-                format_code = f'bestvideo[height<={current_video_quality}][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<={current_video_quality}]+bestaudio/best[height<={current_video_quality}]'
-            
-            log(f"Downloading video with settings:")
-            log(f"- Format: {format_code}")
-            log(f"- Quality: {current_video_quality}")
-            log(f"- Output Format: {current_format}")
-
-        ydl_opts = {
-            'format': format_code,
-            'progress_hooks': [create_progress_hook()],
-            'restrictfilenames': True,
-            'windowsfilenames': True,
-            'quiet': False,
-            'no_warnings': False,
-            'nocheckcertificate': True,  # Avoid certificate issues
-            'nooverwrites': True,
-            'ignoreerrors': True,  # Don't stop on errors
-            'continuedl': True,
-            'ffmpeg_location': ffmpeg_path,
-            'merge_output_format': current_format,
-            'verbose': True,
-            'outtmpl': output_template,
-            'playlist_items': f'1-{max_files}' if is_playlist else None,
-            'noplaylist': not is_playlist,
-            'ssl_verify': False,  # Disable SSL verification to avoid certificate issues
-            'source_address': None,
-            'socket_timeout': 30,
-            'retries': 10,
-            'extractor_retries': 10,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-        }
-        
-        # Configure postprocessor based on download type and quality settings
-        if is_audio:
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': current_audio_quality,
-            }]
-        else:
-            # For video downloads, add postprocessor to ensure best quality
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegVideoConvertor',
-                'preferedformat': current_format,
-            }]
-
-        ydl_instance = yt_dlp.YoutubeDL(ydl_opts)
-        try:
-            log("Extracting video information...")
-            try:
-                info = ydl_instance.extract_info(url, download=False)
-                if not info:
-                    raise Exception("Failed to extract video information")
-            except Exception as extract_error:
-                log(f"Error extracting info: {str(extract_error)}")
-                messagebox.showerror("Error", f"Failed to extract video information: {str(extract_error)}")
-                hide_loading()
-                update_progress(0, "Ready to download")
-                return
-            
-            log(f"Download options: {ydl_opts}")
-            
-            if is_playlist and 'entries' in info:
-                log(f"? Downloading playlist: {info.get('title', 'Untitled')}")
-                entries_count = len(list(info.get('entries', [])))
-                log(f"?? Number of items: {entries_count}")
-                log(f"?? Downloading first {max_files} items")
-            else:
-                log(f"? Downloading single video: {info.get('title', 'Untitled')}")
-                
-            log(f"? Download will be saved to: {output_path}")
-            log(f"? Starting download: {url}")
-            log(f"? Using quality settings: Video={current_video_quality}, Audio={current_audio_quality}kbps, Format={current_format}")
-            
-            if download_cancelled:
-                return
-                
-            # Start the actual download
-            log("Starting download process...")
-            try:
-                print("\n=== DOWNLOAD PROCESS STARTING ===")
-                print(f"URL: {url}")
-                print(f"Output path: {output_path}")
-                print(f"Format: {format_code}")
-                print(f"Is audio only: {is_audio}")
-                print(f"Is playlist: {is_playlist}")
-                print(f"FFmpeg path: {ffmpeg_path}")
-                print(f"Output template: {output_template}")
-                
-                # Check that output directory exists and is writable
-                print(f"Checking output directory...")
-                if not output_path.exists():
-                    print(f"Creating output directory: {output_path}")
-                    output_path.mkdir(parents=True, exist_ok=True)
-                
-                # Test write access to output directory
-                try:
-                    test_file = output_path / "test_write.tmp"
-                    with open(test_file, 'w') as f:
-                        f.write("test")
-                    test_file.unlink()
-                    print("Output directory is writable")
-                except Exception as e:
-                    print(f"Warning: Output directory may not be writable: {e}")
-                
-                print("Starting yt-dlp download...")
-                try:
-                    # First attempt - use the configured options
-                    ydl_instance.download([url])
-                    print("yt-dlp download function completed")
-                except Exception as primary_error:
-                    # If the primary method failed, try a fallback with simpler options
-                    print(f"\n=== PRIMARY DOWNLOAD FAILED, TRYING FALLBACK ===")
-                    print(f"Primary error: {str(primary_error)}")
-                    
-                    # Create simpler fallback options
-                    fallback_opts = {
-                        'format': 'best' if not is_audio else 'bestaudio',
-                        'outtmpl': output_template,
-                        'nocheckcertificate': True,
-                        'ignoreerrors': True,
-                        'no_warnings': True,
-                        'quiet': False,
-                        'verbose': True,
-                        'progress_hooks': [create_progress_hook()]
-                    }
-                    
-                    if is_audio:
-                        fallback_opts['postprocessors'] = [{
-                            'key': 'FFmpegExtractAudio',
-                            'preferredcodec': 'mp3',
-                            'preferredquality': current_audio_quality,
-                        }]
-                        
-                    print(f"Trying fallback with simplified options: {fallback_opts}")
-                    fallback_ydl = yt_dlp.YoutubeDL(fallback_opts)
-                    fallback_ydl.download([url])
-                    print("Fallback download completed")
-                
-            except yt_dlp.utils.DownloadError as download_error:
-                error_str = str(download_error)
-                print(f"\n=== DOWNLOAD ERROR DETAILS ===")
-                print(f"Error: {error_str}")
-                print(f"Error type: {type(download_error).__name__}")
-                
-                # Detailed error diagnosis
-                if "ffmpeg" in error_str.lower():
-                    print("This appears to be an FFmpeg error")
-                    log(f"FFmpeg error: {error_str}")
-                    messagebox.showerror("FFmpeg Error", 
-                        f"Error with FFmpeg: {error_str}\n\n"
-                        "Please check that FFmpeg is installed correctly.")
-                elif "HTTP Error 429" in error_str:
-                    print("This appears to be a rate limit error")
-                    log(f"Rate limit error: {error_str}")
-                    messagebox.showerror("Rate Limit Error", 
-                        "You are being rate limited by the server. Please try again later.")
-                elif "postprocessor" in error_str.lower():
-                    print("This appears to be a postprocessor error")
-                    log(f"Postprocessor error: {error_str}")
-                    messagebox.showerror("Processing Error", 
-                        f"Error processing the video: {error_str}\n\n"
-                        "Try downloading without conversion or in a different format.")
-                elif "copyright" in error_str.lower() or "not available" in error_str.lower():
-                    print("This appears to be a content availability error")
-                    log(f"Content availability error: {error_str}")
-                    messagebox.showerror("Content Error", 
-                        f"This content may not be available: {error_str}")
-                elif "network" in error_str.lower() or "connection" in error_str.lower():
-                    print("This appears to be a network error")
-                    log(f"Network error: {error_str}")
-                    messagebox.showerror("Network Error", 
-                        f"Network connection issue: {error_str}\n\n"
-                        "Check your internet connection and try again.")
-                else:
-                    print("This is an unclassified error")
-                    log(f"Download error: {error_str}")
-                    messagebox.showerror("Download Error", error_str)
-                
-                hide_loading()
-                update_progress(0, "Ready to download")
-                return
-            except Exception as e:
-                log(f"Unexpected download error: {str(e)}")
-                messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
-            finally:
-                ydl_instance = None
-
-            if download_cancelled:
-                log("Download cancelled")
-                return
-
-            # Success! Open the appropriate folder
-            if is_playlist:
-                log(f"? Playlist download completed!")
-                log(f"?? Saved to: {playlist_output_dir}")
-                
-                # Ensure the folder exists and open it
-                if playlist_output_dir.exists():
-                    try:
-                        # Convert to string and normalize path
-                        folder_path = str(playlist_output_dir.resolve())
-                        log(f"Opening folder: {folder_path}")
-                        os.startfile(folder_path)
-                    except Exception as e:
-                        log(f"Error opening folder: {str(e)}")
-                        # Try alternative method if the first one fails
-                        try:
-                            subprocess.Popen(['explorer', folder_path])
-                        except Exception as e:
-                            log(f"Alternative folder opening failed: {str(e)}")
-            else:
-                log("? Download completed!")
-                log(f"?? Saved to: {output_path}")
-                # Open the output folder
-                try:
-                    folder_path = str(output_path.resolve())
-                    os.startfile(folder_path)
-                except Exception as e:
-                    log(f"Error opening folder: {str(e)}")
-                    try:
-                        subprocess.Popen(['explorer', folder_path])
-                    except Exception as e:
-                        log(f"Alternative folder opening failed: {str(e)}")
-
-        except yt_dlp.utils.DownloadError as e:
-            # This block will only be reached for errors not caught in the inner try block
-            if not download_cancelled:  # Only show error if not cancelled
-                log(f"Uncaught download error: {str(e)}")
-                messagebox.showerror("Download Error", f"Download failed: {str(e)}")
-        except Exception as e:
-            if not download_cancelled:  # Only show error if not cancelled
-                log(f"Unexpected error: {str(e)}")
-                messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
-        finally:
-            ydl_instance = None
+        job = None
+        for url in urls:
+            # Check if URL is a playlist
+            is_playlist = looks_like_playlist(url)
+            if is_playlist and not download_playlist.get():
+                if len(urls) > 1 or not messagebox.askyesno("Playlist Detected", 
+                    "This appears to be a playlist URL. Would you like to download the entire playlist?\n\n"
+                    "If not, only the first video will be downloaded."):
+                    is_playlist = False
+
+            options = DownloadOptions(
+                is_audio=is_audio,
+                video_quality=quality_settings['video_quality'],
+                audio_quality=quality_settings['audio_quality'],
+                format=quality_settings['format'],
+                playlist=is_playlist,
+                max_files=max_files,
+                output_root=downloads_path,
+                ffmpeg_path=ffmpeg_path,
+                playlist_workers=playlist_workers_var.get(),
+                connections=connections_var.get(),
+                priority=priority_var.get()
+            )
+            job = download_queue.submit(DownloadJob(url, options))
+            log(f"Queued: {url}")
+        ui.post(update_queue_buttons)
+        return job
 
     except Exception as e:
-        if not download_cancelled:  # Only show error if not cancelled
-            messagebox.showerror("Error", f"Error occurred:\n{e}")
+        messagebox.showerror("Error", f"Error occurred:\n{e}")
+        return None
     finally:
         hide_loading()  # Hide loading animation
-        if not download_cancelled:
-            ui_queue.put(lambda: enable_buttons())
-            ui_queue.put(lambda: update_progress(0, "Ready to download"))
-        # Ensure window stays visible after download
-        root.deiconify()
-        root.lift()
-        root.focus_force()
 
 # Clipboard Monitoring Functions
 def is_supported_url(url):
@@ -1989,31 +2157,75 @@ def is_supported_url(url):
     except:
         return False
 
-def check_clipboard():
+def on_clipboard_change(text):
+    """Called from the watcher thread when the clipboard text changes."""
+    urls = extract_urls(text, validate=is_supported_url)
+    if urls:
+        ui.post(lambda: handle_clipboard_urls(urls))
+
+def handle_clipboard_urls(urls):
+    """Fill in a single copied URL, or offer to queue several at once."""
     global last_copied_url
     try:
-        clipboard_content = pyperclip.paste().strip()
-        if validators.url(clipboard_content):
-            if clipboard_content != last_copied_url and is_supported_url(clipboard_content):
+        if len(urls) == 1:
+            url = urls[0]
+            if url != last_copied_url:
                 url_entry.delete(0, tk.END)
-                url_entry.insert(0, clipboard_content)
-                last_copied_url = clipboard_content
-                log(f"Auto-detected URL: {clipboard_content}")
+                url_entry.insert(0, url)
+                last_copied_url = url
+                log(f"Auto-detected URL: {url}")
+            return
+        
+        log(f"Auto-detected {len(urls)} URLs on the clipboard")
+        if messagebox.askyesno("Links Detected",
+            f"The clipboard contains {len(urls)} links.\n\n"
+            "Add them all to the download queue as video downloads?"):
+            threading.Thread(target=download_media, args=(False, urls), daemon=True).start()
     except Exception as e:
         print("Clipboard error:", e)
-    root.after(1000, check_clipboard)
 
 # Start clipboard monitoring
-check_clipboard()
-
-# Start queue processing
-root.after(100, process_queue)
+clipboard_watcher = ClipboardWatcher(on_clipboard_change, pyperclip.paste).start()
+startup.mark('engine and clipboard')
+
+def on_first_frame():
+    """Runs once the window is drawn: report start-up and warm up heavy imports."""
+    root.update_idletasks()
+    startup.mark('first frame')
+    startup.report()
+    preload([Image, ImageTk, ImageDraw, validators, http_session, yt_dlp],
+            on_done=lambda: (ui.post(load_logo), print_module_versions(), record_import_times(),
+                             setup_http_session()))
+
+def setup_http_session():
+    """Identify the app to servers and log the timing of every HTTP request."""
+    http_session.configure(user_agent=f'Yamin-media-downloader/{CURRENT_VERSION}')
+    http_session.session().listeners.append(
+        lambda method, url, status, timing: log(
+            f"HTTP {method} {url} -> {status}: {http_session.describe(timing)}", show_console=False, level='debug'))
+
+def record_import_times():
+    for name, module in (('import PIL', Image), ('import requests', http_session),
+                         ('import validators', validators), ('import yt_dlp', yt_dlp)):
+        if module.load_time is not None:
+            startup.record(name, module.load_time)
+
+# Start UI frame processing
+ui.start()
 
 # Main loop
 if __name__ == "__main__":
     try:
-        # Check for updates on startup
+        # Install an update downloaded during the last session
+        remove_previous_version()
+        pending = pending_update()
+        if pending:
+            log(f"Installing downloaded update {pending[0]}...")
+            apply_update(pending[1])
+        
+        # Check for updates in the background
         check_updates_on_startup()
+        startup.mark('update check')
         
         # Show the window by default
         root.deiconify()
@@ -2021,13 +2233,19 @@ if __name__ == "__main__":
         root.focus_force()
         
         # Create tray icon but don't start minimized
-        if tray_icon is None:
-            create_tray_icon()
+        create_tray_icon()
         
+        root.after(0, on_first_frame)
         root.mainloop()
     except KeyboardInterrupt:
         sys.exit(0)
     finally:
+        # Let running conversions finish so their files and archive entries are complete
+        post_pool.shutdown(wait=True)
+        # Reads close to changes mean the watcher did no work while idle
+        watcher_stats = clipboard_watcher.stats()
+        log(f"Clipboard watcher ({watcher_stats['mode']}): {watcher_stats['reads']} reads, "
+            f"{watcher_stats['changes']} changes", level='debug')
         # Clean up tray icon when exiting
         if tray_icon is not None:
             tray_icon.stop()
@@ -22,6 +22,9 @@ a = Analysis(
         'PIL._imagingft',
         'PIL._imagingmath',
         'PIL._imagingmorph',
+        'PIL.Image',
+        'PIL.ImageTk',
+        'PIL.ImageDraw',
         'tkinter',
         'tkinter.ttk',
         'tkinter.filedialog',
@@ -37,6 +40,7 @@ a = Analysis(
         'win32com',
         'win32com.client',
         'requests',
+        'http_session',
         'json',
         'certifi',
         'ssl',
@@ -56,6 +56,7 @@ def build_executable():
         "--include-package=pyperclip",
         "--include-package=validators",
         "--include-package=requests",
+        "--include-module=http_session",
         "--include-package=win32com",
         "--include-package=certifi",
         "--include-module=tkinter",
@@ -0,0 +1,210 @@
+"""Post-processing stage that runs apart from the download workers.
+
+Audio extraction and format conversion used to run inside the same
+YoutubeDL.download() call that fetched the file, so a download slot (and the
+network) sat idle while FFmpeg worked. With a PostProcessPool the engine
+strips the conversions from the download's yt-dlp options and adds a small
+hand-off postprocessor instead: as soon as a file is on disk its info dict
+goes onto this pool's queue and the download worker moves on to the next
+item.
+
+The pool's workers are threads, but each one spends its time waiting on an
+FFmpeg process, so the actual encoding runs in separate processes. An
+FFmpeg encode already spreads over every core, so the worker count defaults
+to half of them: enough to overlap remuxes and audio extraction, which are
+mostly I/O, without several encodes competing for the same cores.
+
+StageMeter measures how busy a stage's workers were and how long items
+waited for one, which shows whether a batch was held up by the downloads or
+by the processing. It counts busy workers, not CPU time.
+"""
+import collections
+import concurrent.futures
+import os
+import threading
+import time
+import traceback
+
+BUSY = 0.8  # Utilisation at which a stage counts as the bottleneck
+QUEUE_WAIT = 1.0  # Average seconds waiting for a worker that mean the stage is short of them
+
+
+def default_workers():
+    """Half the CPU cores; each FFmpeg encode uses all of them on its own."""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+class StageMeter:
+    """Busy time, capacity and queue wait of one pipeline stage."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self._lock = threading.Lock()
+        self._workers = workers
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._last = time.monotonic()
+            self._active = 0
+            self.busy_seconds = 0.0
+            self.capacity_seconds = 0.0
+            self.items = 0
+            self.wait_seconds = 0.0
+
+    def _advance(self, now):
+        elapsed = now - self._last
+        self.busy_seconds += self._active * elapsed
+        self.capacity_seconds += self._workers * elapsed
+        self._last = now
+
+    def set_workers(self, workers):
+        with self._lock:
+            self._advance(time.monotonic())
+            self._workers = workers
+
+    def start(self, waited=0.0):
+        with self._lock:
+            self._advance(time.monotonic())
+            self._active += 1
+            self.items += 1
+            self.wait_seconds += waited
+
+    def stop(self):
+        with self._lock:
+            self._advance(time.monotonic())
+            self._active -= 1
+
+    def utilisation(self):
+        """Share of the stage's worker time spent working since the last reset."""
+        with self._lock:
+            self._advance(time.monotonic())
+            if self.capacity_seconds <= 0:
+                return 0.0
+            return min(1.0, self.busy_seconds / self.capacity_seconds)
+
+    def average_wait(self):
+        with self._lock:
+            return self.wait_seconds / self.items if self.items else 0.0
+
+    def describe(self):
+        return (f"{self.name} {self.utilisation():.0%} busy ({self._workers} workers, "
+                f"{self.items} items, {self.average_wait():.1f}s average wait)")
+
+
+def describe_stages(download, processing=None):
+    """One line on each stage's utilisation and which one held the batch up."""
+    parts = [download.describe()]
+    if processing is None:
+        return "Stages: " + parts[0]
+    parts.append(processing.describe())
+    if processing.utilisation() >= BUSY or processing.average_wait() >= QUEUE_WAIT:
+        verdict = "processing-bound: downloads finished faster than they could be converted"
+    elif download.utilisation() >= BUSY:
+        verdict = "network-bound: processing kept up with downloads"
+    else:
+        verdict = "neither stage was saturated"
+    return "Stages: " + "; ".join(parts) + " - " + verdict
+
+
+def hand_off_postprocessor(callback):
+    """A yt-dlp postprocessor that passes each finished file's info dict to callback."""
+    from yt_dlp.postprocessor.common import PostProcessor
+
+    class HandOffPP(PostProcessor):
+        def run(self, info):
+            callback(dict(info))
+            return [], info
+
+    return HandOffPP()
+
+
+class PostProcessPool:
+    """Queue of post-processing tasks worked through by up to `workers` threads."""
+
+    def __init__(self, workers=None):
+        self.workers = max(1, int(workers or default_workers()))
+        self.meter = StageMeter("processing", self.workers)
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._worker_count = 0
+        self._running = 0
+        self._threads = []
+        self._closed = False
+
+    def submit(self, fn, *args):
+        """Queue fn(*args); returns a concurrent.futures.Future for its result."""
+        future = concurrent.futures.Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Post-processing pool has been shut down")
+            self._queue.append((future, fn, args, time.monotonic()))
+            self._spawn_workers()
+            self._cond.notify()
+        return future
+
+    def set_workers(self, workers):
+        with self._cond:
+            self.workers = max(1, int(workers))
+            self.meter.set_workers(self.workers)
+            self._spawn_workers()
+            self._cond.notify_all()
+
+    def pending(self):
+        """Tasks queued or running."""
+        with self._cond:
+            return len(self._queue) + self._running
+
+    def shutdown(self, wait=False):
+        """Take no new tasks and let workers exit once the queue is empty.
+
+        With wait=True, block until every queued and running task is done;
+        the workers are daemon threads, so a process that exits first cuts
+        its conversions off.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _spawn_workers(self):
+        while self._worker_count < self.workers:
+            self._worker_count += 1
+            thread = threading.Thread(target=self._worker, daemon=True,
+                                      name=f"postprocess-worker-{self._worker_count}")
+            self._threads = [t for t in self._threads if t.is_alive()] + [thread]
+            thread.start()
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    if self._closed or self._worker_count > self.workers:
+                        self._worker_count -= 1
+                        return
+                    self._cond.wait()
+                if self._worker_count > self.workers:
+                    self._worker_count -= 1
+                    self._cond.notify()
+                    return
+                future, fn, args, queued = self._queue.popleft()
+                self._running += 1
+
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.meter.start(time.monotonic() - queued)
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    print(f"Post-processing error: {e}")
+                    print(traceback.format_exc())
+                    future.set_exception(e)
+                finally:
+                    self.meter.stop()
+            finally:
+                with self._cond:
+                    self._running -= 1
@@ -0,0 +1,242 @@
+"""Cheapest way to get a downloaded video into the chosen container.
+
+yt-dlp's FFmpegVideoConvertor re-encodes every stream whenever a file's
+extension differs from the target format, so a webm that only needed a new
+container could take longer to convert than it took to download. The
+planner asks ffprobe what the streams are first and then:
+
+- skips the file if it is already in the target container with codecs it
+  allows,
+- remuxes (copies every stream into the new container) when all the codecs
+  are allowed in the target,
+- re-encodes only the streams the target cannot hold, with an encoder the
+  installed FFmpeg build has, and logs why.
+
+Subtitles, attachments and cover art are copied along wherever the target
+can hold them, as yt-dlp's own remux does.
+
+register() makes the planner known to yt-dlp as the 'RemuxPlanner'
+postprocessor, which DownloadOptions uses in place of FFmpegVideoConvertor.
+"""
+import os
+import sys
+import threading
+import time
+
+POSTPROCESSOR_KEY = 'RemuxPlanner'
+
+# Codecs each container takes as they are; None means anything
+CONTAINER_CODECS = {
+    'mp4': {
+        'video': {'h264', 'hevc', 'av1', 'vp9', 'mpeg4'},
+        'audio': {'aac', 'mp3', 'opus', 'flac', 'alac', 'ac3', 'eac3'},
+    },
+    'webm': {
+        'video': {'vp8', 'vp9', 'av1'},
+        'audio': {'opus', 'vorbis'},
+    },
+    'mkv': None,
+}
+
+# Subtitle codec each container gets; None means it cannot hold subtitles
+# and a container left out keeps them as they are
+SUBTITLE_CODECS = {'mp4': 'mov_text', 'webm': None}
+
+# Name ffprobe lists in format_name for a file already in the container
+CONTAINER_FORMATS = {'mp4': 'mp4', 'webm': 'webm', 'mkv': 'matroska'}
+
+# Encoders to use when a stream has to be re-encoded, in order of preference
+ENCODERS = {
+    'mp4': {'video': ('libx264', 'h264_mf', 'mpeg4'), 'audio': ('aac', 'libmp3lame')},
+    'webm': {'video': ('libvpx-vp9', 'libvpx'), 'audio': ('libopus', 'libvorbis')},
+    'mkv': {'video': ('libx264', 'mpeg4'), 'audio': ('aac', 'libopus')},
+}
+ENCODER_OPTIONS = {
+    'libx264': (('-preset', 'veryfast'), ('-crf', '20')),
+    'libvpx-vp9': (('-b', '0'), ('-crf', '32'), ('-row-mt', '1'), ('-cpu-used', '4')),
+    'aac': (('-b', '192k'),),
+    'libopus': (('-b', '160k'),),
+}
+
+_registered = None
+_register_lock = threading.Lock()
+_capability_cache = None
+
+
+class Plan:
+    """What to do with one file: 'skip', 'remux' or 'encode', and why."""
+
+    def __init__(self, action, reason, args=None):
+        self.action = action
+        self.reason = reason
+        self.args = args or []  # FFmpeg output options
+
+    def __repr__(self):
+        return f"<Plan {self.action}: {self.reason}>"
+
+
+def pick_encoder(target, kind, capabilities=None):
+    """First preferred encoder the FFmpeg build has; None leaves the choice to FFmpeg."""
+    for name in ENCODERS.get(target, {}).get(kind, ()):
+        if capabilities is None or not capabilities.encoders or capabilities.has_encoder(name):
+            return name
+    return None
+
+
+def plan_conversion(media, ext, target, capabilities=None):
+    """Plan turning a file (ffprobe's JSON for it, and its extension) into target.
+
+    Every stream is copied like yt-dlp's own remux (-map 0 -dn -ignore_unknown
+    -c copy); only audio and video the target cannot hold are re-encoded, and
+    only what the target cannot hold at all is dropped.
+    """
+    if target not in CONTAINER_CODECS:
+        return Plan('encode', f"no codec table for {target}, converting with FFmpeg's defaults")
+    allowed = CONTAINER_CODECS[target]
+    streams = media.get('streams', [])
+    media_streams = [s for s in streams
+                     if s.get('codec_type') in ('video', 'audio')
+                     and not (s.get('disposition') or {}).get('attached_pic')]
+    if not media_streams:
+        return Plan('skip', "no audio or video streams found")
+
+    args = ['-map', '0', '-dn', '-ignore_unknown']
+    drops = []
+    if target in SUBTITLE_CODECS and SUBTITLE_CODECS[target] is None:
+        args.append('-sn')
+        if any(s.get('codec_type') == 'subtitle' for s in streams):
+            drops.append(f"subtitles ({target} cannot hold them)")
+    if allowed is not None:
+        # Fonts and other attachments only go in Matroska
+        args += ['-map', '-0:t']
+        if any(s.get('codec_type') == 'attachment' for s in streams):
+            drops.append("attachments")
+    subtitle_args = ['-c:s', SUBTITLE_CODECS[target]] if SUBTITLE_CODECS.get(target) else []
+
+    codec_args = []  # Per-stream encoders; they have to come after '-c copy'
+    reasons = []
+    defaults = False  # A stream has no preferred encoder in this FFmpeg build
+    counts = {'video': 0, 'audio': 0}
+    tuned = set()
+    for stream in streams:
+        kind, codec = stream.get('codec_type'), stream.get('codec_name')
+        if kind not in counts:
+            continue
+        cover = (stream.get('disposition') or {}).get('attached_pic')
+        if cover and target == 'webm':
+            args += ['-map', f"-0:{stream['index']}"]
+            drops.append("cover art")
+            continue
+        spec = f"{kind[0]}:{counts[kind]}"
+        counts[kind] += 1
+        if cover or allowed is None or codec in allowed[kind]:
+            continue
+        encoder = pick_encoder(target, kind, capabilities)
+        if encoder is None:
+            defaults = True
+            reasons.append(f"{codec} {kind} cannot go in {target}, encoding with FFmpeg's default")
+            continue
+        codec_args += [f'-c:{spec}', encoder]
+        if encoder not in tuned:
+            tuned.add(encoder)
+            for option, value in ENCODER_OPTIONS.get(encoder, ()):
+                codec_args += [f'{option}:{kind[0]}', value]
+        reasons.append(f"{codec} {kind} cannot go in {target}, encoding with {encoder}")
+    if defaults:
+        # '-c copy' cannot be undone for one stream, so let FFmpeg pick every encoder
+        reasons.append("converting every stream with FFmpeg's defaults")
+        args += subtitle_args
+    else:
+        args += ['-c', 'copy'] + subtitle_args + codec_args
+    if target == 'mp4':
+        args += ['-movflags', '+faststart']
+
+    codecs = "/".join(s.get('codec_name') or '?' for s in media_streams)
+    dropped = f", dropping {' and '.join(drops)}" if drops else ""
+    if reasons:
+        return Plan('encode', "; ".join(reasons) + dropped, args)
+    format_names = ((media.get('format') or {}).get('format_name') or '').split(',')
+    if ext == target and CONTAINER_FORMATS[target] in format_names:
+        return Plan('skip', f"already {target} with {codecs}")
+    return Plan('remux', f"{codecs} fit in {target}, copying streams" + dropped, args)
+
+
+def use_capabilities(capability_cache):
+    """Let the planner look up which encoders FFmpeg has in a ffmpeg_tools.CapabilityCache."""
+    global _capability_cache
+    _capability_cache = capability_cache
+
+
+def register():
+    """Make the planner known to yt-dlp; returns its key, or None if that failed."""
+    global _registered
+    with _register_lock:
+        if _registered is None:
+            try:
+                from yt_dlp.postprocessor import postprocessors
+                postprocessors.value[POSTPROCESSOR_KEY + 'PP'] = _postprocessor_class()
+                _registered = True
+            except Exception as e:
+                print(f"Remux planner unavailable: {e}")
+                _registered = False
+    return POSTPROCESSOR_KEY if _registered else None
+
+
+def _postprocessor_class():
+    from yt_dlp.postprocessor.common import PostProcessor
+    from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor, FFmpegVideoConvertorPP
+    from yt_dlp.utils import prepend_extension, replace_extension
+
+    class RemuxPlannerPP(FFmpegPostProcessor):
+        """yt-dlp postprocessor that converts only what the target container needs."""
+
+        def __init__(self, downloader=None, preferedformat=None):
+            super().__init__(downloader)
+            self.target = (preferedformat or 'mp4').lower()
+
+        def _capabilities(self):
+            if _capability_cache is None or not self.executable:
+                return None
+            caps = _capability_cache.get(self.executable)
+            return caps if caps.ok else None
+
+        @PostProcessor._restrict_to(images=False)
+        def run(self, info):
+            path, ext = info['filepath'], info['ext'].lower()
+            if self.probe_basename != 'ffprobe':
+                self.report_warning("ffprobe not found, converting without checking the streams")
+                return FFmpegVideoConvertorPP(self._downloader, self.target).run(info)
+
+            plan = plan_conversion(self.get_metadata_object(path), ext, self.target,
+                                   self._capabilities())
+            if plan.action == 'skip':
+                self.to_screen(f'Not converting "{path}"; {plan.reason}')
+                return [], info
+            if plan.action == 'encode':
+                self.report_warning(f'Re-encoding "{path}": {plan.reason}')
+            else:
+                self.to_screen(f'Remuxing "{path}": {plan.reason}')
+
+            started = time.time()
+            in_place = ext == self.target
+            out_path = prepend_extension(path, 'temp') if in_place else replace_extension(path, self.target, ext)
+            self.run_ffmpeg(path, out_path, plan.args)
+            self.to_screen(f"{plan.action.capitalize()} took {time.time() - started:.1f}s")
+            if in_place:
+                os.replace(out_path, path)
+                return [], info
+            info['filepath'] = out_path
+            info['format'] = info['ext'] = self.target
+            return [path], info
+
+    return RemuxPlannerPP
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("usage: python remux_planner.py FFPROBE FILE [mp4|webm|mkv]")
+        sys.exit(2)
+    from ffmpeg_tools import probe_media
+    media_path = sys.argv[2]
+    print(plan_conversion(probe_media(sys.argv[1], media_path), media_path.rsplit('.', 1)[-1].lower(),
+                          sys.argv[3] if len(sys.argv) > 3 else 'mp4'))
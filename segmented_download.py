@@ -0,0 +1,162 @@
+"""Multi-connection downloads of plain HTTP media for yt-dlp.
+
+Many CDNs cap the speed of a single connection, and yt-dlp fetches a
+progressive file (an .mp4, .m4a or .webm link, or whatever the generic
+extractor found) over just one. register() adds a 'segmented' external
+downloader to yt-dlp that hands such files to http_fetch.fetch(), which
+splits them into Range segments fetched in parallel into a preallocated
+file, lets idle connections take over part of the slowest segment and
+retries failed segments on their own. A 'segmented_throttle' callable in the
+YoutubeDL params is passed to fetch() as its throttle, so every connection
+draws from the same bandwidth share.
+
+Files the server will not serve in ranges, and small files, still go through
+yt-dlp's own HTTP downloader.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from http_fetch import fetch, probe_mirror
+
+DOWNLOADER_NAME = 'segmented'
+DEFAULT_CONNECTIONS = 4
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+
+_registered = None
+_register_lock = threading.Lock()
+
+
+def register():
+    """Make the downloader known to yt-dlp; returns its name, or None if that failed."""
+    global _registered
+    with _register_lock:
+        if _registered is None:
+            try:
+                from yt_dlp.downloader import external
+                external._BY_NAME[DOWNLOADER_NAME] = _downloader_class(external)
+                _registered = True
+            except Exception as e:
+                print(f"Segmented downloader unavailable: {e}")
+                _registered = False
+    return DOWNLOADER_NAME if _registered else None
+
+
+def _downloader_class(external):
+    from yt_dlp.downloader.http import HttpFD
+
+    class SegmentedFD(external.ExternalFD):
+        """yt-dlp downloader that fetches one file over several connections."""
+
+        SUPPORTED_PROTOCOLS = ('http', 'https')
+
+        @classmethod
+        def get_basename(cls):
+            return DOWNLOADER_NAME
+
+        @classmethod
+        def available(cls, path=None):
+            return True
+
+        @classmethod
+        def supports(cls, info_dict):
+            return (not info_dict.get('to_stdout') and not info_dict.get('is_live')
+                    and info_dict.get('protocol') in cls.SUPPORTED_PROTOCOLS)
+
+        def _native_download(self, filename, info_dict):
+            fd = HttpFD(self.ydl, self.params)
+            for hook in self._progress_hooks:
+                # The new downloader prints its own progress line
+                if getattr(hook, '__self__', None) is not self:
+                    fd.add_progress_hook(hook)
+            return fd.real_download(filename, info_dict)
+
+        def _get(self, info_dict):
+            from http_session import get as session_get
+            base_headers = dict(info_dict.get('http_headers') or {})
+            cookies = self.ydl.cookiejar
+            verify = not self.params.get('nocheckcertificate')
+
+            def get(url, headers=None, **kwargs):
+                merged = dict(base_headers)
+                merged.update(headers or {})
+                return session_get(url, headers=merged, cookies=cookies, verify=verify, **kwargs)
+            return get
+
+        def real_download(self, filename, info_dict):
+            url = info_dict['url']
+            connections = self.params.get('segmented_connections') or DEFAULT_CONNECTIONS
+            throttle = self.params.get('segmented_throttle')
+            get = self._get(info_dict)
+            probe = probe_mirror(url, get)
+            if not (probe.ok and probe.ranges and probe.size and probe.size >= 2 * MIN_SEGMENT_SIZE):
+                return self._native_download(filename, info_dict)
+
+            self.report_destination(filename)
+            # Not yt-dlp's .part name: a preallocated file there would look complete to HttpFD
+            staging = filename + '.segmented'
+            started = time.time()
+            hook_lock = threading.Lock()
+            first = {}
+
+            def on_progress(done, total):
+                elapsed = time.time() - started
+                first.setdefault('done', done)
+                speed = (done - first['done']) / elapsed if elapsed > 0 else None
+                status = {
+                    'status': 'downloading',
+                    'filename': filename,
+                    'tmpfilename': staging,
+                    'downloaded_bytes': done,
+                    'total_bytes': total,
+                    'elapsed': elapsed,
+                    'speed': speed,
+                    'eta': (total - done) / speed if speed and total else None,
+                    'throttled': throttle is not None,  # Already charged to the bandwidth share
+                }
+                # Segments report from their own threads
+                with hook_lock:
+                    self._hook_progress(status, info_dict)
+
+            request_size = (info_dict.get('downloader_options') or {}).get('http_chunk_size')
+            fetch(url, staging, get=get, on_progress=on_progress, segments=connections,
+                  probe=probe, min_segment_size=MIN_SEGMENT_SIZE, request_size=request_size,
+                  throttle=throttle)
+            self.try_rename(staging, filename)
+            self._hook_progress({
+                'status': 'finished',
+                'filename': filename,
+                'downloaded_bytes': probe.size,
+                'total_bytes': probe.size,
+                'elapsed': time.time() - started,
+            }, info_dict)
+            return True
+
+    return SegmentedFD
+
+
+def benchmark(url, dest_dir, connections=(1, 2, 4, 8)):
+    """Time fetch() of url with each connection count; returns (count, seconds) pairs."""
+    results = []
+    for count in connections:
+        dest = Path(dest_dir) / f"bench-{count}.bin"
+        started = time.perf_counter()
+        fetch(url, dest, segments=count, min_segment_size=MIN_SEGMENT_SIZE)
+        seconds = time.perf_counter() - started
+        size = os.path.getsize(dest)
+        dest.unlink()
+        print(f"{count} connection(s): {seconds:.2f}s, {size / seconds / 1024 / 1024:.1f} MiB/s")
+        results.append((count, seconds))
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python segmented_download.py URL [CONNECTIONS...]")
+        sys.exit(2)
+    counts = [int(arg) for arg in sys.argv[2:]] or [1, 2, 4, 8]
+    with tempfile.TemporaryDirectory() as tmp:
+        benchmark(sys.argv[1], tmp, counts)
@@ -0,0 +1,120 @@
+"""Start-up helpers: deferred imports and a per-phase timing report.
+
+yt-dlp, Pillow, requests and pystray together make up most of a cold start,
+and none of them are needed to draw the window. LazyModule stands in for
+such a module and imports it on first use, and preload() warms them up in
+a background thread once the window is on screen.
+"""
+import importlib
+import sys
+import threading
+import time
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name, submodules=()):
+        self._name = name
+        self._submodules = tuple(submodules)
+        self._module = None
+        self._lock = threading.Lock()
+        self.load_time = None
+
+    def load(self):
+        """Import the module (and its listed submodules) if not done yet."""
+        module = self._module
+        if module is not None:
+            return module
+        with self._lock:
+            if self._module is None:
+                started = time.perf_counter()
+                module = importlib.import_module(self._name)
+                for name in self._submodules:
+                    importlib.import_module(name)
+                self.load_time = time.perf_counter() - started
+                self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def preload(modules, on_done=None):
+    """Import LazyModules one after another in a background thread."""
+    def run():
+        for module in modules:
+            try:
+                module.load()
+            except Exception as e:
+                print(f"Background import of {module._name} failed: {e}")
+        if on_done is not None:
+            on_done()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def module_versions(names):
+    """(name, version or None) for modules that are already imported."""
+    versions = []
+    for name in names:
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        version = getattr(module, '__version__', None)
+        if version is None and hasattr(module, 'version'):
+            version = getattr(module.version, '__version__', None)
+        versions.append((name, version))
+    return versions
+
+
+class StartupProfile:
+    """Wall-clock time spent in each phase of start-up (--startup-profile)."""
+
+    def __init__(self, enabled=False, start=None):
+        self.enabled = enabled
+        self.start = start if start is not None else time.perf_counter()
+        self.phases = []
+        self.background = []
+        self.reported = False
+        self._last = self.start
+        self._lock = threading.Lock()
+
+    def mark(self, phase):
+        """End the current phase, naming it after what just ran."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def record(self, phase, seconds):
+        """Add a phase that ran on another thread."""
+        with self._lock:
+            self.background.append((phase, seconds))
+            late = self.reported
+        if late and self.enabled:
+            print(f"[startup] {phase} (background): {seconds * 1000:.1f} ms")
+
+    def total(self):
+        return self._last - self.start
+
+    def report(self):
+        """Print the breakdown up to now; later background phases print as they finish."""
+        with self._lock:
+            self.reported = True
+            background = list(self.background)
+        if not self.enabled:
+            return
+        total = self.total()
+        print("\n=== STARTUP PROFILE ===")
+        for phase, seconds in self.phases:
+            share = seconds / total if total else 0
+            print(f"{phase:<24}{seconds * 1000:>9.1f} ms {share:>6.1%}")
+        print(f"{'total to first frame':<24}{total * 1000:>9.1f} ms")
+        for phase, seconds in background:
+            print(f"{phase + ' (background)':<36}{seconds * 1000:>9.1f} ms")
+        print()